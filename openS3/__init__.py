@@ -1,8 +1,9 @@
+from .aio import AsyncOpenS3
 from .ctx_manager import OpenS3
 
 __author__ = 'Paul Logston'
 __email__ = 'code@logston.me'
 __version__ = '0.2.0'
 
-__all__ = ('OpenS3',)
+__all__ = ('OpenS3', 'AsyncOpenS3')
 
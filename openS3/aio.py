@@ -0,0 +1,573 @@
+"""
+An asyncio based client for S3 with the same API as :py:class:`~openS3.ctx_manager.OpenS3`.
+
+Requests are sent over asyncio streams using a pool of keep-alive connections,
+so one event loop can have many requests in flight without any threads.
+"""
+import asyncio
+from collections import deque
+import hashlib
+from http.client import HTTPMessage
+import time
+from xml.etree import ElementTree
+
+from .connection import TLSSessionCache, create_ssl_context
+from .constants import (
+    VALID_MODES, DEFAULT_POOL_IDLE_TIMEOUT, DEFAULT_ASYNC_POOL_MAXSIZE, EMPTY_PAYLOAD_SHA256)
+from .signing import Signer
+from .utils import (
+    validate_values, b64_string, guess_content_type, get_request_target, get_xml_namespaces,
+    to_bytes, S3FileDoesNotExistError, S3IOError)
+
+
+class AsyncResponse(object):
+    """
+    An HTTP response read from an asyncio stream. The body is read on demand.
+    """
+    def __init__(self, reader, method):
+        self._reader = reader
+        self._method = method
+        self.status = None
+        self.reason = None
+        self.headers = HTTPMessage()
+        self.will_close = False
+        self.complete = False
+        self._length = None
+        self._chunked = False
+        self._chunk_left = 0
+
+    async def read_head(self):
+        """Read the status line and headers of the response."""
+        status_line = (await self._reader.readline()).decode('latin-1')
+        if not status_line:
+            raise ConnectionResetError('Connection closed before a response was received.')
+        version, status, reason = (status_line.rstrip('\r\n').split(' ', 2) + [''])[:3]
+        self.status = int(status)
+        self.reason = reason
+        while True:
+            line = (await self._reader.readline()).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            self.headers[name.strip()] = value.strip()
+
+        connection = self.headers.get('Connection', '').lower()
+        self.will_close = connection == 'close' or version == 'HTTP/1.0'
+        if (self._method == 'HEAD' or self.status in (204, 304) or
+                100 <= self.status < 200):
+            self.complete = True
+        elif self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            self._chunked = True
+        elif self.headers.get('Content-Length') is not None:
+            self._length = int(self.headers['Content-Length'])
+            self.complete = self._length == 0
+        else:
+            # The body runs until the server closes the connection.
+            self.will_close = True
+
+    async def _read_chunked(self, size):
+        data = bytearray()
+        while size < 0 or len(data) < size:
+            if not self._chunk_left:
+                line = await self._reader.readline()
+                self._chunk_left = int(line.split(b';')[0], 16)
+                if not self._chunk_left:
+                    # Skip trailers.
+                    while (await self._reader.readline()) not in (b'\r\n', b''):
+                        pass
+                    self.complete = True
+                    break
+            wanted = self._chunk_left if size < 0 else min(self._chunk_left, size - len(data))
+            data += await self._reader.readexactly(wanted)
+            self._chunk_left -= wanted
+            if not self._chunk_left:
+                await self._reader.readexactly(2)
+        return bytes(data)
+
+    async def read(self, size=-1):
+        """
+        Read and return up to ``size`` bytes of the body, or the rest of the
+        body if ``size`` is negative.
+        """
+        if self.complete:
+            return b''
+        if self._chunked:
+            return await self._read_chunked(size)
+        if self._length is None:
+            data = await (self._reader.read() if size < 0 else self._reader.read(size))
+            if not data or size < 0:
+                self.complete = True
+            return data
+        wanted = self._length if size < 0 else min(size, self._length)
+        data = await self._reader.readexactly(wanted)
+        self._length -= wanted
+        self.complete = self._length == 0
+        return data
+
+
+class ResumingContext(object):
+    """
+    Stands in for an :py:class:`ssl.SSLContext` while asyncio sets up one
+    connection, so that its handshake resumes the session in a
+    :py:class:`~openS3.connection.TLSSessionCache` and can be timed. asyncio
+    streams offer no other way to pass a session.
+
+    This depends on asyncio internals: ``asyncio.sslproto.SSLProtocol``
+    creates its :py:class:`ssl.SSLObject` by calling ``wrap_bio(incoming,
+    outgoing, server_side=..., server_hostname=...)`` on the context passed
+    to :py:func:`asyncio.open_connection`, as it does in Python 3.7 to 3.13.
+    ``test_async_tls_session_resumption`` fails if that changes. Everything
+    else is delegated to the real context, so if asyncio stops calling
+    ``wrap_bio`` connections still use TLS, just without resuming sessions.
+    """
+    def __init__(self, context, sessions):
+        self.context = context
+        self.sessions = sessions
+        # Set when asyncio calls wrap_bio; None if it never did.
+        self.handshake_start = None
+
+    def __getattr__(self, name):
+        return getattr(self.context, name)
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None,
+                 session=None):
+        self.handshake_start = time.perf_counter()
+        return self.context.wrap_bio(incoming, outgoing, server_side, server_hostname,
+                                     session or self.sessions.session)
+
+
+class AsyncConnection(object):
+    """A single HTTP/1.1 connection over asyncio streams."""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        # The TLS connection's ssl.SSLObject, or None over plain HTTP.
+        self.ssl_object = writer.get_extra_info('ssl_object')
+
+    @classmethod
+    async def open(cls, host, port, ssl_context=None, sessions=None):
+        """
+        Open a connection to ``host``, over TLS with an ``ssl_context``. With
+        a :py:class:`~openS3.connection.TLSSessionCache` as ``sessions``, the
+        handshake resumes its session and is recorded in it.
+        """
+        if ssl_context is None:
+            reader, writer = await asyncio.open_connection(host, port)
+            return cls(reader, writer)
+        if sessions is None:
+            reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context,
+                                                           server_hostname=host)
+            return cls(reader, writer)
+        context = ResumingContext(ssl_context, sessions)
+        reader, writer = await asyncio.open_connection(host, port, ssl=context,
+                                                       server_hostname=host)
+        conn = cls(reader, writer)
+        if context.handshake_start is not None:
+            sessions.record(time.perf_counter() - context.handshake_start,
+                            conn.ssl_object.session_reused)
+        sessions.remember(conn.ssl_object)
+        return conn
+
+    def is_dropped(self):
+        """Return ``True`` if the server has closed the connection."""
+        return self.reader.at_eof() or self.writer.is_closing()
+
+    async def request(self, method, path, headers, body=b''):
+        """Send a request and return its :py:class:`AsyncResponse` once the headers arrive."""
+        lines = ['{} {} HTTP/1.1'.format(method, path)]
+        lines.extend('{}: {}'.format(name, value) for name, value in headers.items())
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if body:
+            self.writer.write(body)
+        await self.writer.drain()
+        response = AsyncResponse(self.reader, method)
+        await response.read_head()
+        return response
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncConnectionPool(object):
+    """
+    A pool of keep-alive :py:class:`AsyncConnection` objects to a single host.
+
+    With an ``ssl_context``, connections use HTTPS, share the context and
+    resume the TLS session of the last one, like
+    :py:class:`~openS3.connection.ConnectionPool`.
+    """
+    def __init__(self, host, port=None, maxsize=DEFAULT_ASYNC_POOL_MAXSIZE,
+                 idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT, ssl_context=None):
+        """
+        :param host: Host to connect to. May include a port (eg. localhost:9000).
+        :param port: Port to connect to. Defaults to 443 with an ``ssl_context``
+            and 80 without.
+        :param maxsize: Maximum number of idle connections kept for reuse.
+        :param idle_timeout: Seconds after which an idle connection is discarded
+            rather than reused.
+        :param ssl_context: An :py:class:`ssl.SSLContext` shared by all connections.
+            See :py:func:`~openS3.connection.create_ssl_context`.
+        """
+        if port is None:
+            host, _, port = host.partition(':')
+            port = int(port or (80 if ssl_context is None else 443))
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl_context
+        # The TLS session new connections resume, and counts of their handshakes.
+        self.tls_sessions = TLSSessionCache() if ssl_context is not None else None
+        self._idle = deque()
+        self.num_connections = 0
+        self.num_reused = 0
+
+    async def get(self):
+        """
+        Return a 2-tuple of a connection and a boolean that is ``True`` when
+        the connection was taken from the pool rather than newly created.
+        """
+        now = time.monotonic()
+        while self._idle:
+            conn = self._idle.pop()
+            if now - conn.last_used > self.idle_timeout or conn.is_dropped():
+                conn.close()
+                continue
+            self.num_reused += 1
+            return conn, True
+        return await self._new_connection(), False
+
+    @property
+    def scheme(self):
+        """'https' if the pool's connections use TLS, 'http' otherwise."""
+        return 'http' if self.ssl_context is None else 'https'
+
+    async def _new_connection(self):
+        self.num_connections += 1
+        return await AsyncConnection.open(self.host, self.port, self.ssl_context,
+                                          self.tls_sessions)
+
+    def release(self, conn, response):
+        """
+        Return ``conn`` to the pool if ``response`` has been read to completion
+        and the server agreed to keep the connection alive. Otherwise close it.
+        """
+        if (response.complete and not response.will_close and not conn.is_dropped() and
+                len(self._idle) < self.maxsize):
+            if conn.ssl_object is not None and self.tls_sessions is not None:
+                self.tls_sessions.remember(conn.ssl_object)
+            conn.last_used = time.monotonic()
+            self._idle.append(conn)
+        else:
+            conn.close()
+
+    async def urlopen(self, method, path, headers, body=b''):
+        """
+        Send a request and return a 2-tuple of the connection used and its response.
+
+        If a pooled connection turns out to have been closed by the server, the
+        request is retried once on a new connection. The caller must hand the
+        connection back with :py:meth:`release` once the response has been read.
+        """
+        conn, reused = await self.get()
+        try:
+            return conn, await conn.request(method, path, headers, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            conn.close()
+            if not reused:
+                raise
+        except BaseException:
+            conn.close()
+            raise
+
+        conn = await self._new_connection()
+        try:
+            return conn, await conn.request(method, path, headers, body)
+        except BaseException:
+            conn.close()
+            raise
+
+    def close(self):
+        """Close all idle connections."""
+        while self._idle:
+            self._idle.pop().close()
+
+
+class AsyncOpenS3(object):
+    """
+    An asyncio client for interfacing with S3.
+
+    Like :py:class:`~openS3.ctx_manager.OpenS3`, :py:meth:`open` returns a new
+    :py:class:`AsyncS3File` for every object, so one client can serve many
+    concurrent tasks. It is meant for many small objects: writes are held in
+    memory and 'ab' mode is not supported::
+
+        s3 = AsyncOpenS3('my_bucket', '<access_key>', '<secret_key>')
+        async with s3('/my/object/key.txt', mode='wb') as fd:
+            await fd.write('Yeah! Files going up to S3!')
+        async with s3('/my/object/key.txt') as fd:
+            print(await fd.read())
+    """
+    def __init__(self, bucket, access_key, secret_key, pool=None,
+                 pool_maxsize=DEFAULT_ASYNC_POOL_MAXSIZE,
+                 pool_idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT, secure=True, ssl_context=None):
+        """
+        Create a new asyncio client for interfacing with S3.
+
+        :param bucket: An S3 bucket
+        :param access_key: An AWS access key (eg. AEIFKEKWEFJFWA)
+        :param secret_key: An AWS secret key.
+        :param pool: An :py:class:`AsyncConnectionPool` to share with other clients.
+            If not given, a new pool is created.
+        :param pool_maxsize: Maximum number of idle keep-alive connections to keep.
+        :param pool_idle_timeout: Seconds an idle connection may sit in the pool
+            before it is discarded.
+        :param secure: Send requests over HTTPS. Ignored if a ``pool`` is given.
+        :param ssl_context: The :py:class:`ssl.SSLContext` every connection of the
+            new pool shares. Defaults to
+            :py:func:`~openS3.connection.create_ssl_context`.
+        """
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        validate_values(validation_func=lambda value: value is not None,
+                        dic={'bucket': bucket, 'access_key': access_key, 'secret_key': secret_key})
+        self.netloc = '{}.s3.amazonaws.com'.format(bucket)
+        self.signer = Signer(access_key, secret_key)
+        if pool is None:
+            if secure and ssl_context is None:
+                ssl_context = create_ssl_context()
+            pool = AsyncConnectionPool(self.netloc, maxsize=pool_maxsize,
+                                       idle_timeout=pool_idle_timeout,
+                                       ssl_context=ssl_context if secure else None)
+        self.pool = pool
+
+    def __call__(self, *args, **kwargs):
+        return self.open(*args, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self, object_key, mode='rb', content_type=None, acl='private',
+             extra_request_headers=None):
+        """
+        Return an :py:class:`AsyncS3File` for reading from or writing to ``object_key``.
+        Takes the same arguments as :py:meth:`~openS3.ctx_manager.OpenS3.open`,
+        except that 'ab' mode is not supported: appending is done server side
+        with a multipart upload, which this client doesn't implement. Use
+        :py:class:`~openS3.ctx_manager.OpenS3` to append.
+        """
+        if mode not in VALID_MODES:
+            raise ValueError('{} is not a valid mode for opening an S3 object.'.format(mode))
+        if mode == 'ab':
+            raise ValueError('AsyncOpenS3 does not support append mode.')
+        return AsyncS3File(self, object_key, mode, content_type, acl,
+                           extra_request_headers or {})
+
+    def close(self):
+        """Close all idle connections."""
+        self.pool.close()
+
+    async def _urlopen(self, method, path, query=None, headers=None, body=b''):
+        """
+        Sign and send a request. Return a 2-tuple of the connection and the
+        response, whose body has not been read yet.
+        """
+        query = query or {}
+        headers = dict(headers or {})
+        headers['Host'] = self.netloc
+        payload_hash = hashlib.sha256(body).hexdigest() if body else EMPTY_PAYLOAD_SHA256
+        headers = self.signer.sign(method, path, query, headers, payload_hash)
+        headers['Content-Length'] = str(len(body))
+        return await self.pool.urlopen(method, get_request_target(path, query), headers, body)
+
+    async def _request(self, method, path, query=None, headers=None, body=b''):
+        """
+        Sign and send a request. Return a 2-tuple of the response and its body.
+        """
+        conn, response = await self._urlopen(method, path, query, headers, body)
+        try:
+            response_body = await response.read()
+        except BaseException:
+            conn.close()
+            raise
+        self.pool.release(conn, response)
+        return response, response_body
+
+
+class AsyncS3File(object):
+    """
+    A handle on a single S3 object returned by :py:meth:`AsyncOpenS3.open`.
+    """
+    def __init__(self, client, object_key, mode, content_type, acl, extra_request_headers):
+        self.client = client
+        self.object_key = object_key
+        self.mode = mode
+        self.content_type = content_type or guess_content_type(object_key)
+        self.acl = acl
+        self.extra_request_headers = extra_request_headers
+        self.buffer = bytearray()
+        self.response_headers = {}
+        self._stream = None
+        self._stream_conn = None
+        self._eof = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            # Don't upload the result of a write that failed midway.
+            self.buffer = bytearray()
+        await self.close()
+
+    async def read(self, size=-1):
+        """
+        Read and return up to ``size`` bytes of the remote S3 object.
+        If ``size`` is omitted or negative, read until the end of the object.
+
+        :rtype bytes:
+        """
+        if self._eof:
+            return b''
+        if self._stream is None:
+            conn, response = await self.client._urlopen('GET', self.object_key)
+            if response.status not in (200, 204):
+                body = await response.read()
+                self.client.pool.release(conn, response)
+                if response.status == 404:
+                    raise S3FileDoesNotExistError(self.object_key)
+                raise S3IOError(
+                    'openS3 GET error. '
+                    'Response status: {}. '
+                    'Reason: {}. '
+                    'Response Text: \n'
+                    '{}'.format(response.status, response.reason, body))
+            self.response_headers = response.headers
+            self._stream, self._stream_conn = response, conn
+
+        try:
+            data = await self._stream.read(-1 if size is None else size)
+        except BaseException:
+            self._stream_conn.close()
+            self._stream = self._stream_conn = None
+            raise
+        if self._stream.complete:
+            self._close_stream()
+            self._eof = True
+        return data
+
+    async def write(self, content):
+        """
+        Write content to file in S3. The object is uploaded on :py:meth:`close`.
+
+        Unlike :py:meth:`openS3.ctx_manager.S3File.write`, the whole object is
+        kept in memory until then and is sent with a single PUT, whatever its
+        size. Write large objects with :py:class:`~openS3.ctx_manager.OpenS3`,
+        which spools them to disk and uploads them in parts.
+
+        :param content: A str or bytes-like object.
+        """
+        if self.mode != 'wb':
+            raise RuntimeError('Must open file in write mode to write to file.')
+        self.buffer += to_bytes(content)
+
+    async def close(self):
+        self._close_stream()
+        if self.mode == 'wb' and self.buffer:
+            await self._put()
+            self.buffer = bytearray()
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self.client.pool.release(self._stream_conn, self._stream)
+            self._stream = self._stream_conn = None
+
+    async def _put(self):
+        body = bytes(self.buffer)
+        headers = {
+            'Content-MD5': b64_string(hashlib.md5(body).digest()),
+            'Content-Type': self.content_type,
+            'x-amz-acl': self.acl,
+        }
+        headers.update(self.extra_request_headers)
+        response, response_body = await self.client._request(
+            'PUT', self.object_key, headers=headers, body=body)
+        if response.status not in (200, 204):
+            raise S3IOError(
+                'openS3 PUT error. '
+                'Response status: {}. '
+                'Reason: {}. '
+                'Response Text: \n'
+                '{}'.format(response.status, response.reason, response_body))
+
+    async def exists(self):
+        """
+        Return ``True`` if file exists in S3 bucket.
+        """
+        response, _ = await self.client._request('HEAD', self.object_key)
+        if response.status in (200, 404):
+            if response.status == 200:
+                self.response_headers = response.headers
+            return response.status == 200
+        raise S3IOError(
+            'openS3 HEAD error. '
+            'Response status: {}. '
+            'Reason: {}.'.format(response.status, response.reason))
+
+    async def delete(self):
+        """
+        Remove file from its S3 bucket.
+        """
+        response, body = await self.client._request('DELETE', self.object_key)
+        if response.status not in (200, 204):
+            raise S3IOError(
+                'openS3 DELETE error. '
+                'Response status: {}. '
+                'Reason: {}. '
+                'Response Text: \n'
+                '{}'.format(response.status, response.reason, body))
+
+    async def listdir(self):
+        """
+        Return a 2-tuple of directories and files in ``object_key``.
+
+        :rtype: tuple
+        """
+        if self.mode != 'rb':
+            raise ValueError('Mode must be "rb" when calling listdir.')
+        if self.object_key[-1] != '/':
+            raise ValueError('listdir can only operate on directories (ie. object keys that '
+                             'end in "/"). Given key: {}'.format(self.object_key))
+
+        prefix = self.object_key.lstrip('/')
+        query = {'list-type': '2', 'delimiter': '/'}
+        if prefix:
+            query['prefix'] = prefix
+        dirs, files = set(), set()
+        while True:
+            response, body = await self.client._request('GET', '/', query=query)
+            if response.status not in (200, 204):
+                raise S3IOError(
+                    'openS3 GET error during listdir. '
+                    'Response status: {}. '
+                    'Reason: {}. '
+                    'Response Text: \n'
+                    '{}'.format(response.status, response.reason, body))
+            root = ElementTree.fromstring(body)
+            namespaces = get_xml_namespaces(root)
+            for element in root.findall('aws:CommonPrefixes/aws:Prefix', namespaces):
+                dirs.add(element.text[len(prefix):].rstrip('/'))
+            for element in root.findall('aws:Contents/aws:Key', namespaces):
+                name = element.text[len(prefix):]
+                # Skip the "directory" object itself, if there is one.
+                if name:
+                    files.add(name)
+            token = root.find('aws:NextContinuationToken', namespaces)
+            if token is None:
+                return dirs, files
+            query['continuation-token'] = token.text
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from .constants import MAX_DELETE_BATCH_SIZE
+from .utils import S3IOError, get_xml_namespaces
+
+
+class BatchDelete(object):
+    """
+    Delete many S3 objects with the Multi-Object Delete API.
+
+    Keys are sent in batches of up to 1000 per ``POST ?delete`` request, with
+    up to ``workers`` batches in flight at once. Keys are consumed lazily, so
+    an iterator that produces keys page by page (eg. a listing) is deleted
+    while it is still being produced.
+    """
+    def __init__(self, opener, workers, batch_size=MAX_DELETE_BATCH_SIZE):
+        """
+        :param opener: The :py:class:`~openS3.ctx_manager.OpenS3` object used to
+            sign and send requests.
+        :param workers: Number of batches deleted concurrently.
+        :param batch_size: Number of keys per request. At most 1000.
+        """
+        if not 0 < batch_size <= MAX_DELETE_BATCH_SIZE:
+            raise ValueError('batch_size must be between 1 and {}. Given: {}'
+                             ''.format(MAX_DELETE_BATCH_SIZE, batch_size))
+        self.opener = opener
+        self.workers = workers
+        self.batch_size = batch_size
+        self.num_deleted = 0
+
+    def _delete_batch(self, keys):
+        """
+        Delete one batch of keys. Return a dict mapping each key that could not
+        be deleted to the error S3 reported for it.
+        """
+        objects = ''.join('<Object><Key>{}</Key></Object>'.format(escape(key)) for key in keys)
+        body = ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<Delete><Quiet>true</Quiet>{}</Delete>'.format(objects)).encode()
+        query = {'delete': ''}
+        headers = self.opener._build_request_headers('POST', '/', content=body, query=query)
+        response, response_body = self.opener._request('POST', '/', body, headers, query)
+        if response.status != 200:
+            raise S3IOError(
+                'openS3 POST error during delete. '
+                'Response status: {}. '
+                'Reason: {}. '
+                'Response Text: \n'
+                '{}'.format(response.status, response.reason, response_body))
+
+        for key in keys:
+            self.opener._invalidate(key)
+        root = ElementTree.fromstring(response_body)
+        namespaces = get_xml_namespaces(root)
+        errors = {}
+        for error in root.findall('aws:Error', namespaces):
+            errors[error.findtext('aws:Key', '', namespaces)] = '{}: {}'.format(
+                error.findtext('aws:Code', '', namespaces),
+                error.findtext('aws:Message', '', namespaces))
+        # In quiet mode S3 only reports the keys it could not delete.
+        return errors
+
+    def run(self, keys):
+        """
+        Delete ``keys`` and return a dict mapping each key that could not be
+        deleted to the error S3 reported for it.
+
+        :param keys: An iterable of object keys. Leading slashes are ignored.
+        """
+        keys = (key.lstrip('/') for key in keys)
+        num_keys = 0
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = []
+            while True:
+                batch = list(islice(keys, self.batch_size))
+                if not batch:
+                    break
+                num_keys += len(batch)
+                # Don't read further ahead than the workers can keep up with.
+                if len(futures) >= self.workers * 2:
+                    errors.update(futures.pop(0).result())
+                futures.append(executor.submit(self._delete_batch, batch))
+            for future in futures:
+                errors.update(future.result())
+        self.num_deleted = num_keys - len(errors)
+        return errors
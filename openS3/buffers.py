@@ -0,0 +1,119 @@
+from collections import deque
+from tempfile import SpooledTemporaryFile
+
+from .checksums import Digest
+from .constants import DEFAULT_CHUNK_SIZE, DEFAULT_SPOOL_MAX_SIZE
+
+
+class SpooledBuffer(object):
+    """
+    An append-only byte buffer that is kept in memory until it grows past
+    ``max_size`` bytes, after which it is moved to a temporary file on disk.
+
+    Digests are computed as bytes are written: one of everything written
+    (:py:attr:`digest`) and, if ``part_size`` is given, one of each
+    ``part_size`` part, so nothing has to be read back to be hashed.
+    """
+    def __init__(self, max_size=DEFAULT_SPOOL_MAX_SIZE, part_size=None, crc32c=False):
+        """
+        :param max_size: Number of bytes kept in memory before moving to disk.
+        :param part_size: Size in bytes of the parts :py:meth:`pop_parts` yields.
+        :param crc32c: Also compute CRC32C checksums.
+        """
+        self.max_size = max_size
+        self.part_size = part_size
+        self.crc32c = crc32c
+        self._file = SpooledTemporaryFile(max_size=max_size)
+        self._size = 0
+        # Digest of every byte ever written, including parts already popped.
+        self.digest = Digest(crc32c)
+        # Digests of the complete parts still in the buffer, and of the bytes after them.
+        self._part_digests = deque()
+        self._tail_digest = Digest(crc32c)
+        self._popped = False
+
+    def __len__(self):
+        return self._size
+
+    def write(self, data):
+        """Append ``data`` to the end of the buffer."""
+        self._file.seek(0, 2)
+        self._file.write(data)
+        self._size += len(data)
+        self.digest.update(data)
+        if not self.part_size:
+            self._tail_digest.update(data)
+            return
+        view = memoryview(data)
+        while view:
+            room = self.part_size - self._tail_digest.size
+            self._tail_digest.update(view[:room])
+            view = view[room:]
+            if self._tail_digest.size == self.part_size:
+                self._part_digests.append(self._tail_digest)
+                self._tail_digest = Digest(self.crc32c)
+
+    def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yield the contents of the buffer in chunks of at most ``chunk_size`` bytes."""
+        self._file.seek(0)
+        while True:
+            chunk = self._file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def reader(self):
+        """
+        Return a file object positioned at the start of the buffer, suitable
+        as the body of an HTTP request.
+        """
+        self._file.seek(0)
+        return self._file
+
+    def getvalue(self):
+        """Return the whole contents of the buffer as bytes."""
+        self._file.seek(0)
+        return self._file.read()
+
+    def pop_parts(self):
+        """
+        Remove complete ``part_size`` chunks from the front of the buffer and
+        yield a 2-tuple of each one and its :py:class:`~openS3.checksums.Digest`.
+        Whatever is left over stays in the buffer.
+
+        Only one part is read into memory at a time, so a consumer that blocks
+        between parts keeps memory bounded. The generator must be exhausted.
+        """
+        if not self.part_size:
+            raise ValueError('pop_parts needs a buffer created with a part_size.')
+        if not self._part_digests:
+            return
+        self._popped = True
+        self._file.seek(0)
+        while self._part_digests:
+            self._size -= self.part_size
+            yield self._file.read(self.part_size), self._part_digests.popleft()
+
+        remainder = self._file.read()
+        self._file.close()
+        self._file = SpooledTemporaryFile(max_size=self.max_size)
+        self._file.write(remainder)
+
+    def contents_digest(self):
+        """
+        Return the :py:class:`~openS3.checksums.Digest` of the bytes currently
+        in the buffer. It is only computed from scratch when parts have been
+        popped and complete parts have been written since.
+        """
+        if not self._popped:
+            return self.digest
+        if not self._part_digests:
+            return self._tail_digest
+        digest = Digest(self.crc32c)
+        for chunk in self.iter_chunks():
+            digest.update(chunk)
+        return digest
+
+    def close(self):
+        self._file.close()
+        self._size = 0
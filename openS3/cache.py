@@ -0,0 +1,374 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from .constants import (
+    DEFAULT_CACHE_MAX_SIZE, DEFAULT_METADATA_TTL, DEFAULT_METADATA_NEGATIVE_TTL,
+    DEFAULT_METADATA_CACHE_MAXSIZE)
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows. Processes sharing a cache directory there
+    # may evict each other's entries a little too eagerly, but never corrupt them.
+    fcntl = None
+
+# Suffix of the files that hold cached objects.
+ENTRY_SUFFIX = '.obj'
+# Name of the lock file that serializes eviction between processes.
+LOCK_FILE_NAME = '.lock'
+
+
+class CacheEntry(object):
+    """
+    A cached S3 object, opened for reading. It reads like the body of the
+    HTTP response it replaces.
+    """
+    def __init__(self, file, metadata, path):
+        self._file = file
+        self.path = path
+        self.etag = metadata['etag']
+        self.headers = metadata['headers']
+        self.size = metadata['size']
+        self._remaining = self.size
+
+    def read(self, size=-1):
+        """Read and return up to ``size`` bytes, or the rest of the object if negative."""
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def readinto(self, buffer):
+        """Read up to ``len(buffer)`` bytes into ``buffer`` and return the number read."""
+        with memoryview(buffer) as view, view[:self._remaining] as view:
+            n = self._file.readinto(view)
+        self._remaining -= n
+        return n
+
+    def isclosed(self):
+        """Return ``True`` once the object has been read to the end or closed."""
+        return self._remaining == 0 or self._file.closed
+
+    def close(self):
+        self._file.close()
+
+
+class CacheWriter(object):
+    """
+    A :py:class:`DiskCache` entry being written. Nothing is visible to
+    readers until :py:meth:`commit` puts the entry in place.
+    """
+    def __init__(self, cache, bucket, object_key, metadata):
+        self.cache = cache
+        self.bucket = bucket
+        self.object_key = object_key
+        self.path = cache._path(bucket, object_key)
+        # Number of bytes of the object written so far.
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.directory, suffix='.tmp')
+        self._file = os.fdopen(fd, 'wb')
+        try:
+            self._file.write(json.dumps(metadata).encode() + b'\n')
+        except BaseException:
+            self.abort()
+            raise
+
+    def write(self, data):
+        """Append ``data`` to the object."""
+        self._file.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        """Put the entry in place and return a :py:class:`CacheEntry` to read it back."""
+        try:
+            self._file.close()
+            # Open the entry before it is renamed, so the handle stays valid
+            # even if another process replaces or evicts it right away.
+            entry = self.cache._open(self.tmp_path, self.bucket, self.object_key)
+            # Readers only ever see complete entries.
+            os.replace(self.tmp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+        entry.path = self.path
+        self.cache.evict()
+        return entry
+
+    def abort(self):
+        """Throw away what was written."""
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+class CachingReader(object):
+    """
+    Reads the body of the HTTP response ``raw`` and writes each byte read to
+    a :py:class:`CacheWriter` on the way, so that an object is cached without
+    being downloaded ahead of the reader. The entry is only put in place if
+    the body is read to the end; a reader that stops early leaves nothing
+    behind and doesn't pay for the rest of the object.
+
+    If the cache can't be written to (eg. the disk is full) the entry is
+    dropped and reading carries on.
+    """
+    def __init__(self, raw, writer, size=None):
+        """
+        :param raw: An :py:class:`http.client.HTTPResponse`.
+        :param writer: The :py:class:`CacheWriter` to write to.
+        :param size: Length of the body, if known. A shorter body isn't cached.
+        """
+        self.raw = raw
+        self.writer = writer
+        self.size = size
+
+    def _write(self, data):
+        if self.writer is None:
+            return
+        try:
+            self.writer.write(data)
+        except OSError:
+            self.writer.abort()
+            self.writer = None
+
+    def read(self, size=-1):
+        data = self.raw.read() if size is None or size < 0 else self.raw.read(size)
+        self._write(data)
+        return data
+
+    def readinto(self, buffer):
+        n = self.raw.readinto(buffer)
+        with memoryview(buffer) as view, view[:n] as view:
+            self._write(view)
+        return n
+
+    def isclosed(self):
+        return self.raw.isclosed()
+
+    def close(self):
+        """
+        Put the entry in place if the whole body was read, or throw it away.
+        Doesn't close ``raw``.
+        """
+        writer, self.writer = self.writer, None
+        if writer is None:
+            return
+        if not self.raw.isclosed() or (self.size is not None and writer.size != self.size):
+            writer.abort()
+            return
+        try:
+            writer.commit().close()
+        except OSError:
+            pass
+
+
+class DiskCache(object):
+    """
+    A read-through cache of S3 objects in a local directory.
+
+    Each object is stored in a single file together with its ETag, so a read
+    can be revalidated with an ``If-None-Match`` request and served from disk
+    when S3 answers ``304 Not Modified``. Once the files add up to more than
+    ``max_size`` bytes, the least recently read ones are evicted.
+
+    Entries are written to a temporary file and renamed into place, so readers
+    never see a partial entry. Several threads and processes on one host can
+    share a cache directory.
+    """
+    def __init__(self, directory, max_size=DEFAULT_CACHE_MAX_SIZE):
+        """
+        :param directory: Directory to keep cached objects in. Created if missing.
+        :param max_size: Total size in bytes the cached objects may take up.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    def _path(self, bucket, object_key):
+        object_key = object_key.lstrip('/')
+        name = hashlib.sha256('{}\0{}'.format(bucket, object_key).encode()).hexdigest()
+        return os.path.join(self.directory, name + ENTRY_SUFFIX)
+
+    def get(self, bucket, object_key):
+        """
+        Return the :py:class:`CacheEntry` for ``object_key``, or ``None`` if it
+        is not cached. The caller must close the entry.
+        """
+        path = self._path(bucket, object_key)
+        entry = self._open(path, bucket, object_key)
+        if entry is not None:
+            # The modification time records when the entry was last read.
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return entry
+
+    def _open(self, path, bucket, object_key):
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            metadata = json.loads(file.readline().decode())
+            if metadata['bucket'] != bucket or metadata['key'] != object_key.lstrip('/'):
+                file.close()
+                return None
+            metadata['size'] = os.fstat(file.fileno()).st_size - file.tell()
+        except (OSError, ValueError, KeyError):
+            file.close()
+            return None
+        return CacheEntry(file, metadata, path)
+
+    def put(self, bucket, object_key, etag, headers, chunks):
+        """
+        Store an object and return a :py:class:`CacheEntry` to read it back.
+
+        :param etag: ETag of the object.
+        :param headers: A dict of response headers to keep with the object.
+        :param chunks: An iterable of the bytes of the object.
+        """
+        writer = self.writer(bucket, object_key, etag, headers)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def writer(self, bucket, object_key, etag, headers):
+        """
+        Return a :py:class:`CacheWriter` to store an object a piece at a time.
+        See :py:meth:`put`.
+        """
+        metadata = {
+            'bucket': bucket,
+            'key': object_key.lstrip('/'),
+            'etag': etag,
+            'headers': headers,
+        }
+        return CacheWriter(self, bucket, object_key, metadata)
+
+    def delete(self, bucket, object_key):
+        """Remove ``object_key`` from the cache, if it is there."""
+        try:
+            os.remove(self._path(bucket, object_key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """Remove every cached object."""
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def evict(self):
+        """
+        Remove the least recently read objects until the cache fits in
+        ``max_size`` bytes. Return the number of objects removed.
+        """
+        with self._lock, open(os.path.join(self.directory, LOCK_FILE_NAME), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(ENTRY_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+            num_removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                    num_removed += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+            return num_removed
+
+
+class MetadataCache(object):
+    """
+    An in-process cache of :py:class:`~openS3.utils.ObjectMetadata` per key,
+    so that :py:meth:`~openS3.ctx_manager.OpenS3.exists` and friends don't
+    send a HEAD request every time.
+
+    Keys that don't exist are remembered too, for ``negative_ttl`` seconds.
+    Once ``maxsize`` keys are cached, the least recently used are dropped.
+    A single :py:class:`MetadataCache` can be shared by many threads and
+    :py:class:`~openS3.ctx_manager.OpenS3` objects.
+    """
+    def __init__(self, ttl=DEFAULT_METADATA_TTL, negative_ttl=DEFAULT_METADATA_NEGATIVE_TTL,
+                 maxsize=DEFAULT_METADATA_CACHE_MAXSIZE):
+        """
+        :param ttl: Seconds the metadata of an existing object is trusted for.
+        :param negative_ttl: Seconds a key found not to exist is trusted for.
+        :param maxsize: Maximum number of keys to remember.
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, bucket, object_key):
+        """
+        Return a 2-tuple of whether ``object_key`` is cached and its metadata.
+        The metadata is ``None`` if the key is cached as not existing.
+        """
+        key = (bucket, object_key.lstrip('/'))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, metadata = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, metadata
+
+    def set(self, bucket, object_key, metadata):
+        """
+        Remember ``metadata`` for ``object_key``. Pass ``None`` to remember
+        that the key does not exist.
+        """
+        ttl = self.negative_ttl if metadata is None else self.ttl
+        if ttl <= 0:
+            return
+        key = (bucket, object_key.lstrip('/'))
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, metadata)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, bucket, object_key):
+        """Forget what is known about ``object_key``."""
+        with self._lock:
+            self._entries.pop((bucket, object_key.lstrip('/')), None)
+
+    def clear(self):
+        """Forget every key."""
+        with self._lock:
+            self._entries.clear()
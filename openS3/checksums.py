@@ -0,0 +1,105 @@
+import hashlib
+import struct
+
+from .utils import b64_string
+
+try:
+    # Optional C implementation: pip install crc32c
+    import crc32c as _crc32c
+except ImportError:
+    _crc32c = None
+
+
+def _make_crc32c_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC32C_TABLE = _make_crc32c_table()
+
+
+def crc32c(data, value=0):
+    """
+    Return the CRC32C (Castagnoli) checksum of ``data``, continuing from the
+    checksum ``value`` of the bytes before it.
+
+    Uses the ``crc32c`` package when it is installed. The pure Python
+    fallback works everywhere but is much slower.
+    """
+    if _crc32c is not None:
+        return _crc32c.crc32c(data, value)
+    table = _CRC32C_TABLE
+    crc = value ^ 0xFFFFFFFF
+    for byte in data:
+        crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+class Digest(object):
+    """
+    Running MD5 and SHA256 digests, and optionally a CRC32C checksum, of a
+    stream of bytes. Each byte is hashed once, as it is passed to
+    :py:meth:`update`, and the results are ready in the formats S3 headers
+    expect without reading the data again.
+    """
+    def __init__(self, crc32c=False):
+        """
+        :param crc32c: Also compute a CRC32C checksum.
+        """
+        self._md5 = hashlib.md5()
+        self._sha256 = hashlib.sha256()
+        self._crc32c = 0 if crc32c else None
+        self.size = 0
+
+    def update(self, data):
+        """Add ``data`` to the digests."""
+        self._md5.update(data)
+        self._sha256.update(data)
+        if self._crc32c is not None:
+            self._crc32c = crc32c(data, self._crc32c)
+        self.size += len(data)
+
+    def copy(self):
+        """Return an independent copy of the digests so far."""
+        digest = Digest.__new__(Digest)
+        digest._md5 = self._md5.copy()
+        digest._sha256 = self._sha256.copy()
+        digest._crc32c = self._crc32c
+        digest.size = self.size
+        return digest
+
+    @property
+    def md5(self):
+        """Hex MD5 digest, as found in the ETag of a single part upload."""
+        return self._md5.hexdigest()
+
+    @property
+    def content_md5(self):
+        """Base64 encoded MD5 digest, for the ``Content-MD5`` header."""
+        return b64_string(self._md5.digest())
+
+    @property
+    def sha256(self):
+        """Hex SHA256 digest, for the ``x-amz-content-sha256`` header."""
+        return self._sha256.hexdigest()
+
+    @property
+    def crc32c(self):
+        """
+        Base64 encoded CRC32C checksum, for the ``x-amz-checksum-crc32c``
+        header, or ``None`` if it is not being computed.
+        """
+        if self._crc32c is None:
+            return None
+        return b64_string(struct.pack('>I', self._crc32c))
+
+    def checksum_headers(self):
+        """Return a dict of the ``x-amz-checksum-*`` headers for the data."""
+        if self._crc32c is None:
+            return {}
+        return {'x-amz-checksum-crc32c': self.crc32c}
@@ -0,0 +1,149 @@
+"""
+Streaming compression of objects as they are written, and decompression as
+they are read, for :py:meth:`OpenS3.open(..., compression=...)
+<openS3.ctx_manager.OpenS3.open>`. The object is stored compressed with its
+``Content-Encoding`` set, so S3 and every client agree on what it holds.
+"""
+import gzip
+import io
+import zlib
+
+try:
+    # Optional: pip install zstandard
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+from .constants import (
+    COMPRESSION_GZIP, COMPRESSION_ZSTD, COMPRESSION_AUTO, COMPRESSIBLE_CONTENT_TYPES,
+    DEFAULT_GZIP_LEVEL, DEFAULT_ZSTD_LEVEL)
+
+# Content-Encoding values of the encodings that can be decompressed.
+CONTENT_ENCODINGS = {
+    'gzip': COMPRESSION_GZIP,
+    'x-gzip': COMPRESSION_GZIP,
+    'zstd': COMPRESSION_ZSTD,
+}
+
+
+def _require_zstd():
+    if _zstd is None:
+        raise RuntimeError('zstd compression needs the zstandard package: '
+                           'pip install openS3[zstd]')
+
+
+def is_compressible(content_type):
+    """Return ``True`` if objects of ``content_type`` are worth compressing."""
+    content_type = (content_type or '').partition(';')[0].strip().lower()
+    return content_type.startswith('text/') or content_type in COMPRESSIBLE_CONTENT_TYPES
+
+
+def get_write_encoding(compression, content_type):
+    """
+    Return the encoding to compress an object of ``content_type`` with, or
+    ``None`` if it shouldn't be compressed.
+
+    :param compression: 'gzip', 'zstd', 'auto' or ``None``.
+    """
+    if compression == COMPRESSION_AUTO:
+        if not is_compressible(content_type):
+            return None
+        return COMPRESSION_ZSTD if _zstd is not None else COMPRESSION_GZIP
+    return compression
+
+
+def get_append_encoding(compression, content_encoding):
+    """
+    Return the encoding to compress bytes appended to an object with, which
+    is the encoding the object is already stored with.
+
+    :param compression: 'gzip', 'zstd', 'auto' or ``None``.
+    :param content_encoding: Value of the ``Content-Encoding`` header of the object.
+    :raises ValueError: If the object's encoding can't be appended to, or
+        ``compression`` asks for a different one.
+    """
+    encoding = None
+    if content_encoding:
+        encoding = CONTENT_ENCODINGS.get(content_encoding.strip().lower())
+        if encoding is None:
+            raise ValueError('Can not append to an object with Content-Encoding: {}'
+                             ''.format(content_encoding))
+    if compression in (COMPRESSION_GZIP, COMPRESSION_ZSTD) and compression != encoding:
+        raise ValueError('{} compression does not match the Content-Encoding of the '
+                         'object: {}'.format(compression, content_encoding))
+    return encoding
+
+
+def get_read_encoding(compression, content_encoding):
+    """
+    Return the encoding to decompress an object with, or ``None`` if it is
+    to be read as it is stored.
+
+    :param compression: 'gzip', 'zstd', 'auto' or ``None``. 'gzip' and
+        'zstd' decompress even objects without a ``Content-Encoding``.
+    :param content_encoding: Value of the ``Content-Encoding`` header of the object.
+    """
+    if compression == COMPRESSION_AUTO:
+        return CONTENT_ENCODINGS.get((content_encoding or '').strip().lower())
+    return compression
+
+
+def get_compressor(encoding):
+    """
+    Return an object whose ``compress(data)`` and ``flush()`` methods return
+    the compressed bytes of what was passed so far.
+    """
+    if encoding == COMPRESSION_ZSTD:
+        _require_zstd()
+        return _zstd.ZstdCompressor(level=DEFAULT_ZSTD_LEVEL).compressobj()
+    # wbits of 16 + MAX_WBITS writes a gzip header and trailer.
+    return zlib.compressobj(DEFAULT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+class DecompressingReader(object):
+    """
+    Reads the decompressed bytes of the compressed stream ``raw`` (eg. an
+    :py:class:`http.client.HTTPResponse`). Compressed bytes are pulled from
+    ``raw`` a bounded chunk at a time and no more output than asked for is
+    produced, so memory use doesn't depend on how well the object compresses.
+    Concatenated gzip members or zstd frames, as left by appending, are read
+    one after the other.
+    """
+    def __init__(self, raw, encoding):
+        """
+        :param raw: A binary stream of compressed bytes.
+        :param encoding: 'gzip' or 'zstd'.
+        """
+        self.raw = raw
+        if encoding == COMPRESSION_ZSTD:
+            _require_zstd()
+            reader = _zstd.ZstdDecompressor().stream_reader(raw, read_across_frames=True,
+                                                            closefd=False)
+            self._file = io.BufferedReader(reader)
+        else:
+            self._file = gzip.GzipFile(fileobj=raw, mode='rb')
+        self._eof = False
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._file.read()
+            self._eof = True
+            return data
+        data = self._file.read(size)
+        if len(data) < size:
+            self._eof = True
+        return data
+
+    def readinto(self, buffer):
+        n = self._file.readinto(buffer)
+        if not n:
+            self._eof = True
+        return n
+
+    def isclosed(self):
+        """Return ``True`` once the end of the decompressed stream has been reached."""
+        return self._eof
+
+    def close(self):
+        """Close the decompressor, but not ``raw``."""
+        self._file.close()
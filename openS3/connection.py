@@ -0,0 +1,317 @@
+from collections import deque
+from http.client import HTTPConnection, HTTPSConnection, RemoteDisconnected
+import select
+import ssl
+import threading
+import time
+
+from .constants import DEFAULT_POOL_MAXSIZE, DEFAULT_POOL_IDLE_TIMEOUT, DEFAULT_CHUNK_SIZE
+from .instrumentation import RequestTrace, CountingReader, REQUEST_START
+
+
+# Errors raised by http.client when the server has silently closed a
+# keep-alive connection that we pulled out of the pool.
+STALE_CONNECTION_ERRORS = (RemoteDisconnected, ConnectionResetError,
+                           BrokenPipeError, ConnectionAbortedError)
+
+
+def is_connection_dropped(conn):
+    """
+    Return ``True`` if the socket behind ``conn`` has been closed by the peer.
+
+    An idle keep-alive socket should never be readable. If it is, the server
+    has either closed it (a read would return ``b''``) or sent data we never
+    asked for. Either way the connection can not be reused.
+    """
+    sock = conn.sock
+    if sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+def create_ssl_context(cafile=None):
+    """
+    Return an :py:class:`ssl.SSLContext` that verifies certificates and host
+    names and speaks TLS 1.2 or later.
+
+    :param cafile: Path of a file of CA certificates to trust instead of the
+        system's default ones.
+    """
+    context = ssl.create_default_context(cafile=cafile)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.set_alpn_protocols(['http/1.1'])
+    return context
+
+
+class TLSSessionCache(object):
+    """
+    The TLS session last issued by a host, shared by the connections of a
+    pool so that new connections resume it with an abbreviated handshake
+    rather than a full one. Also counts the handshakes made and the time
+    they took.
+    """
+    def __init__(self):
+        self.session = None
+        self.num_handshakes = 0
+        self.num_resumed = 0
+        # Total seconds spent in handshakes.
+        self.handshake_time = 0.0
+        self._lock = threading.Lock()
+
+    def remember(self, sock):
+        """
+        Keep the session of ``sock`` for new connections to resume. With TLS
+        1.3 the session ticket only arrives after the handshake, so this is
+        called again each time a connection goes back to the pool.
+        """
+        session = sock.session
+        if session is not None and session.has_ticket:
+            self.session = session
+
+    def record(self, seconds, resumed):
+        with self._lock:
+            self.num_handshakes += 1
+            self.num_resumed += 1 if resumed else 0
+            self.handshake_time += seconds
+
+
+class TLSConnection(HTTPSConnection):
+    """
+    An :py:class:`http.client.HTTPSConnection` that resumes the session
+    in a :py:class:`TLSSessionCache` and times its handshake.
+    """
+    def __init__(self, host, sessions=None, **kwargs):
+        super().__init__(host, **kwargs)
+        self.sessions = sessions
+        # Seconds the TLS handshake took, and whether it resumed a session.
+        self.handshake_duration = None
+        self.session_reused = None
+
+    def connect(self):
+        HTTPConnection.connect(self)
+        server_hostname = self._tunnel_host or self.host
+        session = self.sessions.session if self.sessions is not None else None
+        start = time.perf_counter()
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname,
+                                              session=session)
+        self.handshake_duration = time.perf_counter() - start
+        self.session_reused = self.sock.session_reused
+        if self.sessions is not None:
+            self.sessions.record(self.handshake_duration, self.session_reused)
+            self.sessions.remember(self.sock)
+
+
+class ConnectionPool(object):
+    """
+    A thread-safe pool of persistent (keep-alive) HTTP connections to a single host.
+
+    With an ``ssl_context``, connections use HTTPS. Every connection of the
+    pool shares the context and resumes the TLS session of the last one, so
+    only the first connection to a host pays for a full handshake. The
+    handshakes made are counted by :py:attr:`tls_sessions`.
+    """
+    def __init__(self, host, maxsize=DEFAULT_POOL_MAXSIZE,
+                 idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT, timeout=None,
+                 connection_class=None, ssl_context=None):
+        """
+        Create a new pool of connections to ``host``.
+
+        :param host: Host (and optional port) to connect to (eg. bucket.s3.amazonaws.com).
+        :param maxsize: Maximum number of idle connections kept for reuse.
+        :param idle_timeout: Seconds after which an idle connection is discarded
+            rather than reused.
+        :param timeout: Socket timeout passed to each new connection.
+        :param connection_class: Class used to create new connections. Defaults
+            to :py:class:`TLSConnection` with an ``ssl_context`` and
+            :py:class:`http.client.HTTPConnection` without.
+        :param ssl_context: An :py:class:`ssl.SSLContext` shared by all connections.
+            See :py:func:`create_ssl_context`.
+        """
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1. Given: {}'.format(maxsize))
+        if connection_class is None:
+            connection_class = HTTPConnection if ssl_context is None else TLSConnection
+        if ssl_context is None and issubclass(connection_class, TLSConnection):
+            ssl_context = create_ssl_context()
+        self.host = host
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.connection_class = connection_class
+        self.ssl_context = ssl_context
+        self.tls_sessions = (
+            TLSSessionCache() if issubclass(connection_class, TLSConnection) else None)
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.num_connections = 0
+        self.num_reused = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def scheme(self):
+        """'https' if the pool's connections use TLS, 'http' otherwise."""
+        return 'https' if issubclass(self.connection_class, HTTPSConnection) else 'http'
+
+    def _new_connection(self):
+        with self._lock:
+            self.num_connections += 1
+        kwargs = {'blocksize': DEFAULT_CHUNK_SIZE}
+        if self.timeout is not None:
+            kwargs['timeout'] = self.timeout
+        if self.tls_sessions is not None:
+            kwargs['context'] = self.ssl_context
+            kwargs['sessions'] = self.tls_sessions
+        return self.connection_class(self.host, **kwargs)
+
+    def get(self):
+        """
+        Return a 2-tuple of a connection and a boolean that is ``True`` when
+        the connection was taken from the pool rather than newly created.
+        """
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                # LIFO: the most recently used connection is the least likely
+                # to have been closed by the server.
+                conn, last_used = self._idle.pop()
+            if now - last_used > self.idle_timeout or is_connection_dropped(conn):
+                conn.close()
+                continue
+            with self._lock:
+                self.num_reused += 1
+            return conn, True
+        return self._new_connection(), False
+
+    def put(self, conn):
+        """
+        Return ``conn`` to the pool. Connections that have been closed, and
+        connections in excess of ``maxsize``, are discarded.
+        """
+        if conn.sock is None:
+            conn.close()
+            return
+        if self.tls_sessions is not None:
+            self.tls_sessions.remember(conn.sock)
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def release(self, conn, response):
+        """
+        Return ``conn`` to the pool if ``response`` has been read to completion
+        and the server agreed to keep the connection alive. Otherwise close it.
+        """
+        complete = response.isclosed()
+        if complete and not response.will_close:
+            self.put(conn)
+        else:
+            response.close()
+            conn.close()
+        trace = getattr(response, 'trace', None)
+        if trace is not None:
+            trace.finish(complete)
+
+    def discard(self, conn, response, error=None):
+        """
+        Close ``conn`` and ``response`` after reading the response failed
+        with ``error``.
+        """
+        response.close()
+        conn.close()
+        trace = getattr(response, 'trace', None)
+        if trace is not None:
+            trace.fail(error)
+
+    def urlopen(self, method, url, body=None, headers=None, hooks=None, attempt=0, hedge=False):
+        """
+        Send a request and return a 2-tuple of the connection used and its response.
+
+        If a pooled connection turns out to have been closed by the server, the
+        request is retried once on a new connection. The caller must hand the
+        connection back with :py:meth:`release` once the response has been read,
+        or close it with :py:meth:`discard` if reading it failed.
+
+        :param hooks: :py:class:`~openS3.instrumentation.Hooks` to report the
+            progress of the request to. The response gets a ``trace`` attribute.
+        :param attempt: How many times the caller has sent the request before.
+        :param hedge: Whether the request duplicates one that is slow to answer.
+        """
+        headers = headers or {}
+        trace = RequestTrace(hooks, method, url, headers, attempt, hedge) if hooks else None
+        if trace is None:
+            return self._urlopen(method, url, body, headers, None)
+        trace.emit(REQUEST_START)
+        try:
+            conn, response = self._urlopen(method, url, body, headers, trace)
+        except BaseException as e:
+            trace.fail(e)
+            raise
+        if response.fp is not None:
+            response.fp = CountingReader(response.fp, trace)
+        response.trace = trace
+        trace.headers_received(response)
+        return conn, response
+
+    def _urlopen(self, method, url, body, headers, trace):
+        # Remember where a file-like body starts so it can be sent again.
+        body_position = body.tell() if hasattr(body, 'seek') else None
+        conn, reused = self.get()
+        try:
+            self._send(conn, reused, method, url, body, headers, trace)
+            return conn, conn.getresponse()
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            if body_position is not None:
+                body.seek(body_position)
+            elif not _is_replayable(body):
+                raise
+        except BaseException:
+            conn.close()
+            raise
+
+        if trace is not None:
+            trace.retries += 1
+        conn = self._new_connection()
+        try:
+            self._send(conn, False, method, url, body, headers, trace)
+            return conn, conn.getresponse()
+        except BaseException:
+            conn.close()
+            raise
+
+    def _send(self, conn, reused, method, url, body, headers, trace):
+        if trace is not None:
+            if not reused:
+                # Connect now rather than in request() so the time it takes
+                # is reported apart from the time to first byte.
+                conn.connect()
+                trace.tls_handshake_duration = getattr(conn, 'handshake_duration', None)
+                trace.tls_session_reused = getattr(conn, 'session_reused', None)
+            trace.connection_acquired(reused)
+        conn.request(method, url, body, headers)
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for conn, _ in idle:
+            conn.close()
+
+
+def _is_replayable(body):
+    return body is None or isinstance(body, (bytes, bytearray, memoryview, str))
@@ -4,22 +4,29 @@ ENCODING = 'utf-8'
 CONTENT_TYPES = {
     "bmp": "image/bmp",
     "css": "text/css",
+    "csv": "text/csv",
     "gif": "image/gif",
     "html": "text/html",
     "jpeg": "image/jpeg",
     "jpg": "image/jpeg",
+    "js": "application/javascript",
+    "json": "application/json",
     "mp3": "audio/mpeg",
     "pdf": "application/pdf",
     "png": "image/png",
     "rtf": "text/rtf",
     "txt": "text/plain",
     "tiff": "image/tiff",
+    "xml": "application/xml",
     "zip": "application/zip"
 }
 
 # AWS Datetime Format:  Wed, 28 Oct 2009 22:32:00 GMT
 AWS_DATETIME_FORMAT = '%a, %d %b %Y %X %Z'
 
+# AWS XML Datetime Format:  2009-10-28T22:32:00.000Z
+AWS_ISO_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
 VALID_MODES = {
     'rb': 'read',
     'wb': 'write',
@@ -28,9 +35,161 @@ VALID_MODES = {
 
 DEFAULT_CONTENT_TYPE = 'binary/octet-stream'
 
+# Deprecated and no longer used: S3File.url takes the scheme of the client's
+# pool, which is HTTPS unless the client was created with secure=False. Kept
+# so that code importing it doesn't break; it will be removed in 0.4.0.
 OBJECT_URL_SCHEME = 'http'
 
+# Presigned URLs are handed to browsers and other clients, so they use HTTPS.
+PRESIGNED_URL_SCHEME = 'https'
+
+# Number of seconds a presigned URL is valid for by default, and the longest
+# SigV4 allows (7 days).
+DEFAULT_PRESIGN_EXPIRES = 3600
+MAX_PRESIGN_EXPIRES = 7 * 24 * 60 * 60
+
 # http://docs.aws.amazon.com/general/latest/gr/rande.html#s3_region
 AWS_S3_REGION = 'us-east-1'
 
-AWS_S3_SERVICE = 's3'
\ No newline at end of file
+AWS_S3_SERVICE = 's3'
+
+# Maximum number of idle keep-alive connections an OpenS3 object keeps per host.
+DEFAULT_POOL_MAXSIZE = 10
+
+# S3 closes idle connections after roughly 20 seconds. Discard our idle
+# connections a little before that so we rarely pick up a dead socket.
+DEFAULT_POOL_IDLE_TIMEOUT = 15
+
+# Number of bytes read from a streaming response at a time.
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Objects written in 'wb' mode that grow past this many bytes are sent as a
+# multipart upload.
+DEFAULT_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+# Size of each part of a multipart upload. S3 requires all parts but the last
+# to be at least 5 MiB.
+DEFAULT_MULTIPART_PART_SIZE = 8 * 1024 * 1024
+
+# Number of threads uploading parts of a multipart upload concurrently.
+DEFAULT_MULTIPART_MAX_WORKERS = 4
+
+# Maximum number of part buffers held in memory by a multipart upload.
+DEFAULT_MULTIPART_MAX_IN_FLIGHT = 8
+
+# Number of written bytes kept in memory before the write buffer is moved to
+# a temporary file on disk.
+DEFAULT_SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+# S3 limits on the size of each part of a multipart upload. Every part but the
+# last must be at least MIN_MULTIPART_PART_SIZE bytes, and a part copied from
+# an existing object can be at most MAX_COPY_PART_SIZE bytes.
+MIN_MULTIPART_PART_SIZE = 5 * 1024 * 1024
+MAX_COPY_PART_SIZE = 5 * 1024 * 1024 * 1024
+
+# Number of byte ranges fetched concurrently by OpenS3.download_to, and the
+# size of each range.
+DEFAULT_DOWNLOAD_WORKERS = 8
+DEFAULT_DOWNLOAD_PART_SIZE = 8 * 1024 * 1024
+
+# SHA256 hex digest of an empty request body, as used by SigV4.
+EMPTY_PAYLOAD_SHA256 = 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'
+
+# Maximum number of idle keep-alive connections an AsyncOpenS3 object keeps.
+# An event loop can drive far more concurrent requests than a thread pool.
+DEFAULT_ASYNC_POOL_MAXSIZE = 100
+
+# S3 accepts at most 1000 keys per Multi-Object Delete request.
+MAX_DELETE_BATCH_SIZE = 1000
+
+# Number of Multi-Object Delete requests sent concurrently.
+DEFAULT_DELETE_WORKERS = 4
+
+# How the bodies of uploads are signed.
+# 'streaming': sent as aws-chunked chunks, each hashed and signed as it is read.
+# 'signed': hashed in full before the request is sent.
+# 'unsigned': not hashed at all (UNSIGNED-PAYLOAD). Only allowed over HTTPS.
+PAYLOAD_SIGNING_STREAMING = 'streaming'
+PAYLOAD_SIGNING_SIGNED = 'signed'
+PAYLOAD_SIGNING_UNSIGNED = 'unsigned'
+VALID_PAYLOAD_SIGNING = (PAYLOAD_SIGNING_STREAMING, PAYLOAD_SIGNING_SIGNED,
+                         PAYLOAD_SIGNING_UNSIGNED)
+
+# Size of each chunk of a streaming (aws-chunked) upload. S3 requires every
+# chunk but the last to be at least MIN_PAYLOAD_CHUNK_SIZE bytes.
+DEFAULT_PAYLOAD_CHUNK_SIZE = 64 * 1024
+MIN_PAYLOAD_CHUNK_SIZE = 8 * 1024
+
+# Total size in bytes of the objects a DiskCache keeps on disk.
+DEFAULT_CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+# Seconds a MetadataCache trusts the metadata of an existing object, and
+# (shorter, so new objects show up soon) that a key does not exist.
+DEFAULT_METADATA_TTL = 60
+DEFAULT_METADATA_NEGATIVE_TTL = 5
+
+# Maximum number of keys a MetadataCache remembers.
+DEFAULT_METADATA_CACHE_MAXSIZE = 10000
+
+# Upper bounds, in seconds, of the latency histogram buckets kept by a
+# MetricsAggregator. Slower requests fall into a final, unbounded bucket.
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Number of times a RetryPolicy sends an idempotent request before giving up,
+# and the base and cap in seconds of the exponential backoff between attempts.
+DEFAULT_RETRY_MAX_ATTEMPTS = 4
+DEFAULT_RETRY_BASE_DELAY = 0.1
+DEFAULT_RETRY_MAX_DELAY = 20.0
+
+# Response statuses S3 uses for transient errors (eg. 503 SlowDown).
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+# A HedgePolicy sends a second copy of a read that has not been answered
+# within this percentile of recent response times of the same operation,
+# once it has seen DEFAULT_HEDGE_MIN_SAMPLES of them. It remembers the last
+# DEFAULT_HEDGE_WINDOW response times per operation.
+DEFAULT_HEDGE_PERCENTILE = 0.95
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+DEFAULT_HEDGE_WINDOW = 1000
+
+# Number of threads a HedgePolicy sends hedged requests from. Each hedged
+# request occupies two while it is in flight.
+DEFAULT_HEDGE_MAX_WORKERS = 32
+
+# Number of files a sync compares and transfers concurrently.
+DEFAULT_SYNC_WORKERS = 8
+
+# How a sync decides that a file and an object of the same size are the same.
+# 'etag': the MD5 of the file matches the object's ETag (the file is read).
+# 'mtime': the copy being synced to is at least as new as the one synced from.
+# 'size': equal sizes are enough.
+SYNC_COMPARE_ETAG = 'etag'
+SYNC_COMPARE_MTIME = 'mtime'
+SYNC_COMPARE_SIZE = 'size'
+VALID_SYNC_COMPARE = (SYNC_COMPARE_ETAG, SYNC_COMPARE_MTIME, SYNC_COMPARE_SIZE)
+
+# Number of bytes read from a local file at a time while hashing or uploading it.
+FILE_READ_SIZE = 1024 * 1024
+
+# Size of the blocks an S3RawIO file fetches and caches, the number of blocks
+# it keeps, and the most blocks it reads ahead in one request while the object
+# is read sequentially.
+DEFAULT_BLOCK_SIZE = 64 * 1024
+DEFAULT_MAX_CACHED_BLOCKS = 256
+DEFAULT_MAX_READ_AHEAD = 128
+
+# Values of the compression argument of OpenS3.open. 'auto' writes with zstd
+# if the zstandard package is installed and gzip otherwise, but only objects
+# whose content type is in COMPRESSIBLE_CONTENT_TYPES or starts with 'text/',
+# and reads whatever the Content-Encoding of the object says.
+COMPRESSION_GZIP = 'gzip'
+COMPRESSION_ZSTD = 'zstd'
+COMPRESSION_AUTO = 'auto'
+VALID_COMPRESSION = (COMPRESSION_GZIP, COMPRESSION_ZSTD, COMPRESSION_AUTO)
+COMPRESSIBLE_CONTENT_TYPES = frozenset((
+    'application/json', 'application/xml', 'application/javascript', 'image/svg+xml',
+))
+
+# Compression levels used when writing.
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_ZSTD_LEVEL = 3
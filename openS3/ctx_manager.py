@@ -1,48 +1,169 @@
-from contextlib import closing
-from datetime import datetime
-import hashlib
-import hmac
-from http.client import HTTPConnection
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPSConnection
 import os
+import stat
+import time
 import urllib.parse
-from wsgiref.handlers import format_date_time
 from xml.etree import ElementTree
 
 from .constants import (
-    CONTENT_TYPES, ENCODING, VALID_MODES, DEFAULT_CONTENT_TYPE, OBJECT_URL_SCHEME,
-    AWS_S3_REGION, AWS_S3_SERVICE)
+    VALID_MODES, PRESIGNED_URL_SCHEME, DEFAULT_PRESIGN_EXPIRES,
+    MAX_PRESIGN_EXPIRES,
+    DEFAULT_POOL_MAXSIZE, DEFAULT_POOL_IDLE_TIMEOUT,
+    DEFAULT_CHUNK_SIZE, DEFAULT_MULTIPART_THRESHOLD, DEFAULT_MULTIPART_PART_SIZE,
+    DEFAULT_MULTIPART_MAX_WORKERS, DEFAULT_MULTIPART_MAX_IN_FLIGHT, DEFAULT_SPOOL_MAX_SIZE,
+    MIN_MULTIPART_PART_SIZE, MAX_COPY_PART_SIZE, DEFAULT_DOWNLOAD_WORKERS,
+    DEFAULT_DOWNLOAD_PART_SIZE, EMPTY_PAYLOAD_SHA256, DEFAULT_DELETE_WORKERS,
+    PAYLOAD_SIGNING_STREAMING, PAYLOAD_SIGNING_UNSIGNED,
+    VALID_PAYLOAD_SIGNING, DEFAULT_PAYLOAD_CHUNK_SIZE, MIN_PAYLOAD_CHUNK_SIZE,
+    DEFAULT_SYNC_WORKERS, SYNC_COMPARE_ETAG, FILE_READ_SIZE, VALID_COMPRESSION)
+from .buffers import SpooledBuffer
+from .cache import CachingReader
+from .checksums import Digest
+from .compression import (
+    DecompressingReader, get_append_encoding, get_compressor, get_read_encoding,
+    get_write_encoding)
+from .batch_delete import BatchDelete
+from .connection import ConnectionPool, create_ssl_context
+from .download import RangedDownload
+from .instrumentation import Hooks, get_operation_name
+from .multipart import MultipartUpload
+from .rawio import S3RawIO
+from .retry import RetryPolicy
+from .signing import Signer, UNSIGNED_PAYLOAD
+from .sync import Sync
 from .utils import (
-    validate_values, b64_string, S3FileDoesNotExistError, S3IOError,
-    get_canonical_query_string, get_canonical_headers_string,
-    get_signing_key, hmac_sha256, uri_encode, get_dirs_and_files)
+    validate_values, guess_content_type, S3FileDoesNotExistError, S3IOError,
+    get_request_target, uri_encode, to_bytes, get_xml_namespaces, S3Entry, ObjectMetadata,
+    readinto_fully, skip_bytes)
 
 
 class OpenS3(object):
     """
-    A context manager for interfacing with S3.
+    A client for interfacing with S3.
+
+    The client holds what is shared by every transfer: the credentials and
+    signer, the connection pool, the caches, hooks and policies. It is safe
+    to use from many threads at once. :py:meth:`open` returns a new
+    :py:class:`S3File` for each object, which holds the state of a single
+    read or write::
+
+        openS3 = OpenS3('my_bucket', '<access_key>', '<secret_key>')
+        with openS3('/my/object/key.txt', mode='wb') as fd:
+            fd.write('Yeah! Files going up to S3!')
+        with openS3('/my/object/key.txt') as fd:
+            print(fd.read())
     """
-    def __init__(self, bucket, access_key, secret_key):
+    def __init__(self, bucket, access_key, secret_key, pool=None,
+                 pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT,
+                 multipart_threshold=DEFAULT_MULTIPART_THRESHOLD,
+                 multipart_part_size=DEFAULT_MULTIPART_PART_SIZE,
+                 multipart_max_workers=DEFAULT_MULTIPART_MAX_WORKERS,
+                 multipart_max_in_flight=DEFAULT_MULTIPART_MAX_IN_FLIGHT,
+                 spool_max_size=DEFAULT_SPOOL_MAX_SIZE,
+                 payload_signing=PAYLOAD_SIGNING_STREAMING,
+                 payload_chunk_size=DEFAULT_PAYLOAD_CHUNK_SIZE, checksum_crc32c=False,
+                 cache=None, metadata_cache=None, hooks=None, retry_policy=None,
+                 hedge_policy=None, secure=True, ssl_context=None,
+                 multipart_min_part_size=MIN_MULTIPART_PART_SIZE):
         """
-        Create a new context manager for interfacing with S3.
+        Create a new client for interfacing with S3.
 
         :param bucket: An S3 bucket
         :param access_key: An AWS access key (eg. AEIFKEKWEFJFWA)
         :param secret_key: An AWS secret key.
+        :param pool: A :py:class:`~openS3.connection.ConnectionPool` to share with
+            other OpenS3 objects. If not given, a new pool is created.
+        :param pool_maxsize: Maximum number of idle keep-alive connections to keep.
+        :param pool_idle_timeout: Seconds an idle connection may sit in the pool
+            before it is discarded.
+        :param multipart_threshold: Once more than this many bytes have been written
+            in 'wb' mode, the object is sent as a multipart upload.
+        :param multipart_part_size: Size in bytes of each part of a multipart upload.
+            S3 requires every part but the last to be at least 5 MiB, so smaller
+            values are refused.
+        :param multipart_max_workers: Number of threads uploading parts concurrently.
+        :param multipart_max_in_flight: Maximum number of parts held in memory while
+            they wait for, or are being, uploaded.
+        :param spool_max_size: Number of written bytes kept in memory before the
+            write buffer is moved to a temporary file on disk.
+        :param payload_signing: How the bodies of uploads are signed. See Payload Signing below.
+        :param payload_chunk_size: Size in bytes of each chunk of a 'streaming' upload.
+        :param checksum_crc32c: Send a CRC32C checksum of every upload for S3 to verify
+            and store. Install the ``crc32c`` package to compute it quickly.
+        :param cache: A :py:class:`~openS3.cache.DiskCache` that :py:meth:`S3File.read` serves
+            objects from after checking with S3 that they have not changed.
+        :param metadata_cache: A :py:class:`~openS3.cache.MetadataCache` that
+            :py:meth:`S3File.exists`, :py:meth:`S3File.get_metadata` and
+            :py:attr:`S3File.size` consult
+            before sending a HEAD request.
+        :param hooks: :py:class:`~openS3.instrumentation.Hooks` to share with other
+            OpenS3 objects. If not given, a new, empty set of hooks is created.
+        :param retry_policy: A :py:class:`~openS3.retry.RetryPolicy` for idempotent
+            requests that fail. Defaults to ``RetryPolicy()``. Pass
+            ``RetryPolicy(max_attempts=1)`` to disable retries.
+        :param hedge_policy: A :py:class:`~openS3.retry.HedgePolicy` to hedge slow
+            GET and HEAD requests with. Requests are not hedged by default.
+        :param secure: Send requests over HTTPS. Ignored if a ``pool`` is given.
+        :param ssl_context: The :py:class:`ssl.SSLContext` every HTTPS connection
+            of the new pool shares. Defaults to
+            :py:func:`~openS3.connection.create_ssl_context`. New connections
+            resume the TLS session of earlier ones, so only the first pays for
+            a full handshake.
+        :param multipart_min_part_size: Smallest part, other than the last, the
+            server accepts. Only lower it for servers that accept smaller parts
+            than S3, such as :py:class:`~openS3.localserver.LocalS3Server` in tests.
+
+        **Payload Signing**
+
+        ===========  ==============================================================
+        value        Description
+        ===========  ==============================================================
+        'streaming'  sign the body chunk by chunk as it is sent (default)
+        'signed'     hash the whole body before sending it
+        'unsigned'   don't hash the body at all. Requires an HTTPS ``pool``
+        ===========  ==============================================================
         """
         self.bucket = bucket
         self.access_key = access_key
         self.secret_key = secret_key
-        validate_values(validation_func=lambda value: value is not None, dic=locals())
+        validate_values(validation_func=lambda value: value is not None,
+                        dic={'bucket': bucket, 'access_key': access_key, 'secret_key': secret_key})
         self.netloc = '{}.s3.amazonaws.com'.format(bucket)
-        self.mode = 'rb'
-        self.acl = 'private'
-
-        # File like attributes
-        self.object_key = ''
-        self.buffer = ''
-        self._content_type = None
-        self.response_headers = {}
-        self.extra_request_headers = {}
+        self.signer = Signer(access_key, secret_key)
+        if pool is None:
+            if secure and ssl_context is None:
+                ssl_context = create_ssl_context()
+            pool = ConnectionPool(self.netloc, maxsize=pool_maxsize,
+                                  idle_timeout=pool_idle_timeout,
+                                  ssl_context=ssl_context if secure else None)
+        self.pool = pool
+        if multipart_part_size < multipart_min_part_size:
+            raise ValueError('multipart_part_size must be at least {}. Given: {}'
+                             ''.format(multipart_min_part_size, multipart_part_size))
+        self.multipart_threshold = multipart_threshold
+        self.multipart_part_size = multipart_part_size
+        self.multipart_min_part_size = multipart_min_part_size
+        self.multipart_max_workers = multipart_max_workers
+        self.multipart_max_in_flight = multipart_max_in_flight
+        self.spool_max_size = spool_max_size
+        if payload_signing not in VALID_PAYLOAD_SIGNING:
+            raise ValueError('{} is not a valid payload signing mode.'.format(payload_signing))
+        if (payload_signing == PAYLOAD_SIGNING_UNSIGNED and
+                not issubclass(self.pool.connection_class, HTTPSConnection)):
+            raise ValueError('Unsigned payloads are only allowed over HTTPS.')
+        if payload_chunk_size < MIN_PAYLOAD_CHUNK_SIZE:
+            raise ValueError('payload_chunk_size must be at least {}. Given: {}'
+                             ''.format(MIN_PAYLOAD_CHUNK_SIZE, payload_chunk_size))
+        self.payload_signing = payload_signing
+        self.payload_chunk_size = payload_chunk_size
+        self.checksum_crc32c = checksum_crc32c
+        self.cache = cache
+        self.metadata_cache = metadata_cache
+        # Callbacks told about the progress of every request.
+        self.hooks = hooks if hooks is not None else Hooks()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.hedge_policy = hedge_policy
 
     def __call__(self, *args, **kwargs):
         return self.open(*args, **kwargs)
@@ -53,35 +174,25 @@ class OpenS3(object):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
-    def read(self):
-        """
-        Return a bytes object with the contents of the remote S3 object.
-
-        :rtype bytes:
-        """
-        self._get()
-        return self.buffer
-
-    def write(self, content):
-        """
-        Write content to file in S3.
-
-        :param content:
-        """
-        if self.mode not in ('wb', 'ab'):
-            raise RuntimeError('Must open file in write or append mode to write to file.')
-        self.buffer = content
-        # TODO handle multiple writes to same file.
+    def close(self):
+        """Close all idle connections."""
+        self.pool.close()
 
     def open(self, object_key,
-             mode='rb', content_type=None, acl='private', extra_request_headers=None):
+             mode='rb', content_type=None, acl='private', extra_request_headers=None,
+             seekable=False, compression=None):
         """
-        Configure :py:class:`OpenS3` object to write to or read from a specific S3 object.
+        Return a new :py:class:`S3File` for reading from or writing to a specific S3 object.
 
         :param object_key: A unique identifier for an object a bucket.
         :param mode: The mode in which the S3 object is opened. See Modes below.
         :param content_type: A standard MIME type describing the format of the contents.
         :param acl: Name of a specific canned Access Control List to apply to the object.
+        :param seekable: In 'rb' mode, return a seekable :py:class:`~openS3.rawio.S3RawIO`
+            file object that reads the object with ranged GETs, rather than
+            an :py:class:`S3File`.
+        :param compression: Compress the object as it is written, or decompress it as it
+            is read. See Compression below.
 
         **Modes**
 
@@ -103,24 +214,728 @@ class OpenS3(object):
             - authenticated-read
             - bucket-owner-read
             - bucket-owner-full-control
+
+        **Compression**
+
+        ======  ================================================================
+        value   Description
+        ======  ================================================================
+        None    read and write bytes as they are stored (default)
+        'gzip'  write gzip compressed, read as gzip compressed
+        'zstd'  write zstd compressed, read as zstd compressed. Requires the
+                ``zstandard`` package
+        'auto'  write with zstd if it is installed and gzip otherwise, but only
+                text, JSON, XML and JavaScript. Read according to the object's
+                ``Content-Encoding``
+        ======  ================================================================
+
+        Written objects get a ``Content-Encoding`` header and keep the content
+        type of what was written. Data is compressed as it is written and
+        decompressed as it is read, so neither holds the whole object in
+        memory. :py:meth:`S3File.read_range`, :py:meth:`S3File.download_to` and
+        seekable files work on the stored, compressed bytes.
+
+        In 'ab' mode, appended bytes are compressed with the ``Content-Encoding``
+        of the existing object, whatever ``compression`` is, and a 'gzip' or
+        'zstd' that doesn't match it raises a ``ValueError`` on close.
         """
         if mode not in VALID_MODES:
             raise ValueError('{} is not a valid mode for opening an S3 object.'.format(mode))
+        if compression is not None and compression not in VALID_COMPRESSION:
+            raise ValueError('{} is not a valid compression.'.format(compression))
+        if seekable:
+            if mode != 'rb':
+                raise ValueError('Only objects opened in "rb" mode can be seekable.')
+            if compression is not None:
+                raise ValueError('Compressed objects can not be seekable.')
+            return S3RawIO(self, object_key)
+        return S3File(self, object_key, mode, content_type, acl, extra_request_headers or {},
+                      compression)
+
+    def presign(self, object_key, method='GET', expires=DEFAULT_PRESIGN_EXPIRES,
+                query_string_dict=None):
+        """
+        Return a presigned URL that lets anyone who has it send a ``method``
+        request for ``object_key`` for the next ``expires`` seconds, without
+        credentials of their own.
+
+        :param object_key: Key of the S3 object (eg. '/static/app.css').
+        :param method: HTTP verb the URL is for (eg. 'GET' or 'PUT').
+        :param expires: Number of seconds the URL is valid for, at most 7 days.
+        :param query_string_dict: Extra query parameters to sign, such as
+            ``response-content-disposition``.
+        """
+        return self.presign_many((object_key,), method, expires, query_string_dict)[0]
+
+    def presign_many(self, object_keys, method='GET', expires=DEFAULT_PRESIGN_EXPIRES,
+                     query_string_dict=None):
+        """
+        Return a list of presigned URLs, one for each of ``object_keys``, that
+        share their expiry time. See :py:meth:`presign`.
+
+        The signing key and everything but the path of each canonical request
+        are computed once for the whole batch, so signing thousands of URLs
+        (eg. for a page of thumbnails) is cheap.
+        """
+        if not 0 < expires <= MAX_PRESIGN_EXPIRES:
+            raise ValueError('expires must be between 1 and {} seconds. Given: {}'
+                             ''.format(MAX_PRESIGN_EXPIRES, expires))
+        prefix = '{}://{}'.format(PRESIGNED_URL_SCHEME, self.netloc)
+        targets = self.signer.presign_many(method, self.netloc, object_keys, expires,
+                                           query_string_dict)
+        return [prefix + target for target in targets]
+
+    def delete_many(self, keys, workers=DEFAULT_DELETE_WORKERS):
+        """
+        Remove many files from the S3 bucket using Multi-Object Delete requests
+        of up to 1000 keys each, with up to ``workers`` requests in flight.
+
+        :param keys: An iterable of object keys.
+        :param workers: Number of delete requests sent concurrently.
+        :return: A dict mapping each key that could not be deleted to the error
+            S3 reported for it. Empty if every key was deleted.
+        """
+        return BatchDelete(self, workers).run(keys)
+
+    def rmtree(self, prefix, workers=DEFAULT_DELETE_WORKERS):
+        """
+        Remove every file whose key starts with ``prefix``. Keys are deleted
+        page by page as the listing arrives.
+
+        :param prefix: A "directory" such as '/static/css/'.
+        :param workers: Number of delete requests sent concurrently.
+        :return: A dict mapping each key that could not be deleted to the error
+            S3 reported for it. Empty if every key was deleted.
+        """
+        if not prefix.strip('/'):
+            raise ValueError('Refusing to remove every file in the bucket. '
+                             'Given prefix: {!r}'.format(prefix))
+        return self.delete_many(self._iter_keys(prefix.lstrip('/')), workers=workers)
+
+    def sync_up(self, local_dir, prefix, workers=DEFAULT_SYNC_WORKERS, delete=False,
+                compare=SYNC_COMPARE_ETAG):
+        """
+        Upload the files under ``local_dir`` that are missing from, or differ
+        from, the objects under ``prefix``. See :py:class:`~openS3.sync.Sync`.
+
+        :param local_dir: The local directory to upload.
+        :param prefix: The S3 "directory" to upload to (eg. '/static/').
+        :param workers: Number of files compared and uploaded concurrently.
+        :param delete: Also delete the objects under ``prefix`` that have no local file.
+        :param compare: How to decide that a file and an object of the same size are
+            the same. See Comparisons below.
+        :return: A :py:class:`~openS3.sync.SyncResult`.
+
+        **Comparisons**
+
+        =======  ===========================================================
+        value    Description
+        =======  ===========================================================
+        'etag'   the MD5 of the file matches the ETag of the object (default)
+        'mtime'  the copy synced to is at least as new as the one synced from
+        'size'   the sizes match
+        =======  ===========================================================
+        """
+        return Sync(self, local_dir, prefix, workers, delete, compare).up()
+
+    def sync_down(self, prefix, local_dir, workers=DEFAULT_SYNC_WORKERS, delete=False,
+                  compare=SYNC_COMPARE_ETAG):
+        """
+        Download the objects under ``prefix`` that are missing from, or differ
+        from, the files under ``local_dir``. Downloaded files get the
+        modification time of their object. Takes the same arguments as
+        :py:meth:`sync_up`.
+
+        :param delete: Also delete the files under ``local_dir`` that have no object.
+        :return: A :py:class:`~openS3.sync.SyncResult`.
+        """
+        return Sync(self, local_dir, prefix, workers, delete, compare).down()
+
+    def _list_objects(self, query_string_dict):
+        """
+        Send a signed ListObjectsV2 request and return the root element of the
+        response.
+        """
+        query_string_dict = dict(query_string_dict, **{'list-type': '2'})
+        headers = self._build_request_headers('GET', '/', query=query_string_dict)
+        response, response_body = self._request('GET', '/', headers=headers,
+                                                query=query_string_dict)
+        if response.status not in (200, 204):
+            raise S3IOError(
+                'openS3 GET error during list. '
+                'Response status: {}. '
+                'Reason: {}. '
+                'Response Text: \n'
+                '{}'.format(response.status, response.reason, response_body))
+        return ElementTree.fromstring(response_body)
+
+    def _iter_keys(self, prefix):
+        """
+        Yield every key in the bucket that starts with ``prefix``, fetching
+        one page of the listing at a time.
+        """
+        for root in self._iter_list_pages({'prefix': prefix}):
+            namespaces = get_xml_namespaces(root)
+            for key in root.findall('aws:Contents/aws:Key', namespaces):
+                yield key.text
+
+    def _iter_list_pages(self, query_string_dict):
+        """
+        Yield the root element of each page of a ListObjectsV2 listing. The
+        next page is requested in the background while the caller works
+        through the current one.
+        """
+        query_string_dict = dict(query_string_dict)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self._list_objects, dict(query_string_dict))
+            while future is not None:
+                root = future.result()
+                token = root.find('aws:NextContinuationToken', get_xml_namespaces(root))
+                future = None
+                if token is not None:
+                    query_string_dict['continuation-token'] = token.text
+                    future = executor.submit(self._list_objects, dict(query_string_dict))
+                yield root
+
+    def iterdir(self, prefix='/'):
+        """
+        Yield an :py:class:`~openS3.utils.S3Entry` for each file and directory
+        directly under ``prefix``.
 
+        Entries are yielded as each page of the listing arrives, and the next
+        page is fetched in the background while the current one is consumed.
+
+        :param prefix: A "directory" such as '/static/css/'.
+        """
+        prefix = prefix.lstrip('/')
+        if prefix and not prefix.endswith('/'):
+            prefix += '/'
+        query_string_dict = {'prefix': prefix, 'delimiter': '/'}
+        for root in self._iter_list_pages(query_string_dict):
+            namespaces = get_xml_namespaces(root)
+            for element in root.findall('aws:CommonPrefixes/aws:Prefix', namespaces):
+                yield S3Entry('/' + element.text, None, None, None, True)
+            for element in root.findall('aws:Contents', namespaces):
+                key = element.findtext('aws:Key', '', namespaces)
+                if key == prefix:
+                    # Skip the "directory" object itself, if there is one.
+                    continue
+                yield S3Entry.from_element(element, namespaces)
+
+    def walk(self, prefix='/'):
+        """
+        Walk the "directory tree" under ``prefix`` top-down, like :py:func:`os.walk`.
+
+        For each directory, yield a 3-tuple of its key, a list of
+        :py:class:`~openS3.utils.S3Entry` for its subdirectories and a list of
+        :py:class:`~openS3.utils.S3Entry` for its files. Removing entries from
+        the list of subdirectories stops the walk from descending into them.
+
+        :param prefix: A "directory" such as '/static/'.
+        """
+        dirs, files = [], []
+        for entry in self.iterdir(prefix):
+            (dirs if entry.is_dir else files).append(entry)
+        yield prefix, dirs, files
+        for entry in dirs:
+            yield from self.walk(entry.key)
+
+    def _remember_metadata(self, object_key, metadata):
+        if self.metadata_cache is not None:
+            self.metadata_cache.set(self.bucket, object_key, metadata)
+
+    def _invalidate(self, object_key):
+        """Drop cached copies of ``object_key`` after it was changed or deleted."""
+        if self.cache is not None:
+            self.cache.delete(self.bucket, object_key)
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate(self.bucket, object_key)
+
+    def _request(self, method, path, body=None, headers=None, query=None):
+        """
+        Send a request over a pooled keep-alive connection.
+
+        Return a 2-tuple of the response and its body. The body is read in full
+        so that the connection can go back to the pool for the next request.
+        """
+        _, response, response_body = self._send(method, path, body, headers, query, True)
+        return response, response_body
+
+    def _urlopen(self, method, path, body=None, headers=None, query=None):
+        """
+        Send a request over a pooled keep-alive connection. Return a 2-tuple of
+        the connection and the response, whose body has not been read. The
+        connection must be handed back to the pool once the body has been read.
+        """
+        conn, response, _ = self._send(method, path, body, headers, query, False)
+        return conn, response
+
+    def _send(self, method, path, body, headers, query, read):
+        """
+        Send a request, retrying it as ``retry_policy`` allows and hedging it
+        as ``hedge_policy`` allows. Return a 3-tuple of the connection, the
+        response and, if ``read``, the body of the response.
+        """
+        target = get_request_target(path, query)
+        headers = headers or {}
+        policy = self.retry_policy
+        # Bodies are sent again from where they start.
+        body_position = body.tell() if hasattr(body, 'seek') else None
+        retryable = (policy.is_idempotent(get_operation_name(method, target, headers)) and
+                     (body_position is not None or not hasattr(body, 'read')))
+        attempt = 0
+        while True:
+            if attempt and body_position is not None:
+                body.seek(body_position)
+            try:
+                if self.hedge_policy is not None and method in ('GET', 'HEAD'):
+                    conn, response = self.hedge_policy.urlopen(self.pool, method, target, headers,
+                                                               self.hooks, attempt)
+                else:
+                    conn, response = self.pool.urlopen(method, target, body, headers,
+                                                       hooks=self.hooks, attempt=attempt)
+                delay = None
+                if retryable and policy.should_retry_status(response.status, attempt):
+                    delay = policy.backoff(attempt, response.getheader('Retry-After'))
+                if delay is None and not read:
+                    return conn, response, None
+                try:
+                    response_body = response.read()
+                except BaseException as e:
+                    self.pool.discard(conn, response, e)
+                    raise
+                self.pool.release(conn, response)
+                if delay is None:
+                    return conn, response, response_body
+            except policy.exceptions as e:
+                if not (retryable and policy.should_retry_error(e, attempt)):
+                    raise
+                delay = policy.backoff(attempt)
+            time.sleep(delay)
+            attempt += 1
+
+    def _build_request_headers(self, method, object_key, content=None, query=None,
+                               object_headers=None, amz_headers=None):
+        """
+        Return a dict of request headers signed with AWS Signature Version 4.
+
+        :param method: HTTP verb of the request.
+        :param object_key: Key of the S3 object the request is about.
+        :param content: Body of the request, if it has one. Either bytes or a
+            :py:class:`~openS3.buffers.SpooledBuffer`.
+        :param query: A dict of query parameters sent with the request (eg. {'uploads': ''}).
+        :param object_headers: A dict of the headers that describe the object, sent on
+            requests that create one. See :py:meth:`S3File._object_headers`.
+        :param amz_headers: A dict of additional ``x-amz-*`` headers to send and sign.
+        """
+        headers = self._base_headers(object_headers)
+        payload_hash = EMPTY_PAYLOAD_SHA256
+        if content is not None:
+            digest = self._digest(content, crc32c=False)
+            headers['Content-Length'] = digest.size
+            headers['Content-MD5'] = digest.content_md5
+            payload_hash = digest.sha256
+        if amz_headers:
+            headers.update(amz_headers)
+        return self.signer.sign(method, object_key, query, headers, payload_hash)
+
+    def _base_headers(self, object_headers=None):
+        """
+        Return the unsigned headers every request starts from, including the
+        dict of ``object_headers`` if given.
+        """
+        headers = {'Host': self.netloc}
+        if object_headers:
+            headers.update(object_headers)
+        return headers
+
+    def _digest(self, content, crc32c=None):
+        """
+        Return the :py:class:`~openS3.checksums.Digest` of ``content``. A
+        :py:class:`~openS3.buffers.SpooledBuffer` has already computed it.
+
+        :param crc32c: Also compute a CRC32C checksum. Defaults to ``checksum_crc32c``.
+        """
+        if isinstance(content, SpooledBuffer):
+            return content.contents_digest()
+        digest = Digest(self.checksum_crc32c if crc32c is None else crc32c)
+        digest.update(to_bytes(content))
+        return digest
+
+    def _build_upload_request(self, method, object_key, content, query=None,
+                              object_headers=None, digest=None):
+        """
+        Return a 2-tuple of signed request headers and the body to send for an
+        upload of ``content``, signed as set by ``payload_signing``.
+
+        :param content: Bytes or a :py:class:`~openS3.buffers.SpooledBuffer`.
+        :param object_headers: A dict of the headers that describe the object.
+        :param digest: The :py:class:`~openS3.checksums.Digest` of ``content``,
+            if it is already known.
+        """
+        if digest is None:
+            digest = self._digest(content)
+        headers = self._base_headers(object_headers)
+        headers['Content-MD5'] = digest.content_md5
+        headers.update(digest.checksum_headers())
+        body = content.reader() if isinstance(content, SpooledBuffer) else to_bytes(content)
+        if self.payload_signing == PAYLOAD_SIGNING_STREAMING:
+            return self.signer.sign_chunked(method, object_key, query, headers, body,
+                                            digest.size, self.payload_chunk_size)
+        headers['Content-Length'] = digest.size
+        if self.payload_signing == PAYLOAD_SIGNING_UNSIGNED:
+            return self.signer.sign(method, object_key, query, headers, UNSIGNED_PAYLOAD), body
+        return self.signer.sign(method, object_key, query, headers, digest.sha256), body
+
+
+class S3File(object):
+    """
+    A handle on a single S3 object returned by :py:meth:`OpenS3.open`.
+
+    A handle holds the state of one read or write, so it must not be shared
+    between threads. Requests go through the pool, caches and policies of
+    its :py:class:`OpenS3` client.
+    """
+    __slots__ = ('client', 'object_key', 'mode', '_content_type', 'acl', 'extra_request_headers',
+                 'compression', 'content_encoding', 'buffer', 'digest', 'response_headers',
+                 '_compressor', '_stream', '_stream_conn', '_position', '_eof', '_upload',
+                 'closed')
+
+    def __init__(self, client, object_key, mode, content_type, acl, extra_request_headers,
+                 compression):
+        self.client = client
         self.object_key = object_key
         self.mode = mode
-        self.content_type = content_type
+        self._content_type = content_type
         self.acl = acl
-        self.extra_request_headers = extra_request_headers if extra_request_headers else {}
+        self.extra_request_headers = extra_request_headers
+        self.compression = compression
+        self.content_encoding = None
+        self.buffer = ''
+        # Digest of everything written. Set by close().
+        self.digest = None
+        self.response_headers = {}
+        self._compressor = None
+        self._stream = None
+        self._stream_conn = None
+        self._position = 0
+        self._eof = False
+        self._upload = None
+        self.closed = False
+
+    def __enter__(self):
         return self
 
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None and self.mode in ('wb', 'ab'):
+            # Don't create an object out of a write that failed midway.
+            if self._upload is not None:
+                self._upload.abort()
+            self._close_stream()
+            if isinstance(self.buffer, SpooledBuffer):
+                self.buffer.close()
+            self.closed = True
+            return
+        self.close()
+
+    def read(self, size=-1):
+        """
+        Read and return up to ``size`` bytes of the remote S3 object.
+        If ``size`` is omitted or negative, read until the end of the object.
+
+        The object is streamed from a single GET request, so successive calls
+        continue where the previous call stopped. An empty bytes object is
+        returned once the end of the object has been reached.
+
+        :param size: Maximum number of bytes to return.
+        :rtype bytes:
+        """
+        if self._eof:
+            return b''
+        if self._stream is None:
+            self._open_stream()
+            self._decompress_stream()
+
+        if size is None or size < 0:
+            data = self._stream.read()
+        else:
+            data = self._stream.read(size)
+
+        if self._position == 0 and self._stream.isclosed():
+            # The whole object was read in one call. Keep it around as the
+            # buffer, like previous versions of read() did.
+            self.buffer = data
+        self._position += len(data)
+        if self._stream.isclosed():
+            self._close_stream()
+            self._eof = True
+        return data
+
+    def readinto(self, buffer):
+        """
+        Read bytes of the remote S3 object straight into ``buffer`` and return
+        the number of bytes read. Like :py:meth:`read`, successive calls
+        continue where the previous call stopped.
+
+        The buffer is filled unless the end of the object comes first, and 0
+        is returned once the end has been reached. The body is received
+        directly into the buffer, without an intermediate bytes object.
+
+        :param buffer: A writable, C-contiguous bytes-like object such as a
+            bytearray, a memoryview, an mmap or a NumPy array.
+        :rtype int:
+        """
+        if self._eof:
+            return 0
+        if self._stream is None:
+            self._open_stream()
+            self._decompress_stream()
+
+        with memoryview(buffer) as view, view.cast('B') as view:
+            filled = readinto_fully(self._stream, view)
+        self._position += filled
+        if self._stream.isclosed():
+            self._close_stream()
+            self._eof = True
+        return filled
+
+    def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Yield the contents of the remote S3 object in chunks of at most
+        ``chunk_size`` bytes without holding more than one chunk in memory.
+
+        :param chunk_size: Maximum number of bytes per chunk.
+        """
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def read_range(self, start, end=None):
+        """
+        Return the bytes from ``start`` to ``end`` (inclusive) of the remote
+        S3 object using an HTTP ``Range`` request. If ``end`` is omitted, read
+        to the end of the object.
+
+        :param start: Offset of the first byte to return.
+        :param end: Offset of the last byte to return.
+        :rtype bytes:
+        """
+        if start < 0 or (end is not None and end < start):
+            raise ValueError('Invalid byte range: {}-{}'.format(start, end))
+        end_str = '' if end is None else str(end)
+        return self._get_range('bytes={}-{}'.format(start, end_str), start, end)
+
+    def read_range_into(self, buffer, start, end=None):
+        """
+        Read the bytes from ``start`` to ``end`` (inclusive) of the remote S3
+        object straight into ``buffer`` using an HTTP ``Range`` request, and
+        return the number of bytes read. If ``end`` is omitted, read as many
+        bytes as fit in the buffer.
+
+        :param buffer: A writable, C-contiguous bytes-like object such as a
+            bytearray, a memoryview, an mmap or a NumPy array.
+        :param start: Offset of the first byte to read.
+        :param end: Offset of the last byte to read.
+        :rtype int:
+        """
+        with memoryview(buffer) as view, view.cast('B') as view:
+            if end is None:
+                end = start + len(view) - 1
+            if start < 0 or end < start:
+                raise ValueError('Invalid byte range: {}-{}'.format(start, end))
+            if end - start + 1 > len(view):
+                raise ValueError('A buffer of {} bytes can not hold bytes {}-{}.'
+                                 ''.format(len(view), start, end))
+            request_headers = self.client._build_request_headers('GET', self.object_key)
+            request_headers['Range'] = 'bytes={}-{}'.format(start, end)
+            conn, response = self.client._urlopen('GET', self.object_key, headers=request_headers)
+            if response.status not in (200, 206):
+                body = response.read()
+                self.client.pool.release(conn, response)
+                if response.status == 416:
+                    # The range starts past the end of the object.
+                    return 0
+                if response.status == 404:
+                    raise S3FileDoesNotExistError(self.object_key)
+                raise S3IOError(
+                    'openS3 GET error. '
+                    'Response status: {}. '
+                    'Reason: {}. '
+                    'Response Text: \n'
+                    '{}'.format(response.status, response.reason, body))
+            try:
+                if response.status == 200:
+                    # The server ignored the Range header and sent the whole object.
+                    skip_bytes(response, start)
+                with view[:end - start + 1] as target:
+                    filled = readinto_fully(response, target)
+            except BaseException as e:
+                self.client.pool.discard(conn, response, e)
+                raise
+        self.client.pool.release(conn, response)
+        return filled
+
+    def read_suffix(self, length):
+        """
+        Return the last ``length`` bytes of the remote S3 object using an
+        HTTP ``Range`` request.
+
+        :param length: Number of bytes to return.
+        :rtype bytes:
+        """
+        if length <= 0:
+            raise ValueError('length must be positive. Given: {}'.format(length))
+        return self._get_range('bytes=-{}'.format(length), -length, None)
+
+    def write(self, content):
+        """
+        Write content to file in S3.
+
+        Each call appends to a buffer that is kept in memory until it grows
+        past ``spool_max_size`` bytes and on disk after that, so the whole
+        object never has to be held in memory.
+
+        In 'wb' mode, once more than ``multipart_threshold`` bytes have been
+        written the object is sent as a multipart upload, and each full part
+        is uploaded in the background as soon as it has been written.
+
+        :param content: A str or bytes-like object.
+        """
+        if self.mode not in ('wb', 'ab'):
+            raise RuntimeError('Must open file in write or append mode to write to file.')
+        if not isinstance(self.buffer, SpooledBuffer):
+            self.buffer = SpooledBuffer(max_size=self.client.spool_max_size,
+                                        part_size=self.client.multipart_part_size,
+                                        crc32c=self.client.checksum_crc32c)
+            # In 'ab' mode the encoding is that of the existing object, which
+            # is only looked up on close, so the bytes are compressed then.
+            if self.mode == 'wb':
+                self.content_encoding = get_write_encoding(self.compression, self.content_type)
+            if self.content_encoding is not None:
+                self._compressor = get_compressor(self.content_encoding)
+        content = to_bytes(content)
+        if self._compressor is not None:
+            content = self._compressor.compress(content)
+        self.buffer.write(content)
+
+        if self.mode != 'wb':
+            return
+        if self._upload is None and len(self.buffer) > self.client.multipart_threshold:
+            self._initiate_upload()
+        if self._upload is not None:
+            for part, digest in self.buffer.pop_parts():
+                self._upload.upload_part(part, digest)
+
+    def write_from(self, source):
+        """
+        Write everything left in ``source`` to the S3 object without loading
+        it into memory.
+
+        ``source`` is either a binary file open for reading, which is read
+        from its current position into one reused buffer, or a bytes-like
+        object such as a :py:class:`mmap.mmap`, which is sliced without being
+        copied. Checksums are computed as the bytes pass through, like with
+        :py:meth:`write`. In 'wb' mode, a source known to be larger than
+        ``multipart_threshold`` bytes (a regular file, by :py:func:`os.fstat`,
+        or a bytes-like object) is sent as a multipart upload from its first
+        part on, so memory use doesn't depend on its size.
+
+        :param source: A binary file or a bytes-like object.
+        :return: The number of bytes written.
+        """
+        # Even an empty source creates the object.
+        self.write(b'')
+        try:
+            view = memoryview(source)
+        except TypeError:
+            view = None
+            size = _remaining_size(source)
+        else:
+            size = view.nbytes
+        # How much a compressed source shrinks is only known once it is read.
+        if (self.mode == 'wb' and self._upload is None and self._compressor is None and
+                size is not None and len(self.buffer) + size > self.client.multipart_threshold):
+            self._initiate_upload()
+
+        if view is not None:
+            # Views are released so that an mmap can be closed afterwards.
+            with view, view.cast('B') as flat:
+                for start in range(0, size, self.client.multipart_part_size):
+                    self.write(flat[start:start + self.client.multipart_part_size])
+            return size
+        written = 0
+        chunk = bytearray(FILE_READ_SIZE)
+        with memoryview(chunk) as chunk_view:
+            while True:
+                n = source.readinto(chunk)
+                if not n:
+                    return written
+                self.write(chunk_view[:n])
+                written += n
+
+    def upload_file(self, path):
+        """
+        Write the local file at ``path`` to the S3 object. See :py:meth:`write_from`.
+
+        :param path: Path of the local file.
+        :return: The number of bytes written.
+        """
+        with open(path, 'rb') as f:
+            return self.write_from(f)
+
+    def _initiate_upload(self):
+        self._upload = MultipartUpload(self.client, self.object_key,
+                                       max_workers=self.client.multipart_max_workers,
+                                       max_in_flight=self.client.multipart_max_in_flight,
+                                       object_headers=self._object_headers())
+        self._upload.initiate()
+
+    def download_to(self, path, workers=DEFAULT_DOWNLOAD_WORKERS,
+                    part_size=DEFAULT_DOWNLOAD_PART_SIZE):
+        """
+        Download the remote S3 object to the local file at ``path``, fetching
+        ``workers`` byte ranges of ``part_size`` bytes in parallel.
+
+        An interrupted download is resumed when this method is called again
+        with the same ``path`` and ``part_size``, as long as the remote object
+        has not changed. See :py:class:`~openS3.download.RangedDownload`.
+
+        :param path: Local path to write the object to.
+        :param workers: Number of ranges fetched concurrently.
+        :param part_size: Size in bytes of each range.
+        :return: The number of bytes fetched.
+        """
+        download = RangedDownload(self.client, self.object_key, path, workers, part_size)
+        return download.run()
+
     def close(self):
-        if self.mode in ('wb', 'ab') and self.buffer:
-            # TODO Does the old file need to be deleted
-            # TODO from S3 before we write over it?
+        """
+        Finish reading or writing the S3 object. After writing, :py:attr:`digest`
+        holds the :py:class:`~openS3.checksums.Digest` of everything written,
+        as stored (ie. compressed).
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self._compressor is not None:
+            self.buffer.write(self._compressor.flush())
+            self._compressor = None
+        digest = self.buffer.digest if isinstance(self.buffer, SpooledBuffer) else None
+        self._close_stream()
+        if self._upload is not None:
+            self._complete_upload()
+        elif self.mode == 'ab' and self.buffer:
+            digest = self._append()
+        elif self.mode == 'wb' and isinstance(self.buffer, SpooledBuffer):
+            # Anything written, even b'', creates the object.
             self._put()
-        # Reset OpenS3 object
-        self.__init__(self.bucket, self.access_key, self.secret_key)
+        if self.mode in ('wb', 'ab'):
+            self.client._invalidate(self.object_key)
+        if isinstance(self.buffer, SpooledBuffer):
+            self.buffer.close()
+        self.digest = digest
 
     @property
     def content_type(self):
@@ -135,16 +950,7 @@ class OpenS3(object):
         if 'Content-Type' in self.response_headers:
             return self.response_headers['Content-Type']
 
-        content_type = DEFAULT_CONTENT_TYPE
-        # get file extension
-        if self.object_key:
-            _, extension = os.path.splitext(self.object_key)
-            extension = extension.strip('.')
-            if extension in CONTENT_TYPES:
-                # Make an educated guess about what the Content-Type should be.
-                content_type = CONTENT_TYPES[extension]
-
-        return content_type
+        return guess_content_type(self.object_key)
 
     @content_type.setter
     def content_type(self, content_type):
@@ -153,106 +959,314 @@ class OpenS3(object):
     @property
     def size(self):
         """
-        Return the size of the buffer, in bytes.
+        Return the size of the buffer, in bytes. In 'rb' mode, before the object
+        has been read, return the size of the remote S3 object instead.
         """
-        # The file hasn't been retrieved from AWS, retrieve it.
-        if not self.buffer and not self.response_headers:
-            self._get()
-        return len(self.buffer)  # TODO is this the right way to get size of buffer (bytes)?
+        if self.buffer or self.mode != 'rb':
+            return len(self.buffer)
+        metadata = self.get_metadata()
+        if metadata is None:
+            raise S3FileDoesNotExistError(self.object_key)
+        return metadata.size
 
     @property
     def url(self):
         """Return URL of resource"""
-        scheme = OBJECT_URL_SCHEME
+        scheme = self.client.pool.scheme
         path = self.object_key
         query = ''
         fragment = ''
-        url_tuple = (scheme, self.netloc, path, query, fragment)
+        url_tuple = (scheme, self.client.netloc, path, query, fragment)
         return urllib.parse.urlunsplit(url_tuple)
 
     @property
     def md5hash(self):
         """Return the MD5 hash string of the file content"""
-        digest = hashlib.md5(self.buffer.encode(ENCODING)).digest()
-        return b64_string(digest)
+        return self.client._digest(self.buffer).content_md5
 
     def _head(self):
-        request_headers = self._build_request_headers('HEAD', self.object_key)
-        with closing(HTTPConnection(self.netloc)) as conn:
-            conn.request('HEAD', self.url, headers=request_headers)
-            response = conn.getresponse()
+        request_headers = self.client._build_request_headers('HEAD', self.object_key)
+        response, _ = self.client._request('HEAD', self.object_key, headers=request_headers)
+        if response.status == 200:
+            # Headers of an error response don't describe the object.
             self.response_headers = response.headers
-            return response
+        return response
 
-    def _get(self):
+    def _open_stream(self):
         """
-        GET contents of remote S3 object.
+        Send a GET request for the remote S3 object and keep its response open
+        so that the body can be read incrementally.
+
+        With a cache, the GET is conditional on the ETag of the cached copy,
+        which is read instead if S3 reports that the object has not changed.
+        Otherwise the new body is written to the cache as it is read, and
+        cached once it has been read to the end.
         """
-        request_headers = self._build_request_headers('GET', self.object_key)
-        with closing(HTTPConnection(self.netloc)) as conn:
-            conn.request('GET', self.object_key, headers=request_headers)
-            response = conn.getresponse()
-            if response.status not in (200, 204):
-                if response.length is None:
-                    # length == None seems to be returned from GET requests
-                    # to non-existing files
-                    raise S3FileDoesNotExistError(self.object_key)
-                # catch all other cases
-                raise S3IOError(
-                    'openS3 GET error. '
-                    'Response status: {}. '
-                    'Reason: {}. '
-                    'Response Text: \n'
-                    '{}'.format(response.status, response.reason, response.read()))
+        entry = None
+        request_headers = self.client._build_request_headers('GET', self.object_key)
+        if self.client.cache is not None:
+            entry = self.client.cache.get(self.client.bucket, self.object_key)
+            if entry is not None:
+                request_headers['If-None-Match'] = entry.etag
+        conn, response = self.client._urlopen('GET', self.object_key, headers=request_headers)
+        if entry is not None:
+            if response.status == 304:
+                response.read()
+                self.client.pool.release(conn, response)
+                self.response_headers = entry.headers
+                self._remember_metadata(ObjectMetadata.from_headers(entry.headers))
+                self._stream = entry
+                return
+            entry.close()
+        if response.status not in (200, 204):
+            body = response.read()
+            self.client.pool.release(conn, response)
+            if response.status == 404:
+                self.client._invalidate(self.object_key)
+                self._remember_metadata(None)
+                raise S3FileDoesNotExistError(self.object_key)
+            raise S3IOError(
+                'openS3 GET error. '
+                'Response status: {}. '
+                'Reason: {}. '
+                'Response Text: \n'
+                '{}'.format(response.status, response.reason, body))
+        self.response_headers = response.headers
+        self._remember_metadata(ObjectMetadata.from_headers(response.headers))
+        self._stream = response
+        self._stream_conn = conn
+        if self.client.cache is not None and 'ETag' in response.headers:
+            try:
+                writer = self.client.cache.writer(
+                    self.client.bucket, self.object_key, response.headers['ETag'],
+                    dict(response.headers.items()))
+            except BaseException as e:
+                self.client.pool.discard(conn, response, e)
+                self._stream = self._stream_conn = None
+                raise
+            size = response.headers.get('Content-Length')
+            self._stream = CachingReader(response, writer, int(size) if size else None)
 
-            self.buffer = response.read()
-            self.response_headers = response.headers
+    def _decompress_stream(self):
+        """
+        Replace the stream opened by :py:meth:`_open_stream` with one that
+        decompresses it, as set by :py:attr:`compression`.
+        """
+        encoding = get_read_encoding(self.compression,
+                                     self.response_headers.get('Content-Encoding'))
+        if encoding is not None:
+            self._stream = DecompressingReader(self._stream, encoding)
+
+    def _close_stream(self):
+        """
+        Close the response opened by :py:meth:`_open_stream`. If its body was
+        read to completion, the connection goes back to the pool.
+        """
+        if self._stream is None:
+            return
+        stream = self._stream
+        if isinstance(stream, DecompressingReader):
+            stream.close()
+            stream = stream.raw
+        if isinstance(stream, CachingReader):
+            stream.close()
+            stream = stream.raw
+        if self._stream_conn is None:
+            # A cached copy, which holds no connection.
+            stream.close()
+        else:
+            self.client.pool.release(self._stream_conn, stream)
+        self._stream = None
+        self._stream_conn = None
+
+    def _get_range(self, range_header, start, end):
+        """
+        GET the bytes of the remote S3 object selected by ``range_header``.
+        """
+        request_headers = self.client._build_request_headers('GET', self.object_key)
+        request_headers['Range'] = range_header
+        response, body = self.client._request('GET', self.object_key, headers=request_headers)
+        if response.status == 416:
+            # The range starts past the end of the object.
+            return b''
+        if response.status == 200:
+            # The server ignored the Range header and sent the whole object.
+            return body[start:] if end is None else body[start:end + 1]
+        if response.status != 206:
+            if response.status == 404:
+                raise S3FileDoesNotExistError(self.object_key)
+            raise S3IOError(
+                'openS3 GET error. '
+                'Response status: {}. '
+                'Reason: {}. '
+                'Response Text: \n'
+                '{}'.format(response.status, response.reason, body))
+        return body
+
+    def _complete_upload(self):
+        """
+        Upload what is left in the buffer as the last part and complete the
+        multipart upload. Abort the upload if anything goes wrong.
+        """
+        try:
+            if self.buffer or not self._upload.num_parts:
+                self._upload.upload_part(self.buffer.getvalue(), self.buffer.contents_digest())
+            self._upload.complete()
+        except BaseException:
+            self._upload.abort()
+            raise
+
+    def _append(self):
+        """
+        Append the buffer to the remote S3 object without moving the existing
+        bytes through this host.
+
+        The result is assembled by S3 as a multipart upload whose first parts
+        are copies of the existing object (UploadPartCopy) and whose last
+        parts are the buffer. Objects smaller than the minimum part size can
+        not be copied as a part, so they are fetched and PUT back together
+        with the buffer instead.
+
+        The buffer is compressed with the ``Content-Encoding`` of the existing
+        object, so that the result is one stream of gzip members or zstd
+        frames.
+
+        :return: The :py:class:`~openS3.checksums.Digest` of the appended bytes.
+        """
+        response = self._head()
+        if response.status == 404:
+            self._encode_buffer(get_write_encoding(self.compression, self.content_type))
+            self._put()
+            return self.buffer.digest
+        if response.status != 200:
+            raise S3IOError(
+                'openS3 HEAD error. '
+                'Response status: {}. '
+                'Reason: {}.'.format(response.status, response.reason))
+        existing_size = int(response.headers['Content-Length'])
+        etag = response.headers['ETag']
+        self._encode_buffer(get_append_encoding(self.compression,
+                                                response.headers.get('Content-Encoding')))
+        digest = self.buffer.digest
+
+        if existing_size < self.client.multipart_min_part_size:
+            existing = self.read_range(0, existing_size - 1) if existing_size else b''
+            buffer = SpooledBuffer(max_size=self.client.spool_max_size,
+                                   crc32c=self.client.checksum_crc32c)
+            buffer.write(existing)
+            for chunk in self.buffer.iter_chunks():
+                buffer.write(chunk)
+            self.buffer.close()
+            self.buffer = buffer
+            self._put()
+            return digest
+
+        upload = MultipartUpload(self.client, self.object_key,
+                                 max_workers=self.client.multipart_max_workers,
+                                 max_in_flight=self.client.multipart_max_in_flight,
+                                 object_headers=self._object_headers())
+        upload.initiate()
+        try:
+            # Split the existing object into as few, evenly sized copy parts as
+            # S3 allows so that none of them falls below the minimum part size.
+            num_copy_parts = -(-existing_size // MAX_COPY_PART_SIZE)
+            copy_part_size = -(-existing_size // num_copy_parts)
+            copy_source = uri_encode('/' + self.client.bucket + self.object_key)
+            for start in range(0, existing_size, copy_part_size):
+                end = min(start + copy_part_size, existing_size) - 1
+                upload.upload_part_copy(copy_source, start, end, if_match=etag)
+            for part, digest in self.buffer.pop_parts():
+                upload.upload_part(part, digest)
+            if self.buffer:
+                upload.upload_part(self.buffer.getvalue(), self.buffer.contents_digest())
+            upload.complete()
+        except BaseException:
+            upload.abort()
+            raise
+        return digest
+
+    def _encode_buffer(self, encoding):
+        """Replace the buffer with its contents compressed with ``encoding``."""
+        self.content_encoding = encoding
+        if encoding is None:
+            return
+        compressor = get_compressor(encoding)
+        buffer = SpooledBuffer(max_size=self.client.spool_max_size,
+                               part_size=self.client.multipart_part_size,
+                               crc32c=self.client.checksum_crc32c)
+        for chunk in self.buffer.iter_chunks():
+            buffer.write(compressor.compress(chunk))
+        buffer.write(compressor.flush())
+        self.buffer.close()
+        self.buffer = buffer
+
+    def _object_headers(self):
+        """
+        Return a dict of the headers that describe the object: its content
+        type, ACL and content encoding, and the extra request headers.
+        """
+        headers = {'Content-Type': self.content_type, 'x-amz-acl': self.acl}
+        if self.content_encoding is not None:
+            headers['Content-Encoding'] = self.content_encoding
+        headers.update(self.extra_request_headers)
+        return headers
 
     def _put(self):
         """PUT contents of file to remote S3 object."""
-        request_headers = self._build_request_headers('PUT', self.object_key)
-        with closing(HTTPConnection(self.netloc)) as conn:
-            conn.request('PUT', self.object_key, self.buffer, headers=request_headers)
-            response = conn.getresponse()
-            if response.status not in (200, 204):
-                raise S3IOError(
-                    'openS3 PUT error. '
-                    'Response status: {}. '
-                    'Reason: {}. '
-                    'Response Text: \n'
-                    '{}'.format(response.status, response.reason, response.read()))
+        request_headers, body = self.client._build_upload_request(
+            'PUT', self.object_key, self.buffer, object_headers=self._object_headers())
+        response, body = self.client._request('PUT', self.object_key, body, request_headers)
+        if response.status not in (200, 204):
+            raise S3IOError(
+                'openS3 PUT error. '
+                'Response status: {}. '
+                'Reason: {}. '
+                'Response Text: \n'
+                '{}'.format(response.status, response.reason, body))
 
     def delete(self):
         """
         Remove file from its S3 bucket.
         """
-        headers = self._build_request_headers('DELETE', self.object_key)
-        with closing(HTTPConnection(self.netloc)) as conn:
-            conn.request('DELETE', self.object_key, headers=headers)
-            response = conn.getresponse()
-            if response.status not in (200, 204):
-                raise S3IOError(
-                    'openS3 DELETE error. '
-                    'Response status: {}. '
-                    'Reason: {}. '
-                    'Response Text: \n'
-                    '{}'.format(response.status, response.reason, response.read()))
-        # Reset OpenS3 object
-        self.__init__(self.bucket, self.access_key, self.secret_key)
+        headers = self.client._build_request_headers('DELETE', self.object_key)
+        response, body = self.client._request('DELETE', self.object_key, headers=headers)
+        if response.status not in (200, 204):
+            raise S3IOError(
+                'openS3 DELETE error. '
+                'Response status: {}. '
+                'Reason: {}. '
+                'Response Text: \n'
+                '{}'.format(response.status, response.reason, body))
+        self.client._invalidate(self.object_key)
 
     def exists(self):
         """
         Return ``True`` if file exists in S3 bucket.
         """
+        return self.get_metadata() is not None
+
+    def get_metadata(self):
+        """
+        Return the :py:class:`~openS3.utils.ObjectMetadata` of the remote S3
+        object, or ``None`` if it does not exist. With a metadata cache, a HEAD
+        request is only sent when the cached answer has expired.
+        """
+        if self.client.metadata_cache is not None:
+            cached, metadata = self.client.metadata_cache.get(self.client.bucket, self.object_key)
+            if cached:
+                return metadata
         response = self._head()
-        if response.status in (200, 404):
-            return response.status == 200
-        raise S3IOError(
-            'openS3 HEAD error. '
-            'Response status: {}. '
-            'Reason: {}. '
-            'Response Text: \n'
-            '{}'.format(response.status, response.reason, response.read()))
+        if response.status not in (200, 404):
+            raise S3IOError(
+                'openS3 HEAD error. '
+                'Response status: {}. '
+                'Reason: {}.'.format(response.status, response.reason))
+        metadata = ObjectMetadata.from_headers(response.headers) if response.status == 200 else None
+        self._remember_metadata(metadata)
+        return metadata
+
+    def _remember_metadata(self, metadata):
+        self.client._remember_metadata(self.object_key, metadata)
 
     def listdir(self):
         """
@@ -274,132 +1288,44 @@ class OpenS3(object):
             raise ValueError('listdir can only operate on directories (ie. object keys that '
                              'end in "/"). Given key: {}'.format(self.object_key))
 
-        if '/' in self.object_key.strip('/'):
-            raise NotImplementedError('Listing subdirectories of bucket is not supported.')
-
-        datetime_now = datetime.utcnow()
-        iso_8601_timestamp = datetime_now.strftime('%Y%m%dT%H%M%SZ')
-        # Strip slashes from object_key. AWS doesn't like leading/trailing slashes
-        # in the value associated with the prefix parameter.
-        prefix = self.object_key.strip('/')
-        query_string_dict = {'prefix': prefix} if prefix else {}
-        header_dict = {
-            'Host': self.netloc,
-            'x-amz-date': iso_8601_timestamp,
-            'x-amz-content-sha256': hashlib.sha256(''.encode()).hexdigest()
-        }
-
-        # Get Canonical Request
-        http_verb = 'GET'
-        canonical_uri = uri_encode('/')
-        canonical_query_string = get_canonical_query_string(query_string_dict)
-        canonical_headers = get_canonical_headers_string(header_dict) + '\n'
-        signed_headers = ';'.join(header for header in sorted(header_dict.keys())).lower()
-        hashed_payload = hashlib.sha256(''.encode()).hexdigest()
-        canonical_request = '\n'.join((
-            http_verb,
-            canonical_uri,
-            canonical_query_string,
-            canonical_headers,
-            signed_headers,
-            hashed_payload
-        ))
-
-        # Get StringToSign
-        request_scope = ('{date}/{aws_region}/{aws_service}/aws4_request'
-                         ''.format(date=datetime_now.strftime('%Y%m%d'),
-                                   aws_region=AWS_S3_REGION,
-                                   aws_service=AWS_S3_SERVICE))
-        canonical_request_hash = hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
-        string_to_sign = '\n'.join((
-            'AWS4-HMAC-SHA256',
-            iso_8601_timestamp,
-            request_scope,
-            canonical_request_hash
-        ))
-
-        # Get SigningKey
-        signing_key = get_signing_key(self.secret_key,
-                                      datetime_now.strftime('%Y%m%d'),
-                                      AWS_S3_REGION,
-                                      AWS_S3_SERVICE)
-
-        # Get Signature
-        signature = hmac_sha256(signing_key, string_to_sign, digest=False).hexdigest()
-
-        credential_str = '{access_key}/{scope}'.format(access_key=self.access_key,
-                                                       scope=request_scope)
-        authorization_str = ('AWS4-HMAC-SHA256 Credential={credential_str},'
-                             'SignedHeaders={header_str},Signature={signature}'
-                             ''.format(credential_str=credential_str,
-                                       header_str=signed_headers,
-                                       signature=signature))
-        header_dict['Authorization'] = authorization_str
-
-        # Build query string
-        query_string = '?' + canonical_query_string if canonical_query_string else ''
-        path = '/{}'.format(query_string)
-
-        # Run query
-        with closing(HTTPConnection(self.netloc)) as conn:
-            conn.request('GET', path, headers=header_dict)
-            response = conn.getresponse()
-            response_body = response.read()
-            if response.status not in (200, 204):
-                raise S3IOError(
-                    'openS3 GET error during listdir. '
-                    'Response status: {}. '
-                    'Reason: {}. '
-                    'Response Text: \n'
-                    '{}'.format(response.status, response.reason, response.read()))
-
-        root = ElementTree.fromstring(response_body)
-        # Work around xml namespace.
-        aws_xmlns_namespace = root.tag.rstrip('ListBucketResult').strip('{}')
-        namespaces = {'aws': aws_xmlns_namespace}
-        key_element_list = root.findall('aws:Contents/aws:Key', namespaces)
-        key_list = [k.text for k in key_element_list]
-        # Strip leading slash from object_key since we need to match against
-        # the keys without leading slashes that AWS returns.
-        return get_dirs_and_files(key_list, self.object_key)
-
-    def _request_signature(self, string_to_sign):
-        """
-        Construct a signature by making an RFC2104 HMAC-SHA1
-        of the following and converting it to Base64 UTF-8 encoded string.
-        """
-        digest = hmac.new(
-            self.secret_key.encode(ENCODING),
-            string_to_sign.encode(ENCODING),
-            hashlib.sha1
-        ).digest()
-        return b64_string(digest)
-
-    def _build_request_headers(self, method, object_key):
-        headers = dict()
-
-        headers['Date'] = format_date_time(datetime.now().timestamp())
-        # Only get size of file if there's data in the buffer.
-        # Else will have some run away recursion.
-        if self.buffer:
-            headers['Content-Length'] = self.size
-        headers['Content-MD5'] = self.md5hash
-        headers['Content-Type'] = self.content_type
-        headers['x-amz-acl'] = self.acl
-
-        if self.extra_request_headers:
-            headers.update(self.extra_request_headers)
-
-        if self.access_key and self.secret_key:
-            string_to_sign_list = [
-                method,
-                headers['Content-MD5'],
-                headers['Content-Type'],
-                headers['Date'],
-                'x-amz-acl:{}'.format(headers['x-amz-acl']),
-                '/' + self.bucket + object_key
-            ]
-            signature = self._request_signature('\n'.join(string_to_sign_list))
-            headers['Authorization'] = ''.join(['AWS' + ' ', self.access_key, ':', signature])
+        dirs, files = set(), set()
+        for entry in self.iterdir():
+            (dirs if entry.is_dir else files).add(entry.name)
+        return dirs, files
+
+    def iterdir(self, prefix=None):
+        """
+        Yield an :py:class:`~openS3.utils.S3Entry` for each file and directory
+        directly under ``prefix`` (defaults to ``object_key``). See :py:meth:`OpenS3.iterdir`.
+        """
+        return self.client.iterdir(self.object_key if prefix is None else prefix)
+
+    def walk(self, prefix=None):
+        """
+        Walk the "directory tree" under ``prefix`` (defaults to ``object_key``)
+        top-down. See :py:meth:`OpenS3.walk`.
+        """
+        return self.client.walk(self.object_key if prefix is None else prefix)
+
+    def rmtree(self, prefix=None, workers=DEFAULT_DELETE_WORKERS):
+        """
+        Remove every file whose key starts with ``prefix`` (defaults to
+        ``object_key``). See :py:meth:`OpenS3.rmtree`.
+        """
+        return self.client.rmtree(self.object_key if prefix is None else prefix, workers)
+
+
+def _remaining_size(fileobj):
+    """
+    Return the number of bytes left to read from ``fileobj`` if it is a
+    regular file, or ``None`` if that can't be known.
+    """
+    try:
+        status = os.fstat(fileobj.fileno())
+        position = fileobj.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+    if not stat.S_ISREG(status.st_mode):
+        return None
+    return max(0, status.st_size - position)
 
-        return headers
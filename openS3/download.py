@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+from http.client import IncompleteRead
+import json
+import mmap
+import os
+import threading
+import time
+
+from .utils import S3IOError, S3FileDoesNotExistError
+
+# Suffix of the file that records which parts of a download have completed.
+STATE_FILE_SUFFIX = '.opens3-download'
+
+
+class RangedDownload(object):
+    """
+    Download an S3 object to a local file by fetching byte ranges in parallel.
+
+    The local file is pre-allocated to the size of the object and memory-mapped.
+    Each range is read from its response straight into its slice of the mapping,
+    so the data is never copied through an intermediate buffer.
+
+    Ranges are retried as the client's :py:class:`~openS3.retry.RetryPolicy`
+    allows: error statuses when the request is sent, and dropped connections
+    or bodies cut short while it is read. Once a range has failed for good,
+    ranges that have not started are cancelled.
+
+    Completed parts are appended to a small log next to the download: a JSON
+    header describing the object followed by one part number per line. If a
+    download is interrupted, running it again only fetches the missing parts,
+    provided the remote object's ETag has not changed in the meantime.
+    """
+    def __init__(self, opener, object_key, path, workers, part_size):
+        """
+        :param opener: The :py:class:`~openS3.ctx_manager.OpenS3` object used to
+            sign and send requests.
+        :param object_key: Key of the S3 object to download.
+        :param path: Local path to write the object to.
+        :param workers: Number of ranges fetched concurrently.
+        :param part_size: Size in bytes of each range.
+        """
+        self.opener = opener
+        self.object_key = object_key
+        self.path = path
+        self.state_path = path + STATE_FILE_SUFFIX
+        self.workers = workers
+        self.part_size = part_size
+        self.size = None
+        self.etag = None
+        self.completed_parts = set()
+        self._state_file = None
+        self._lock = threading.Lock()
+
+    def _head(self):
+        headers = self.opener._build_request_headers('HEAD', self.object_key)
+        response, _ = self.opener._request('HEAD', self.object_key, headers=headers)
+        if response.status == 404:
+            raise S3FileDoesNotExistError(self.object_key)
+        if response.status != 200:
+            raise S3IOError(
+                'openS3 HEAD error. '
+                'Response status: {}. '
+                'Reason: {}.'.format(response.status, response.reason))
+        self.size = int(response.headers['Content-Length'])
+        self.etag = response.headers['ETag']
+
+    def _state_header(self):
+        return {'etag': self.etag, 'size': self.size, 'part_size': self.part_size}
+
+    def _load_state(self):
+        """
+        Return ``True`` if an earlier, interrupted download of the same version
+        of the object can be resumed.
+        """
+        try:
+            with open(self.state_path) as state_file:
+                header = json.loads(state_file.readline())
+                lines = state_file.readlines()
+        except (OSError, ValueError):
+            return False
+        if header != self._state_header() or os.path.getsize(self.path) != self.size:
+            return False
+        # A line without its newline was cut short by the interruption.
+        self.completed_parts = set(int(line) for line in lines if line.endswith('\n'))
+        return True
+
+    def _start_state(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as state_file:
+            state_file.write(json.dumps(self._state_header()) + '\n')
+        os.replace(tmp_path, self.state_path)
+
+    def _fetch_part(self, mapping, part_number):
+        start = part_number * self.part_size
+        end = min(start + self.part_size, self.size) - 1
+        policy = self.opener.retry_policy
+        attempt = 0
+        while True:
+            try:
+                self._read_range(mapping, start, end)
+                break
+            except policy.exceptions as e:
+                # The connection may drop midway through the body.
+                if not policy.should_retry_error(e, attempt):
+                    raise
+                time.sleep(policy.backoff(attempt))
+                attempt += 1
+
+        # The offset passed to flush must be aligned, but parts need not be.
+        offset = start - start % mmap.ALLOCATIONGRANULARITY
+        mapping.flush(offset, end + 1 - offset)
+        with self._lock:
+            self.completed_parts.add(part_number)
+            self._state_file.write('{}\n'.format(part_number))
+            self._state_file.flush()
+
+    def _read_range(self, mapping, start, end):
+        headers = self.opener._build_request_headers('GET', self.object_key)
+        headers['Range'] = 'bytes={}-{}'.format(start, end)
+        # Fail rather than mix ranges of two different versions of the object.
+        headers['If-Match'] = self.etag
+
+        pool = self.opener.pool
+        conn, response = self.opener._urlopen('GET', self.object_key, headers=headers)
+        try:
+            if response.status != 206:
+                raise S3IOError(
+                    'openS3 GET error. '
+                    'Response status: {}. '
+                    'Reason: {}. '
+                    'Response Text: \n'
+                    '{}'.format(response.status, response.reason, response.read()))
+            view = memoryview(mapping)[start:end + 1]
+            try:
+                filled = 0
+                while filled < len(view):
+                    with view[filled:] as remaining:
+                        n = response.readinto(remaining)
+                    if not n:
+                        # Retryable, unlike an S3IOError.
+                        with view[:filled] as partial:
+                            raise IncompleteRead(bytes(partial), len(view) - filled)
+                    filled += n
+            finally:
+                view.release()
+            # Drain the (empty) rest of the body so the connection can be reused.
+            response.read()
+        except BaseException as e:
+            pool.discard(conn, response, e)
+            raise
+        pool.release(conn, response)
+
+    def run(self):
+        """Download the object and return the number of bytes fetched."""
+        self._head()
+        resumed = self._load_state()
+        if not resumed:
+            self.completed_parts = set()
+            self._start_state()
+            with open(self.path, 'wb') as f:
+                f.truncate(self.size)
+                if self.size and hasattr(os, 'posix_fallocate'):
+                    try:
+                        # Reserve the blocks up front rather than leaving a sparse file.
+                        os.posix_fallocate(f.fileno(), 0, self.size)
+                    except OSError:
+                        pass
+        if self.size == 0:
+            os.remove(self.state_path)
+            return 0
+
+        num_parts = -(-self.size // self.part_size)
+        missing = [n for n in range(num_parts) if n not in self.completed_parts]
+        with open(self.path, 'r+b') as f, open(self.state_path, 'a') as self._state_file:
+            with mmap.mmap(f.fileno(), self.size) as mapping:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    futures = [executor.submit(self._fetch_part, mapping, n) for n in missing]
+                    done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+                    # Don't fetch the rest of the object once a part has failed.
+                    for future in not_done:
+                        future.cancel()
+                    for future in done:
+                        future.result()
+        self._state_file = None
+
+        os.remove(self.state_path)
+        return sum(min(self.part_size, self.size - n * self.part_size) for n in missing)
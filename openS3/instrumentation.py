@@ -0,0 +1,377 @@
+"""
+Hooks into the life of each request, and a :py:class:`MetricsAggregator`
+that turns them into per operation counters and latency histograms.
+
+Register a callback on :py:attr:`OpenS3.hooks <openS3.ctx_manager.OpenS3.hooks>`
+and it is called with the name of each event and the :py:class:`RequestTrace`
+of the request it belongs to::
+
+    metrics = MetricsAggregator()
+    openS3 = OpenS3('my_bucket', '<access_key>', '<secret_key>')
+    openS3.hooks.register(metrics)
+    ...
+    print(metrics.snapshot()['GetObject']['latency']['p99'])
+
+Callbacks run on the thread that sends the request, so they should be quick.
+Exceptions raised by a callback propagate to the caller.
+"""
+import threading
+import time
+
+from .constants import DEFAULT_LATENCY_BUCKETS
+
+# Names of the events a request goes through, in order. Every request starts
+# with REQUEST_START and ends with either BODY_COMPLETE or REQUEST_ERROR.
+# CONNECTION_ACQUIRED is emitted again when a request is resent.
+REQUEST_START = 'request-start'
+CONNECTION_ACQUIRED = 'connection-acquired'
+HEADERS_RECEIVED = 'headers-received'
+BODY_COMPLETE = 'body-complete'
+REQUEST_ERROR = 'request-error'
+
+
+def get_operation_name(method, target, headers):
+    """
+    Return the name of the S3 API operation (eg. 'GetObject') a request with
+    ``method``, request target ``target`` and ``headers`` performs.
+    """
+    query = target.partition('?')[2]
+    params = {param.partition('=')[0] for param in query.split('&') if param}
+    copy = any(name.lower() == 'x-amz-copy-source' for name in headers)
+    if method == 'GET':
+        return 'ListObjectsV2' if 'list-type' in params else 'GetObject'
+    if method == 'HEAD':
+        return 'HeadObject'
+    if method == 'PUT':
+        if 'partNumber' in params:
+            return 'UploadPartCopy' if copy else 'UploadPart'
+        return 'CopyObject' if copy else 'PutObject'
+    if method == 'POST':
+        if 'uploads' in params:
+            return 'CreateMultipartUpload'
+        if 'uploadId' in params:
+            return 'CompleteMultipartUpload'
+        if 'delete' in params:
+            return 'DeleteObjects'
+    if method == 'DELETE':
+        return 'AbortMultipartUpload' if 'uploadId' in params else 'DeleteObject'
+    return method
+
+
+class Hooks(object):
+    """
+    The callbacks interested in requests. Each is called as
+    ``callback(event, trace)``. One :py:class:`Hooks` object can be shared by
+    many :py:class:`~openS3.ctx_manager.OpenS3` objects and threads.
+    """
+    def __init__(self, callbacks=()):
+        self._callbacks = tuple(callbacks)
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self._callbacks)
+
+    def register(self, callback):
+        """Call ``callback`` for every event from now on. Return ``callback``."""
+        with self._lock:
+            self._callbacks += (callback,)
+        return callback
+
+    def unregister(self, callback):
+        """Stop calling ``callback``."""
+        with self._lock:
+            self._callbacks = tuple(c for c in self._callbacks if c is not callback)
+
+    def emit(self, event, trace):
+        for callback in self._callbacks:
+            callback(event, trace)
+
+
+class RequestTrace(object):
+    """
+    What is known about one request so far. Times are
+    :py:func:`time.perf_counter` values, ``None`` until reached.
+    """
+    def __init__(self, hooks, method, target, headers, attempt=0, hedge=False):
+        """
+        :param hooks: The :py:class:`Hooks` to report events to.
+        :param method: HTTP verb of the request.
+        :param target: Path and query string of the request.
+        :param headers: A dict of the headers sent.
+        :param attempt: How many times the request was sent before, as set by
+            a :py:class:`~openS3.retry.RetryPolicy`.
+        :param hedge: Whether the request duplicates one that is slow to answer.
+        """
+        self.hooks = hooks
+        self.method = method
+        self.target = target
+        self.operation = get_operation_name(method, target, headers)
+        self.start_time = time.perf_counter()
+        self.connection_time = None
+        self.headers_time = None
+        self.end_time = None
+        # Whether the last connection used came from the pool.
+        self.connection_reused = None
+        # Seconds the TLS handshake of a new HTTPS connection took, and whether
+        # it resumed an earlier session. None for reused or plain HTTP connections.
+        self.tls_handshake_duration = None
+        self.tls_session_reused = None
+        self.attempt = attempt
+        self.hedge = hedge
+        # Number of times the request was sent again on a new connection after
+        # a pooled one turned out to be closed.
+        self.retries = 0
+        self.status = None
+        self.request_id = None
+        self.bytes_sent = int(headers.get('Content-Length') or 0)
+        # Bytes of the response body read, including any chunked framing.
+        self.bytes_received = 0
+        # Whether the body was read to the end rather than abandoned.
+        self.complete = False
+        self.error = None
+
+    def emit(self, event):
+        self.hooks.emit(event, self)
+
+    def connection_acquired(self, reused):
+        self.connection_time = time.perf_counter()
+        self.connection_reused = reused
+        self.emit(CONNECTION_ACQUIRED)
+
+    def headers_received(self, response):
+        self.headers_time = time.perf_counter()
+        self.status = response.status
+        self.request_id = response.getheader('x-amz-request-id')
+        self.emit(HEADERS_RECEIVED)
+
+    def finish(self, complete):
+        if self.end_time is not None:
+            return
+        self.end_time = time.perf_counter()
+        self.complete = complete
+        self.emit(BODY_COMPLETE)
+
+    def fail(self, error):
+        if self.end_time is not None:
+            return
+        self.end_time = time.perf_counter()
+        self.error = error
+        self.emit(REQUEST_ERROR)
+
+    @property
+    def connect_duration(self):
+        """Seconds spent waiting for (and, if new, opening) the connection."""
+        if self.connection_time is None:
+            return None
+        return self.connection_time - self.start_time
+
+    @property
+    def time_to_first_byte(self):
+        """Seconds from the start of the request until the response headers arrived."""
+        if self.headers_time is None:
+            return None
+        return self.headers_time - self.start_time
+
+    @property
+    def transfer_duration(self):
+        """Seconds spent reading the response body."""
+        if self.headers_time is None or self.end_time is None:
+            return None
+        return self.end_time - self.headers_time
+
+    @property
+    def duration(self):
+        """Seconds from the start of the request until it completed or failed."""
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+
+class CountingReader(object):
+    """
+    Wraps the file an :py:class:`http.client.HTTPResponse` reads its body
+    from and adds the number of bytes read to ``trace.bytes_received``.
+    """
+    def __init__(self, fp, trace):
+        self._fp = fp
+        self._trace = trace
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+    def _count(self, data):
+        self._trace.bytes_received += len(data)
+        return data
+
+    def read(self, *args):
+        return self._count(self._fp.read(*args))
+
+    def read1(self, *args):
+        return self._count(self._fp.read1(*args))
+
+    def readline(self, *args):
+        return self._count(self._fp.readline(*args))
+
+    def readinto(self, buffer):
+        n = self._fp.readinto(buffer)
+        if n:
+            self._trace.bytes_received += n
+        return n
+
+
+class Histogram(object):
+    """Counts of observed values in buckets with fixed upper bounds."""
+    def __init__(self, bounds=DEFAULT_LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        # One more than there are bounds, for values above the last.
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = len(self.bounds)
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, fraction):
+        """
+        Return an estimate of the value below which ``fraction`` of the
+        observations fall, interpolated within its bucket.
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = self.bounds[i] if i < len(self.bounds) else self.max
+            if count and seen + count >= rank:
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+            lower = upper
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'buckets': list(zip(self.bounds + (float('inf'),), self.counts)),
+            'p50': self.quantile(0.50),
+            'p90': self.quantile(0.90),
+            'p99': self.quantile(0.99),
+        }
+
+
+class OperationMetrics(object):
+    """Counters and latency histograms of one S3 operation."""
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.hedges = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.tls_sessions_resumed = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.statuses = {}
+        self.latency = Histogram(buckets)
+        self.time_to_first_byte = Histogram(buckets)
+        self.connect = Histogram(buckets)
+        self.tls_handshake = Histogram(buckets)
+
+    def to_dict(self):
+        return {
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'new_connections': self.new_connections,
+            'tls_handshakes': self.tls_handshakes,
+            'tls_sessions_resumed': self.tls_sessions_resumed,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'statuses': dict(self.statuses),
+            'latency': self.latency.to_dict(),
+            'time_to_first_byte': self.time_to_first_byte.to_dict(),
+            'connect': self.connect.to_dict(),
+            'tls_handshake': self.tls_handshake.to_dict(),
+        }
+
+
+class MetricsAggregator(object):
+    """
+    A hook that keeps :py:class:`OperationMetrics` for each S3 operation:
+    requests in flight and completed, exceptions, retries, hedged requests,
+    new connections, TLS handshakes and how many resumed a session, bytes
+    each way, response statuses, and histograms of total latency, time to
+    first byte, time to get a connection and TLS handshake time. Requests
+    that raise count as errors; error responses from S3 are counted by status.
+    """
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        """
+        :param buckets: Upper bounds, in seconds, of the histogram buckets.
+        """
+        self.buckets = buckets
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def _metrics(self, operation):
+        metrics = self.operations.get(operation)
+        if metrics is None:
+            metrics = self.operations[operation] = OperationMetrics(self.buckets)
+        return metrics
+
+    def __call__(self, event, trace):
+        if event not in (REQUEST_START, CONNECTION_ACQUIRED, BODY_COMPLETE, REQUEST_ERROR):
+            return
+        with self._lock:
+            metrics = self._metrics(trace.operation)
+            if event == REQUEST_START:
+                metrics.in_flight += 1
+                return
+            if event == CONNECTION_ACQUIRED:
+                if not trace.connection_reused:
+                    metrics.new_connections += 1
+                if trace.tls_handshake_duration is not None:
+                    metrics.tls_handshakes += 1
+                    metrics.tls_sessions_resumed += 1 if trace.tls_session_reused else 0
+                    metrics.tls_handshake.observe(trace.tls_handshake_duration)
+                return
+            metrics.in_flight -= 1
+            metrics.requests += 1
+            metrics.retries += trace.retries + (1 if trace.attempt else 0)
+            metrics.hedges += 1 if trace.hedge else 0
+            metrics.bytes_sent += trace.bytes_sent
+            metrics.bytes_received += trace.bytes_received
+            metrics.latency.observe(trace.duration)
+            if event == REQUEST_ERROR:
+                metrics.errors += 1
+            if trace.status is not None:
+                metrics.statuses[trace.status] = metrics.statuses.get(trace.status, 0) + 1
+                metrics.time_to_first_byte.observe(trace.time_to_first_byte)
+            if trace.connect_duration is not None:
+                metrics.connect.observe(trace.connect_duration)
+
+    def snapshot(self):
+        """Return a dict of plain data, keyed by operation name, to export."""
+        with self._lock:
+            return {name: metrics.to_dict() for name, metrics in self.operations.items()}
+
+    def reset(self):
+        """Forget everything recorded so far, except requests still in flight."""
+        with self._lock:
+            for name, metrics in list(self.operations.items()):
+                in_flight = metrics.in_flight
+                metrics = self.operations[name] = OperationMetrics(self.buckets)
+                metrics.in_flight = in_flight
@@ -0,0 +1,534 @@
+"""
+A dependency free, in-memory stand-in for the parts of the S3 REST API used by
+:py:class:`~openS3.ctx_manager.OpenS3`: GET (with ranges and conditions), PUT,
+HEAD, DELETE, ListObjectsV2, Multi-Object Delete and multipart uploads.
+
+The server is meant for tests and benchmarks. It ignores request signatures,
+serves a single bucket regardless of the ``Host`` header and can be told to
+inject latency and limit bandwidth to imitate a remote endpoint. Given an
+``ssl_context`` with a certificate loaded, it serves HTTPS::
+
+    with LocalS3Server(latency=0.02) as server:
+        pool = ConnectionPool(server.netloc)
+        openS3 = OpenS3('bucket', 'access key', 'secret key', pool=pool)
+
+Run ``python -m openS3.localserver`` to serve on a fixed port.
+"""
+import argparse
+from base64 import b64encode
+from collections import deque
+from datetime import datetime
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+import urllib.parse
+import uuid
+from wsgiref.handlers import format_date_time
+from xml.etree import ElementTree
+
+from .constants import MIN_MULTIPART_PART_SIZE
+
+S3_XMLNS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+# S3 error codes sent with injected faults.
+FAULT_ERROR_CODES = {
+    500: 'InternalError',
+    503: 'SlowDown',
+}
+
+
+class _StoredObject(object):
+    __slots__ = ('data', 'etag', 'content_type', 'content_encoding', 'last_modified')
+
+    def __init__(self, data, etag, content_type, content_encoding=None):
+        self.data = data
+        self.etag = etag
+        self.content_type = content_type
+        self.content_encoding = content_encoding
+        self.last_modified = time.time()
+
+
+def _decode_aws_chunked(raw):
+    """Strip the chunk framing from an ``aws-chunked`` request body."""
+    data = bytearray()
+    view = memoryview(raw)
+    position = 0
+    while True:
+        line_end = raw.index(b'\r\n', position)
+        size = int(raw[position:line_end].split(b';')[0], 16)
+        start = line_end + 2
+        data += view[start:start + size]
+        position = start + size + 2
+        if size == 0:
+            return bytes(data)
+
+
+class S3RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'openS3LocalServer'
+    # Headers and body are written separately. With Nagle's algorithm a small
+    # body would wait for the client's delayed ACK of the headers.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+        fault = self.server.next_fault()
+        if fault is None:
+            return True
+        status, delay, retry_after = fault
+        if delay:
+            time.sleep(delay)
+        if status is None:
+            return True
+        # Read the body so the connection can be kept alive.
+        self._throttled_read(int(self.headers.get('Content-Length') or 0))
+        headers = {}
+        if retry_after is not None:
+            headers['Retry-After'] = str(retry_after)
+        self._send_error(status, FAULT_ERROR_CODES.get(status, 'InternalError'),
+                         send_body=self.command != 'HEAD', headers=headers)
+        return False
+
+    # Helpers
+
+    @property
+    def store(self):
+        return self.server.store
+
+    def _parse(self):
+        parts = urllib.parse.urlsplit(self.path)
+        key = urllib.parse.unquote(parts.path).lstrip('/')
+        query = dict(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+        return key, query
+
+    def _read_body(self):
+        """
+        Return the decoded request body, or ``None`` after sending a BadDigest
+        error if it does not match its ``Content-MD5`` header.
+        """
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self._throttled_read(length)
+        if self.headers.get('x-amz-content-sha256', '').startswith('STREAMING-'):
+            body = _decode_aws_chunked(body)
+        # Kept for the ETag, so the body is only hashed once.
+        self.body_md5 = hashlib.md5(body)
+        content_md5 = self.headers.get('Content-MD5')
+        if content_md5 and content_md5 != b64encode(self.body_md5.digest()).decode():
+            self._send_error(400, 'BadDigest')
+            return None
+        return body
+
+    def _throttled_read(self, length):
+        if not self.server.bandwidth:
+            return self.rfile.read(length)
+        chunks = []
+        remaining = length
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 64 * 1024))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+            self.server.throttle(len(chunk))
+        return b''.join(chunks)
+
+    def _send(self, status, body=b'', headers=None, send_body=True):
+        self.server.inject_latency()
+        self.send_response(status)
+        headers = headers or {}
+        headers.setdefault('x-amz-request-id', uuid.uuid4().hex[:16].upper())
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body and body:
+            view = memoryview(body)
+            for start in range(0, len(view), 64 * 1024):
+                chunk = view[start:start + 64 * 1024]
+                self.wfile.write(chunk)
+                self.server.throttle(len(chunk))
+
+    def _send_xml(self, status, element):
+        body = b'<?xml version="1.0" encoding="UTF-8"?>' + ElementTree.tostring(element)
+        self._send(status, body, {'Content-Type': 'application/xml'})
+
+    def _send_error(self, status, code, send_body=True, headers=None):
+        body = ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<Error><Code>{}</Code><Message>{}</Message></Error>'
+                ''.format(code, code)).encode()
+        headers = dict(headers or {}, **{'Content-Type': 'application/xml'})
+        self._send(status, body, headers, send_body=send_body)
+
+    def _object_headers(self, obj):
+        headers = {
+            'ETag': obj.etag,
+            'Content-Type': obj.content_type,
+            'Last-Modified': format_date_time(obj.last_modified),
+            'Accept-Ranges': 'bytes',
+        }
+        if obj.content_encoding:
+            headers['Content-Encoding'] = obj.content_encoding
+        return headers
+
+    def _element(self, tag, parent=None, text=None):
+        if parent is None:
+            element = ElementTree.Element(tag, xmlns=S3_XMLNS)
+        else:
+            element = ElementTree.SubElement(parent, tag)
+        if text is not None:
+            element.text = str(text)
+        return element
+
+    # Verbs
+
+    def do_HEAD(self):
+        key, _ = self._parse()
+        with self.server.lock:
+            obj = self.store.get(key)
+        if obj is None:
+            return self._send_error(404, 'NoSuchKey', send_body=False)
+        headers = self._object_headers(obj)
+        self.server.inject_latency()
+        self.send_response(200)
+        headers.setdefault('x-amz-request-id', uuid.uuid4().hex[:16].upper())
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(obj.data)))
+        self.end_headers()
+
+    def do_GET(self):
+        key, query = self._parse()
+        if not key:
+            return self._list(query)
+        with self.server.lock:
+            obj = self.store.get(key)
+        if obj is None:
+            return self._send_error(404, 'NoSuchKey')
+        if_match = self.headers.get('If-Match')
+        if if_match and if_match != obj.etag:
+            return self._send_error(412, 'PreconditionFailed')
+        if self.headers.get('If-None-Match') == obj.etag:
+            return self._send(304, headers={'ETag': obj.etag})
+        headers = self._object_headers(obj)
+        range_header = self.headers.get('Range')
+        if not range_header:
+            return self._send(200, obj.data, headers)
+
+        size = len(obj.data)
+        start, _, end = range_header.split('=', 1)[1].partition('-')
+        if not start:
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        if start >= size:
+            return self._send_error(416, 'InvalidRange',
+                                    headers={'Content-Range': 'bytes */{}'.format(size)})
+        headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+        self._send(206, obj.data[start:end + 1], headers)
+
+    def do_PUT(self):
+        key, query = self._parse()
+        if 'uploadId' in query:
+            return self._upload_part(key, query)
+        body = self._read_body()
+        if body is None:
+            return
+        copy_source = self.headers.get('x-amz-copy-source')
+        if copy_source:
+            source = urllib.parse.unquote(copy_source).split('/', 2)[-1]
+            with self.server.lock:
+                obj = self.store.get(source)
+            if obj is None:
+                return self._send_error(404, 'NoSuchKey')
+            self.body_md5 = hashlib.md5(body)
+            body = obj.data
+        obj = _StoredObject(body, '"{}"'.format(self.body_md5.hexdigest()),
+                            self.headers.get('Content-Type', 'binary/octet-stream'),
+                            self._content_encoding())
+        with self.server.lock:
+            self.store[key] = obj
+        self._send(200, headers={'ETag': obj.etag})
+
+    def do_DELETE(self):
+        key, query = self._parse()
+        with self.server.lock:
+            if 'uploadId' in query:
+                self.server.uploads.pop(query['uploadId'], None)
+            else:
+                self.store.pop(key, None)
+        self._send(204)
+
+    def do_POST(self):
+        key, query = self._parse()
+        if 'delete' in query:
+            return self._delete_many()
+        if 'uploads' in query:
+            upload_id = uuid.uuid4().hex
+            with self.server.lock:
+                self.server.uploads[upload_id] = {
+                    'key': key,
+                    'parts': {},
+                    'content_type': self.headers.get('Content-Type', 'binary/octet-stream'),
+                    'content_encoding': self._content_encoding(),
+                }
+            root = self._element('InitiateMultipartUploadResult')
+            self._element('Key', root, key)
+            self._element('UploadId', root, upload_id)
+            return self._send_xml(200, root)
+        if 'uploadId' in query:
+            return self._complete_upload(key, query)
+        self._send_error(400, 'InvalidRequest')
+
+    def _content_encoding(self):
+        encodings = [e.strip() for e in self.headers.get('Content-Encoding', '').split(',')]
+        encodings = [e for e in encodings if e and e != 'aws-chunked']
+        return ','.join(encodings) or None
+
+    # Multipart
+
+    def _upload_part(self, key, query):
+        body = self._read_body()
+        if body is None:
+            return
+        with self.server.lock:
+            upload = self.server.uploads.get(query['uploadId'])
+        if upload is None:
+            return self._send_error(404, 'NoSuchUpload')
+
+        copy_source = self.headers.get('x-amz-copy-source')
+        if copy_source:
+            source = urllib.parse.unquote(copy_source).split('/', 2)[-1]
+            with self.server.lock:
+                obj = self.store.get(source)
+            if obj is None:
+                return self._send_error(404, 'NoSuchKey')
+            body = obj.data
+            copy_range = self.headers.get('x-amz-copy-source-range')
+            if copy_range:
+                start, end = copy_range.split('=', 1)[1].split('-')
+                body = body[int(start):int(end) + 1]
+
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        with self.server.lock:
+            upload['parts'][int(query['partNumber'])] = (body, etag)
+        if copy_source:
+            root = self._element('CopyPartResult')
+            self._element('ETag', root, etag)
+            return self._send_xml(200, root)
+        self._send(200, headers={'ETag': etag})
+
+    def _complete_upload(self, key, query):
+        body = self._read_body()
+        if body is None:
+            return
+        request = ElementTree.fromstring(body)
+        with self.server.lock:
+            upload = self.server.uploads.pop(query['uploadId'], None)
+        if upload is None:
+            return self._send_error(404, 'NoSuchUpload')
+
+        parts = []
+        for part in request.iter():
+            if part.tag.endswith('PartNumber'):
+                parts.append(int(part.text))
+        for index, number in enumerate(parts):
+            body = upload['parts'].get(number, (None,))[0]
+            if body is None:
+                return self._send_error(400, 'InvalidPart')
+            if index < len(parts) - 1 and len(body) < self.server.min_part_size:
+                return self._send_error(400, 'EntityTooSmall')
+
+        data = b''.join(upload['parts'][number][0] for number in parts)
+        md5s = b''.join(hashlib.md5(upload['parts'][n][0]).digest() for n in parts)
+        etag = '"{}-{}"'.format(hashlib.md5(md5s).hexdigest(), len(parts))
+        with self.server.lock:
+            self.store[key] = _StoredObject(data, etag, upload['content_type'],
+                                            upload['content_encoding'])
+        root = self._element('CompleteMultipartUploadResult')
+        self._element('Key', root, key)
+        self._element('ETag', root, etag)
+        self._send_xml(200, root)
+
+    # Bucket operations
+
+    def _delete_many(self):
+        body = self._read_body()
+        if body is None:
+            return
+        request = ElementTree.fromstring(body)
+        root = self._element('DeleteResult')
+        for key_element in request.iter():
+            if not key_element.tag.endswith('Key'):
+                continue
+            with self.server.lock:
+                self.store.pop(key_element.text, None)
+            deleted = self._element('Deleted', root)
+            self._element('Key', deleted, key_element.text)
+        self._send_xml(200, root)
+
+    def _list(self, query):
+        prefix = query.get('prefix', '')
+        delimiter = query.get('delimiter', '')
+        max_keys = int(query.get('max-keys', 1000))
+        start_after = query.get('continuation-token') or query.get('start-after', '')
+
+        with self.server.lock:
+            keys = sorted(k for k in self.store if k.startswith(prefix) and k > start_after)
+
+        root = self._element('ListBucketResult')
+        self._element('Prefix', root, prefix)
+        contents, prefixes = [], []
+        truncated = False
+        last = None
+        for key in keys:
+            if len(contents) + len(prefixes) >= max_keys:
+                truncated = True
+                break
+            rest = key[len(prefix):]
+            if delimiter and delimiter in rest:
+                common = prefix + rest.split(delimiter, 1)[0] + delimiter
+                if common not in prefixes:
+                    prefixes.append(common)
+                # Skip past everything under the common prefix.
+                last = common + '￿'
+                continue
+            contents.append(key)
+            last = key
+
+        self._element('KeyCount', root, len(contents) + len(prefixes))
+        self._element('MaxKeys', root, max_keys)
+        self._element('IsTruncated', root, 'true' if truncated else 'false')
+        if truncated:
+            self._element('NextContinuationToken', root, last)
+        with self.server.lock:
+            objects = [(k, self.store.get(k)) for k in contents]
+        for key, obj in objects:
+            if obj is None:
+                continue
+            content = self._element('Contents', root)
+            self._element('Key', content, key)
+            self._element('LastModified', content, datetime.utcfromtimestamp(
+                obj.last_modified).strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+            self._element('ETag', content, obj.etag)
+            self._element('Size', content, len(obj.data))
+            self._element('StorageClass', content, 'STANDARD')
+        for common in prefixes:
+            common_prefix = self._element('CommonPrefixes', root)
+            self._element('Prefix', common_prefix, common)
+        self._send_xml(200, root)
+
+
+class LocalS3Server(ThreadingHTTPServer):
+    """
+    An in-memory S3 stand-in serving one bucket from a background thread.
+    Objects are kept in :py:attr:`store`, a dict keyed by object key without
+    the leading slash.
+    """
+    daemon_threads = True
+    # Benchmarks open many connections at once.
+    request_queue_size = 1024
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, bandwidth=None,
+                 min_part_size=MIN_MULTIPART_PART_SIZE, ssl_context=None):
+        """
+        :param address: A (host, port) tuple to listen on. Port 0 picks a free port.
+        :param latency: Seconds to wait before sending each response.
+        :param bandwidth: Bytes per second each connection may send or receive.
+            ``None`` for no limit.
+        :param min_part_size: Smallest multipart upload part, other than the
+            last, that is accepted.
+        :param ssl_context: A server side :py:class:`ssl.SSLContext` to serve HTTPS with.
+        """
+        super().__init__(address, S3RequestHandler)
+        self.ssl_context = ssl_context
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.min_part_size = min_part_size
+        self.store = {}
+        self.uploads = {}
+        self.faults = deque()
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def netloc(self):
+        """The 'host:port' the server listens on, for a ConnectionPool."""
+        return '{}:{}'.format(*self.server_address[:2])
+
+    def inject_fault(self, status=None, delay=0.0, retry_after=None, count=1):
+        """
+        Make the next ``count`` requests wait ``delay`` seconds and then, if
+        ``status`` is given, fail with that status instead of being handled.
+
+        :param retry_after: Value of the ``Retry-After`` header of the failures.
+        """
+        with self.lock:
+            self.faults.extend([(status, delay, retry_after)] * count)
+
+    def next_fault(self):
+        with self.lock:
+            return self.faults.popleft() if self.faults else None
+
+    def inject_latency(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def throttle(self, nbytes):
+        if self.bandwidth:
+            time.sleep(nbytes / self.bandwidth)
+
+    def start(self):
+        """Serve requests from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def get_request(self):
+        sock, address = super().get_request()
+        if self.ssl_context is not None:
+            # Handshake on the handler's thread, not the one accepting connections.
+            sock = self.ssl_context.wrap_socket(sock, server_side=True,
+                                                do_handshake_on_connect=False)
+        return sock, address
+
+    def handle_error(self, request, client_address):
+        # Clients routinely drop connections midway through a response when
+        # they stop reading a stream early. Don't spam stderr about it.
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds to wait before each response')
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help='bytes per second per connection')
+    args = parser.parse_args()
+    server = LocalS3Server((args.host, args.port), args.latency, args.bandwidth)
+    print('Serving on {}'.format(server.netloc))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from xml.etree import ElementTree
+
+from .utils import S3IOError, get_xml_namespaces
+
+
+class MultipartUpload(object):
+    """
+    An S3 multipart upload whose parts are sent concurrently from a thread pool.
+
+    Parts are numbered in the order they are handed to :py:meth:`upload_part`.
+    At most ``max_in_flight`` parts are queued or uploading at any one time;
+    :py:meth:`upload_part` blocks until a slot frees up, which bounds the
+    memory held by part buffers.
+    """
+    def __init__(self, opener, object_key, max_workers, max_in_flight, object_headers=None):
+        """
+        :param opener: The :py:class:`~openS3.ctx_manager.OpenS3` object used to
+            sign and send requests.
+        :param object_key: Key of the S3 object being uploaded.
+        :param max_workers: Number of threads uploading parts.
+        :param max_in_flight: Maximum number of parts queued or uploading at once.
+        :param object_headers: A dict of the headers that describe the object
+            (eg. its content type), sent when the upload is initiated.
+        """
+        self.opener = opener
+        self.object_key = object_key
+        self.object_headers = object_headers
+        self.upload_id = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._futures = []
+        self._error = None
+
+    @property
+    def num_parts(self):
+        return len(self._futures)
+
+    def _query(self, part_number=None):
+        if part_number is None:
+            return {'uploadId': self.upload_id}
+        return {'partNumber': str(part_number), 'uploadId': self.upload_id}
+
+    def _request(self, method, query, body=None, object_headers=None, amz_headers=None):
+        headers = self.opener._build_request_headers(
+            method, self.object_key, content=body, query=query,
+            object_headers=object_headers, amz_headers=amz_headers)
+        return self.opener._request(method, self.object_key, body, headers, query)
+
+    def _raise_for_status(self, operation, response, body):
+        if response.status not in (200, 204):
+            raise S3IOError(
+                'openS3 {} error. '
+                'Response status: {}. '
+                'Reason: {}. '
+                'Response Text: \n'
+                '{}'.format(operation, response.status, response.reason, body))
+
+    def initiate(self):
+        """Start the multipart upload and remember its upload id."""
+        amz_headers = None
+        if self.opener.checksum_crc32c:
+            amz_headers = {'x-amz-checksum-algorithm': 'CRC32C'}
+        response, body = self._request('POST', {'uploads': ''}, object_headers=self.object_headers,
+                                       amz_headers=amz_headers)
+        self._raise_for_status('initiate multipart upload', response, body)
+        root = ElementTree.fromstring(body)
+        self.upload_id = root.find('aws:UploadId', get_xml_namespaces(root)).text
+        return self.upload_id
+
+    def _upload_part(self, part_number, data, digest):
+        query = self._query(part_number)
+        if digest is None:
+            digest = self.opener._digest(data)
+        headers, data = self.opener._build_upload_request('PUT', self.object_key, data, query,
+                                                          digest=digest)
+        response, body = self.opener._request('PUT', self.object_key, data, headers, query)
+        self._raise_for_status('upload part', response, body)
+        return response.headers['ETag'], digest.crc32c
+
+    def _upload_part_copy(self, part_number, amz_headers):
+        response, body = self._request('PUT', self._query(part_number),
+                                       amz_headers=amz_headers)
+        self._raise_for_status('upload part copy', response, body)
+        root = ElementTree.fromstring(body)
+        namespaces = get_xml_namespaces(root)
+        etag = root.find('aws:ETag', namespaces)
+        if etag is None:
+            # S3 may report an error in the body of a 200 response.
+            raise S3IOError('openS3 upload part copy error. '
+                            'Response Text: \n{}'.format(body))
+        return etag.text, root.findtext('aws:ChecksumCRC32C', None, namespaces)
+
+    def _run(self, func, *args):
+        try:
+            return func(*args)
+        except BaseException as e:
+            self._error = e
+            raise
+        finally:
+            self._slots.release()
+
+    def _submit(self, func, *args):
+        """
+        Queue ``func`` to upload the next part. Block while ``max_in_flight``
+        parts are already queued or uploading.
+        """
+        if self._error is not None:
+            raise S3IOError('openS3 multipart upload failed: {}'.format(self._error))
+        self._slots.acquire()
+        part_number = len(self._futures) + 1
+        self._futures.append(self._executor.submit(self._run, func, part_number, *args))
+
+    def upload_part(self, data, digest=None):
+        """
+        Queue ``data`` for upload as the next part. Block while ``max_in_flight``
+        parts are already queued or uploading.
+
+        :param data: Bytes of the part.
+        :param digest: The :py:class:`~openS3.checksums.Digest` of ``data``, if
+            it is already known. Otherwise it is computed by the upload thread.
+        """
+        self._submit(self._upload_part, data, digest)
+
+    def upload_part_copy(self, copy_source, start=None, end=None, if_match=None):
+        """
+        Queue a copy of (a byte range of) an existing S3 object as the next part.
+        The bytes are copied by S3 and never pass through this host.
+
+        :param copy_source: URL encoded ``/bucket/key`` of the object to copy.
+        :param start: Offset of the first byte to copy.
+        :param end: Offset of the last byte to copy (inclusive).
+        :param if_match: Only copy the source object if its ETag matches.
+        """
+        amz_headers = {'x-amz-copy-source': copy_source}
+        if start is not None:
+            amz_headers['x-amz-copy-source-range'] = 'bytes={}-{}'.format(start, end)
+        if if_match:
+            amz_headers['x-amz-copy-source-if-match'] = if_match
+        self._submit(self._upload_part_copy, amz_headers)
+
+    def complete(self):
+        """
+        Wait for all parts to finish uploading and assemble them into the S3 object.
+        """
+        try:
+            results = [future.result() for future in self._futures]
+        finally:
+            self._executor.shutdown()
+
+        root = ElementTree.Element('CompleteMultipartUpload')
+        for part_number, (etag, checksum_crc32c) in enumerate(results, start=1):
+            part = ElementTree.SubElement(root, 'Part')
+            ElementTree.SubElement(part, 'PartNumber').text = str(part_number)
+            ElementTree.SubElement(part, 'ETag').text = etag
+            if checksum_crc32c:
+                ElementTree.SubElement(part, 'ChecksumCRC32C').text = checksum_crc32c
+        response, body = self._request('POST', self._query(),
+                                       ElementTree.tostring(root))
+        self._raise_for_status('complete multipart upload', response, body)
+        # S3 may report an error in the body of a 200 response.
+        if b'<Error>' in body:
+            raise S3IOError('openS3 complete multipart upload error. '
+                            'Response Text: \n{}'.format(body))
+
+    def abort(self):
+        """
+        Cancel queued parts and abort the multipart upload so S3 frees the
+        storage used by parts uploaded so far.
+        """
+        for future in self._futures:
+            future.cancel()
+        self._executor.shutdown()
+        if self.upload_id is None:
+            return
+        response, body = self._request('DELETE', self._query())
+        self._raise_for_status('abort multipart upload', response, body)
@@ -0,0 +1,257 @@
+from collections import OrderedDict
+import io
+import re
+import time
+
+from .constants import DEFAULT_BLOCK_SIZE, DEFAULT_MAX_CACHED_BLOCKS, DEFAULT_MAX_READ_AHEAD
+from .utils import S3IOError, S3FileDoesNotExistError, readinto_fully, skip_bytes
+
+# Matches the Content-Range header of a 206 or 416 response.
+CONTENT_RANGE_RE = re.compile(r'bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)')
+
+
+class S3RawIO(io.RawIOBase):
+    """
+    A read-only, seekable file object for an S3 object, so that it can be
+    handed to :py:mod:`zipfile`, :py:mod:`tarfile`, Parquet readers or
+    :py:class:`io.BufferedReader`.
+
+    Reads are served from blocks of ``block_size`` bytes fetched with HTTP
+    ``Range`` requests. The most recently read ``max_cached_blocks`` blocks
+    are kept, so going back to the same place (eg. a ZIP's central directory)
+    costs nothing. A read that misses the cache fetches one block if it
+    follows a seek, and twice as many blocks as the previous miss, up to
+    ``max_read_ahead``, while the object is read sequentially. Reading one
+    member of a large archive only fetches the blocks around that member.
+
+    Every block is fetched with ``If-Match`` on the ETag of the first
+    response, so that blocks of two versions of the object are never mixed.
+    """
+    def __init__(self, opener, object_key, block_size=DEFAULT_BLOCK_SIZE,
+                 max_cached_blocks=DEFAULT_MAX_CACHED_BLOCKS,
+                 max_read_ahead=DEFAULT_MAX_READ_AHEAD):
+        """
+        :param opener: The :py:class:`~openS3.ctx_manager.OpenS3` object used to
+            sign and send requests.
+        :param object_key: Key of the S3 object to read.
+        :param block_size: Size in bytes of each block.
+        :param max_cached_blocks: Number of blocks kept in memory.
+        :param max_read_ahead: Most blocks fetched by a single request.
+        """
+        if max_read_ahead > max_cached_blocks:
+            raise ValueError('max_read_ahead can not exceed max_cached_blocks. Given: {} > {}'
+                             ''.format(max_read_ahead, max_cached_blocks))
+        self.opener = opener
+        self.object_key = object_key
+        self.name = object_key
+        self.block_size = block_size
+        self.max_cached_blocks = max_cached_blocks
+        self.max_read_ahead = max_read_ahead
+        # Learnt from the first response.
+        self.size = None
+        self.etag = None
+        self._position = 0
+        self._blocks = OrderedDict()
+        # Number of blocks the next cache miss fetches, and the block a
+        # sequential reader would miss next.
+        self._read_ahead = 1
+        self._next_block = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._check_open()
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._check_open()
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            if self.size is None:
+                self._head()
+            position = self.size + offset
+        else:
+            raise ValueError('Invalid whence ({}, should be 0, 1 or 2)'.format(whence))
+        if position < 0:
+            raise ValueError('Negative seek position {}'.format(position))
+        self._position = position
+        return position
+
+    def readinto(self, buffer):
+        """
+        Read bytes from the current position into ``buffer`` and return the
+        number of bytes read. The buffer is filled unless the end of the
+        object comes first, and 0 is returned once the end has been reached.
+        """
+        self._check_open()
+        filled = 0
+        with memoryview(buffer) as view, view.cast('B') as view:
+            while filled < len(view):
+                position = self._position + filled
+                if self.size is not None and position >= self.size:
+                    break
+                index, offset = divmod(position, self.block_size)
+                # Number of blocks the rest of the read spans.
+                span = -(-(offset + len(view) - filled) // self.block_size)
+                block = self._get_block(index, span)
+                if block is None or offset >= len(block):
+                    break
+                n = min(len(block) - offset, len(view) - filled)
+                view[filled:filled + n] = block[offset:offset + n]
+                filled += n
+        self._position += filled
+        return filled
+
+    def readall(self):
+        self._check_open()
+        if self.size is None:
+            # The first block tells the size.
+            self._get_block(self._position // self.block_size, self.max_read_ahead)
+            if self.size is None:
+                return b''
+        data = bytearray(max(0, self.size - self._position))
+        with memoryview(data) as view:
+            filled = readinto_fully(self, view)
+        del data[filled:]
+        return bytes(data)
+
+    def close(self):
+        self._blocks.clear()
+        super().close()
+
+    def _check_open(self):
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+
+    def _get_block(self, index, span):
+        """
+        Return block ``index``, fetching it and the blocks after it if it
+        isn't cached, or ``None`` if it starts past the end of the object.
+
+        :param span: Number of blocks the current read needs.
+        """
+        sequential = index == self._next_block
+        self._next_block = index + 1
+        block = self._blocks.get(index)
+        if block is not None:
+            self._blocks.move_to_end(index)
+            return block
+        if sequential:
+            self._read_ahead = min(self._read_ahead * 2, self.max_read_ahead)
+        else:
+            self._read_ahead = 1
+        count = min(max(self._read_ahead, span), self.max_read_ahead)
+        # Don't fetch again blocks that are still cached.
+        for n in range(index + 1, index + count):
+            if n in self._blocks:
+                count = n - index
+                break
+        self._fetch(index, count)
+        return self._blocks.get(index)
+
+    def _head(self):
+        headers = self.opener._build_request_headers('HEAD', self.object_key)
+        if self.etag is not None:
+            headers['If-Match'] = self.etag
+        response, _ = self.opener._request('HEAD', self.object_key, headers=headers)
+        if response.status == 404:
+            raise S3FileDoesNotExistError(self.object_key)
+        if response.status != 200:
+            raise S3IOError(
+                'openS3 HEAD error. '
+                'Response status: {}. '
+                'Reason: {}.'.format(response.status, response.reason))
+        self.size = int(response.headers['Content-Length'])
+        self.etag = response.headers['ETag']
+
+    def _fetch(self, index, count):
+        """Fetch ``count`` blocks starting with block ``index`` into the cache."""
+        policy = self.opener.retry_policy
+        attempt = 0
+        while True:
+            try:
+                return self._read_blocks(index, count)
+            except policy.exceptions as e:
+                # The connection may drop midway through the body.
+                if not policy.should_retry_error(e, attempt):
+                    raise
+                time.sleep(policy.backoff(attempt))
+                attempt += 1
+
+    def _read_blocks(self, index, count):
+        start = index * self.block_size
+        end = start + count * self.block_size - 1
+        if self.size is not None:
+            end = min(end, self.size - 1)
+        headers = self.opener._build_request_headers('GET', self.object_key)
+        headers['Range'] = 'bytes={}-{}'.format(start, end)
+        if self.etag is not None:
+            # Fail rather than mix blocks of two different versions of the object.
+            headers['If-Match'] = self.etag
+
+        pool = self.opener.pool
+        conn, response = self.opener._urlopen('GET', self.object_key, headers=headers)
+        if response.status not in (200, 206):
+            body = response.read()
+            pool.release(conn, response)
+            if response.status == 416:
+                # The block starts past the end of the object.
+                if not self._learn_size(response):
+                    self._head()
+                return
+            if response.status == 404:
+                raise S3FileDoesNotExistError(self.object_key)
+            raise S3IOError(
+                'openS3 GET error. '
+                'Response status: {}. '
+                'Reason: {}. '
+                'Response Text: \n'
+                '{}'.format(response.status, response.reason, body))
+        try:
+            if response.status == 200:
+                # The server ignored the Range header and is sending the whole object.
+                self.size = int(response.headers['Content-Length'])
+                skip_bytes(response, start)
+            elif not self._learn_size(response):
+                raise S3IOError('openS3 GET error. Invalid Content-Range: {}'
+                                ''.format(response.headers.get('Content-Range')))
+            if self.etag is None:
+                self.etag = response.headers.get('ETag')
+            end = min(end, self.size - 1)
+            for n in range(index, index + count):
+                block_start = n * self.block_size
+                if block_start > end:
+                    break
+                block = bytearray(min(self.block_size, end + 1 - block_start))
+                with memoryview(block) as view:
+                    filled = readinto_fully(response, view)
+                if filled < len(block):
+                    raise S3IOError('openS3 GET error. Connection closed after {} of '
+                                    '{} bytes.'.format(block_start + filled - start,
+                                                       end + 1 - start))
+                self._blocks[n] = block
+                while len(self._blocks) > self.max_cached_blocks:
+                    self._blocks.popitem(last=False)
+        except BaseException as e:
+            pool.discard(conn, response, e)
+            raise
+        # Unless the whole object was sent, the body has been read to its end.
+        pool.release(conn, response)
+
+    def _learn_size(self, response):
+        """
+        Set :py:attr:`size` from the Content-Range header of ``response``.
+        Return ``False`` if the header doesn't give it.
+        """
+        match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+        if match is None or match.group(3) == '*':
+            return False
+        self.size = int(match.group(3))
+        return True
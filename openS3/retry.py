@@ -0,0 +1,240 @@
+"""
+Policies for sending requests again: a :py:class:`RetryPolicy` for requests
+that fail, and a :py:class:`HedgePolicy` for reads that are slow to answer.
+"""
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError, wait
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from http.client import HTTPException
+import random
+import ssl
+import threading
+import time
+
+from .constants import (
+    DEFAULT_RETRY_MAX_ATTEMPTS, DEFAULT_RETRY_BASE_DELAY, DEFAULT_RETRY_MAX_DELAY,
+    RETRYABLE_STATUSES, DEFAULT_HEDGE_PERCENTILE, DEFAULT_HEDGE_MIN_SAMPLES,
+    DEFAULT_HEDGE_WINDOW, DEFAULT_HEDGE_MAX_WORKERS)
+from .instrumentation import get_operation_name
+from .utils import S3IOError
+
+# S3 operations that leave the bucket in the same state however many times
+# they are sent. Creating and completing multipart uploads are not among them.
+IDEMPOTENT_OPERATIONS = frozenset((
+    'GetObject', 'HeadObject', 'ListObjectsV2', 'PutObject', 'CopyObject', 'UploadPart',
+    'UploadPartCopy', 'DeleteObject', 'DeleteObjects', 'AbortMultipartUpload',
+))
+
+# Exceptions raised by a request that may well succeed if sent again.
+RETRYABLE_EXCEPTIONS = (OSError, HTTPException)
+
+# Exceptions that are subclasses of RETRYABLE_EXCEPTIONS but will not go away.
+FATAL_EXCEPTIONS = (ssl.CertificateError, S3IOError)
+
+
+def parse_retry_after(value):
+    """
+    Return the number of seconds a ``Retry-After`` header asks to wait, or
+    ``None`` if there is no such header or it can not be parsed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy(object):
+    """
+    When and how long to wait before sending an idempotent request again.
+
+    Requests that raise a network error or get a transient error status are
+    sent up to ``max_attempts`` times in total. Before each retry, the client
+    sleeps for a random time between zero and ``base_delay * 2 ** attempt``
+    seconds, capped at ``max_delay`` ("full jitter"), or as long as the
+    response's ``Retry-After`` header asks if that is longer. A response whose
+    ``Retry-After`` exceeds ``max_delay`` is returned to the caller as it is.
+    """
+    def __init__(self, max_attempts=DEFAULT_RETRY_MAX_ATTEMPTS,
+                 base_delay=DEFAULT_RETRY_BASE_DELAY, max_delay=DEFAULT_RETRY_MAX_DELAY,
+                 statuses=RETRYABLE_STATUSES, exceptions=RETRYABLE_EXCEPTIONS):
+        """
+        :param max_attempts: Number of times a request is sent before giving up.
+            1 disables retries.
+        :param base_delay: Seconds the backoff starts from.
+        :param max_delay: Longest sleep, in seconds, between two attempts.
+        :param statuses: Response statuses worth retrying.
+        :param exceptions: A tuple of exception classes worth retrying.
+        """
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be at least 1. Given: {}'.format(max_attempts))
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.statuses = frozenset(statuses)
+        self.exceptions = tuple(exceptions)
+
+    def is_idempotent(self, operation):
+        """Return ``True`` if the S3 operation named ``operation`` may be retried."""
+        return operation in IDEMPOTENT_OPERATIONS
+
+    def should_retry_status(self, status, attempt):
+        """
+        Return ``True`` if a response with ``status`` to the 0-based
+        ``attempt`` should be retried.
+        """
+        return status in self.statuses and attempt + 1 < self.max_attempts
+
+    def should_retry_error(self, error, attempt):
+        """
+        Return ``True`` if a request that raised ``error`` on the 0-based
+        ``attempt`` should be retried.
+        """
+        return (isinstance(error, self.exceptions) and
+                not isinstance(error, FATAL_EXCEPTIONS) and
+                attempt + 1 < self.max_attempts)
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Return the number of seconds to sleep after the 0-based ``attempt``
+        failed, or ``None`` if the server asked to wait longer than ``max_delay``.
+
+        :param retry_after: Value of the ``Retry-After`` response header, if any.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+
+class HedgePolicy(object):
+    """
+    Send a second copy of a GET or HEAD request that has not been answered
+    within the ``percentile`` of recent response times of the same S3
+    operation, and use whichever response arrives first. The other request
+    is abandoned and its connection closed.
+
+    This trades a little extra load (about ``1 - percentile`` more requests)
+    for much shorter tail latency. Hedging starts once ``min_samples``
+    response times of an operation have been seen. One policy can be shared
+    by many :py:class:`~openS3.ctx_manager.OpenS3` objects.
+    """
+    def __init__(self, percentile=DEFAULT_HEDGE_PERCENTILE, min_samples=DEFAULT_HEDGE_MIN_SAMPLES,
+                 window=DEFAULT_HEDGE_WINDOW, min_delay=0.0,
+                 max_workers=DEFAULT_HEDGE_MAX_WORKERS):
+        """
+        :param percentile: Fraction of requests expected to be answered before
+            a hedge is sent (eg. 0.95).
+        :param min_samples: Number of response times to see before hedging.
+        :param window: Number of recent response times to remember per operation.
+        :param min_delay: Shortest time, in seconds, to wait before hedging.
+        :param max_workers: Number of threads hedged requests are sent from.
+        """
+        if not 0 < percentile < 1:
+            raise ValueError('percentile must be between 0 and 1. Given: {}'.format(percentile))
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        self.max_workers = max_workers
+        # Number of requests hedged, and how many of those the hedge answered first.
+        self.num_hedged = 0
+        self.num_hedges_won = 0
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def record(self, operation, seconds):
+        """Remember that a request for ``operation`` was answered in ``seconds``."""
+        with self._lock:
+            self._samples[operation].append(seconds)
+
+    def delay(self, operation):
+        """
+        Return the number of seconds to wait for an answer to ``operation``
+        before hedging, or ``None`` if too few response times have been seen.
+        """
+        with self._lock:
+            samples = sorted(self._samples[operation])
+        if len(samples) < self.min_samples:
+            return None
+        return max(self.min_delay, samples[int(self.percentile * (len(samples) - 1))])
+
+    def close(self):
+        """Stop the threads hedged requests are sent from."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='openS3-hedge')
+            return self._executor
+
+    def _timed_urlopen(self, pool, operation, method, url, headers, **kwargs):
+        start = time.perf_counter()
+        result = pool.urlopen(method, url, None, headers, **kwargs)
+        self.record(operation, time.perf_counter() - start)
+        return result
+
+    def urlopen(self, pool, method, url, headers=None, hooks=None, attempt=0):
+        """
+        Send a request without a body through ``pool``, hedging it if it is
+        slow. Return a 2-tuple of the connection and the response, like
+        :py:meth:`~openS3.connection.ConnectionPool.urlopen`.
+        """
+        headers = headers or {}
+        operation = get_operation_name(method, url, headers)
+        delay = self.delay(operation)
+        if delay is None:
+            return self._timed_urlopen(pool, operation, method, url, headers, hooks=hooks,
+                                       attempt=attempt)
+
+        executor = self._get_executor()
+        first = executor.submit(self._timed_urlopen, pool, operation, method, url, headers,
+                                hooks=hooks, attempt=attempt)
+        try:
+            return first.result(timeout=delay)
+        except TimeoutError:
+            pass
+        hedge = executor.submit(self._timed_urlopen, pool, operation, method, url, headers,
+                                hooks=hooks, attempt=attempt, hedge=True)
+        with self._lock:
+            self.num_hedged += 1
+
+        pending = {first, hedge}
+        winner = None
+        while winner is None and pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((future for future in done if future.exception() is None), None)
+        if winner is None:
+            # Both failed. Report the first request's error.
+            return first.result()
+        if winner is hedge:
+            with self._lock:
+                self.num_hedges_won += 1
+        loser = first if winner is hedge else hedge
+        loser.add_done_callback(lambda future: _abandon(pool, future))
+        return winner.result()
+
+
+def _abandon(pool, future):
+    """Close the connection of a request whose response is no longer wanted."""
+    if future.exception() is None:
+        conn, response = future.result()
+        pool.release(conn, response)
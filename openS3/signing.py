@@ -0,0 +1,308 @@
+from datetime import datetime
+import hashlib
+import hmac
+import io
+
+from .constants import (
+    AWS_S3_REGION, AWS_S3_SERVICE, EMPTY_PAYLOAD_SHA256, DEFAULT_PAYLOAD_CHUNK_SIZE,
+    MIN_PAYLOAD_CHUNK_SIZE)
+from .utils import (
+    get_canonical_query_string, get_signing_key, uri_encode)
+
+SIGV4_ALGORITHM = 'AWS4-HMAC-SHA256'
+# Algorithm named in the string to sign of each aws-chunked chunk.
+CHUNK_ALGORITHM = 'AWS4-HMAC-SHA256-PAYLOAD'
+# x-amz-content-sha256 values for bodies that are not hashed up front.
+STREAMING_PAYLOAD = 'STREAMING-AWS4-HMAC-SHA256-PAYLOAD'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+# Bytes each chunk adds besides its hex size: ';chunk-signature=', the
+# signature and two CRLFs.
+CHUNK_OVERHEAD = len(';chunk-signature=') + 64 + 4
+
+
+class Signer(object):
+    """
+    Sign S3 requests with AWS Signature Version 4.
+
+    Deriving a signing key takes four chained HMACs, but the key only depends
+    on the date, region and service. A :py:class:`Signer` derives it once per
+    UTC day and reuses it for every request, along with the credential scope
+    strings that go with it. A single :py:class:`Signer` can be shared by
+    many threads.
+    """
+    def __init__(self, access_key, secret_key, region=AWS_S3_REGION, service=AWS_S3_SERVICE):
+        """
+        :param access_key: An AWS access key (eg. AEIFKEKWEFJFWA)
+        :param secret_key: An AWS secret key.
+        :param region: AWS region of the bucket.
+        :param service: AWS service name.
+        """
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.service = service
+        self._scope_suffix = '/{}/{}/aws4_request'.format(region, service)
+        # (date_stamp, signing_key, scope, credential) for the current UTC day.
+        self._scope_cache = None
+        self.num_keys_derived = 0
+
+    def get_scope(self, date_stamp):
+        """
+        Return a 3-tuple of the signing key, credential scope and credential
+        for ``date_stamp`` (eg. '20150830'). The result is cached until the
+        date changes, ie. until UTC midnight.
+        """
+        cached = self._scope_cache
+        if cached is not None and cached[0] == date_stamp:
+            return cached[1:]
+        signing_key = get_signing_key(self.secret_key, date_stamp, self.region, self.service)
+        scope = date_stamp + self._scope_suffix
+        credential = '{}/{}'.format(self.access_key, scope)
+        self.num_keys_derived += 1
+        # Replacing the tuple in one assignment keeps concurrent readers safe.
+        self._scope_cache = (date_stamp, signing_key, scope, credential)
+        return signing_key, scope, credential
+
+    def signature(self, date_stamp, string_to_sign):
+        """Return the hex signature of ``string_to_sign`` with the key for ``date_stamp``."""
+        signing_key, _, _ = self.get_scope(date_stamp)
+        return hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def _sign(self, method, path, query_string_dict, header_dict, payload_hash, datetime_now):
+        """
+        Return a 4-tuple of the signed headers, the signature, the request
+        timestamp and the credential scope.
+        """
+        datetime_now = datetime_now or datetime.utcnow()
+        amz_date = datetime_now.strftime('%Y%m%dT%H%M%SZ')
+        date_stamp = amz_date[:8]
+        signing_key, scope, credential = self.get_scope(date_stamp)
+
+        header_dict = dict(header_dict or {})
+        header_dict['x-amz-date'] = amz_date
+        header_dict['x-amz-content-sha256'] = payload_hash
+        header_pairs = sorted((h.lower(), str(v).strip()) for h, v in header_dict.items())
+        signed_headers = ';'.join(h for h, _ in header_pairs)
+
+        canonical_request = '\n'.join((
+            method,
+            uri_encode(path),
+            get_canonical_query_string(query_string_dict) if query_string_dict else '',
+            ''.join(h + ':' + v + '\n' for h, v in header_pairs),
+            signed_headers,
+            payload_hash
+        ))
+        string_to_sign = '\n'.join((
+            SIGV4_ALGORITHM,
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+        ))
+        signature = hmac.new(signing_key, string_to_sign.encode('utf-8'),
+                             hashlib.sha256).hexdigest()
+
+        header_dict['Authorization'] = '{} Credential={},SignedHeaders={},Signature={}'.format(
+            SIGV4_ALGORITHM, credential, signed_headers, signature)
+        return header_dict, signature, amz_date, scope
+
+    def sign(self, method, path, query_string_dict=None, header_dict=None,
+             payload_hash=EMPTY_PAYLOAD_SHA256, datetime_now=None):
+        """
+        Return a copy of ``header_dict`` with ``x-amz-date``,
+        ``x-amz-content-sha256`` and ``Authorization`` headers added.
+
+        Every header in ``header_dict`` is signed, so it must include ``Host``
+        and anything added after signing will not be covered by the signature.
+
+        :param method: HTTP verb of the request.
+        :param path: Path of the request, before URI encoding (eg. '/static/app.css').
+        :param query_string_dict: Query parameters of the request.
+        :param header_dict: Headers to send and sign.
+        :param payload_hash: Hex SHA256 digest of the body, or ``UNSIGNED-PAYLOAD``.
+            Requests without a body can leave the default, so the body never
+            has to be hashed.
+        :param datetime_now: Time of the request. Defaults to now (UTC).
+        """
+        header_dict, _, _, _ = self._sign(method, path, query_string_dict, header_dict,
+                                          payload_hash, datetime_now)
+        return header_dict
+
+    def presign_many(self, method, host, paths, expires, query_string_dict=None,
+                     datetime_now=None):
+        """
+        Yield the request target (path and query string) of a presigned URL,
+        authenticated with query parameters, for each of ``paths``.
+
+        The URLs of a batch share their timestamp and query parameters, so
+        everything but the path is canonicalized once, and the HMAC keyed
+        with the signing key is primed with the start of the string to sign
+        and copied for each path. Signing a path then takes one SHA256 of
+        its canonical request and one HMAC.
+
+        :param method: HTTP verb the URLs are for.
+        :param host: Value of the ``Host`` header, the only header signed.
+        :param paths: An iterable of paths, before URI encoding.
+        :param expires: Number of seconds the URLs are valid for.
+        :param query_string_dict: Extra query parameters to sign
+            (eg. ``{'response-content-disposition': 'attachment'}``).
+        :param datetime_now: Time the URLs are valid from. Defaults to now (UTC).
+        """
+        datetime_now = datetime_now or datetime.utcnow()
+        amz_date = datetime_now.strftime('%Y%m%dT%H%M%SZ')
+        signing_key, scope, credential = self.get_scope(amz_date[:8])
+
+        query = dict(query_string_dict or {})
+        query.update({
+            'X-Amz-Algorithm': SIGV4_ALGORITHM,
+            'X-Amz-Credential': credential,
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': str(expires),
+            'X-Amz-SignedHeaders': 'host',
+        })
+        canonical_query = get_canonical_query_string(query)
+        canonical_prefix = method + '\n'
+        canonical_suffix = '\n'.join((
+            '',
+            canonical_query,
+            'host:' + host.strip() + '\n',
+            'host',
+            UNSIGNED_PAYLOAD
+        ))
+        signature_mac = hmac.new(signing_key, digestmod=hashlib.sha256)
+        signature_mac.update('\n'.join((SIGV4_ALGORITHM, amz_date, scope, '')).encode('utf-8'))
+        query_prefix = '?' + canonical_query + '&X-Amz-Signature='
+
+        for path in paths:
+            encoded_path = uri_encode(path)
+            canonical_request = canonical_prefix + encoded_path + canonical_suffix
+            mac = signature_mac.copy()
+            mac.update(hashlib.sha256(canonical_request.encode('utf-8')).hexdigest().encode('ascii'))
+            yield encoded_path + query_prefix + mac.hexdigest()
+
+    def presign(self, method, host, path, expires, query_string_dict=None, datetime_now=None):
+        """
+        Return the request target (path and query string) of a presigned URL
+        for ``path``. See :py:meth:`presign_many`.
+        """
+        return next(self.presign_many(method, host, (path,), expires, query_string_dict,
+                                      datetime_now))
+
+    def sign_chunked(self, method, path, query_string_dict, header_dict, body, length,
+                     chunk_size=DEFAULT_PAYLOAD_CHUNK_SIZE, datetime_now=None):
+        """
+        Sign a request whose body is sent as signed ``aws-chunked`` chunks.
+
+        Return a 2-tuple of the signed headers and a :py:class:`ChunkedPayload`
+        to send as the body. Each chunk is hashed and signed as it is read, so
+        the body is only read once and at most one chunk is held in memory.
+
+        :param body: The payload, as bytes or a readable file object.
+        :param length: Length in bytes of the payload.
+        :param chunk_size: Size in bytes of each chunk. At least 8 KiB.
+        """
+        if chunk_size < MIN_PAYLOAD_CHUNK_SIZE:
+            raise ValueError('chunk_size must be at least {}. Given: {}'
+                             ''.format(MIN_PAYLOAD_CHUNK_SIZE, chunk_size))
+        header_dict = dict(header_dict or {})
+        content_encoding = header_dict.get('Content-Encoding')
+        header_dict['Content-Encoding'] = (
+            'aws-chunked,' + content_encoding if content_encoding else 'aws-chunked')
+        header_dict['x-amz-decoded-content-length'] = length
+        header_dict['Content-Length'] = get_chunked_content_length(length, chunk_size)
+        header_dict, seed_signature, amz_date, scope = self._sign(
+            method, path, query_string_dict, header_dict, STREAMING_PAYLOAD, datetime_now)
+        payload = ChunkedPayload(self, body, length, chunk_size, amz_date, scope, seed_signature)
+        return header_dict, payload
+
+
+def get_chunked_content_length(length, chunk_size):
+    """
+    Return the ``Content-Length`` of a payload of ``length`` bytes once it is
+    framed as signed ``aws-chunked`` chunks of ``chunk_size`` bytes.
+    """
+    def framed_length(size):
+        return len('{:x}'.format(size)) + CHUNK_OVERHEAD + size
+
+    num_full_chunks, remainder = divmod(length, chunk_size)
+    total = num_full_chunks * framed_length(chunk_size) + framed_length(0)
+    if remainder:
+        total += framed_length(remainder)
+    return total
+
+
+class ChunkedPayload(object):
+    """
+    A read-only file object that frames a payload as signed ``aws-chunked``
+    chunks. The signature of each chunk covers the one before it, starting
+    from the signature of the request headers.
+
+    It can be rewound with ``seek(0)`` so a request can be sent again.
+    """
+    def __init__(self, signer, body, length, chunk_size, amz_date, scope, seed_signature):
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            body = io.BytesIO(body)
+        self.signer = signer
+        self.body = body
+        self.length = length
+        self.chunk_size = chunk_size
+        self.amz_date = amz_date
+        self.scope = scope
+        self.seed_signature = seed_signature
+        self._body_start = body.tell() if hasattr(body, 'tell') else None
+        self._rewind()
+
+    def _rewind(self):
+        self._previous_signature = self.seed_signature
+        self._remaining = self.length
+        self._pending = b''
+        self._position = 0
+        self._done = False
+
+    def _next_chunk(self):
+        data = self.body.read(min(self.chunk_size, self._remaining)) if self._remaining else b''
+        if self._remaining and not data:
+            raise IOError('Payload ended {} bytes short of its length of {}.'
+                          ''.format(self._remaining, self.length))
+        self._remaining -= len(data)
+        string_to_sign = '\n'.join((
+            CHUNK_ALGORITHM,
+            self.amz_date,
+            self.scope,
+            self._previous_signature,
+            EMPTY_PAYLOAD_SHA256,
+            hashlib.sha256(data).hexdigest()
+        ))
+        signature = self.signer.signature(self.amz_date[:8], string_to_sign)
+        self._previous_signature = signature
+        self._done = not data
+        return b''.join((
+            '{:x};chunk-signature={}\r\n'.format(len(data), signature).encode('ascii'),
+            data,
+            b'\r\n'
+        ))
+
+    def read(self, size=-1):
+        """Return up to ``size`` bytes of the framed payload."""
+        if not self._pending and not self._done:
+            self._pending = self._next_chunk()
+        if size is None or size < 0:
+            chunks = [self._pending]
+            while not self._done:
+                chunks.append(self._next_chunk())
+            data = b''.join(chunks)
+        else:
+            data = self._pending[:size]
+        self._pending = self._pending[len(data):]
+        self._position += len(data)
+        return data
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """Rewind to the start of the payload. No other position is supported."""
+        if offset != 0 or whence != io.SEEK_SET or self._body_start is None:
+            raise io.UnsupportedOperation('ChunkedPayload can only be rewound to the start.')
+        self.body.seek(self._body_start)
+        self._rewind()
+        return 0
@@ -0,0 +1,227 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+import hashlib
+import os
+import tempfile
+
+from .constants import (
+    DEFAULT_SYNC_WORKERS, SYNC_COMPARE_ETAG, SYNC_COMPARE_MTIME, SYNC_COMPARE_SIZE,
+    VALID_SYNC_COMPARE, FILE_READ_SIZE)
+from .utils import S3Entry, get_xml_namespaces
+
+# Suffix of the temporary files downloads are written to before being
+# renamed into place.
+PARTIAL_DOWNLOAD_SUFFIX = '.opens3-partial'
+
+TRANSFERRED = 'transferred'
+SKIPPED = 'skipped'
+
+
+class SyncResult(namedtuple('SyncResult', 'transferred skipped deleted errors')):
+    """
+    What a sync did. ``transferred``, ``skipped`` and ``deleted`` are lists of
+    paths relative to the synced directory, and ``errors`` maps each path that
+    could not be synced to the exception raised.
+    """
+    __slots__ = ()
+
+
+def get_file_etag(path, part_size=None):
+    """
+    Return the ETag, without quotes, S3 gives the file at ``path`` when it is
+    uploaded in a single request or, with ``part_size``, as a multipart upload
+    with parts of ``part_size`` bytes.
+    """
+    whole = hashlib.md5()
+    part_digests = []
+    with open(path, 'rb') as f:
+        if not part_size:
+            for chunk in iter(lambda: f.read(FILE_READ_SIZE), b''):
+                whole.update(chunk)
+            return whole.hexdigest()
+        while True:
+            part = hashlib.md5()
+            remaining = part_size
+            while remaining:
+                chunk = f.read(min(remaining, FILE_READ_SIZE))
+                if not chunk:
+                    break
+                part.update(chunk)
+                remaining -= len(chunk)
+            if remaining == part_size and part_digests:
+                break
+            part_digests.append(part.digest())
+            if remaining:
+                break
+    return '{}-{}'.format(hashlib.md5(b''.join(part_digests)).hexdigest(), len(part_digests))
+
+
+class Sync(object):
+    """
+    Mirror a local directory to an S3 prefix or the other way around.
+
+    The remote side is listed once. A file is only transferred when the
+    object it corresponds to is missing or differs from it, as decided by
+    ``compare``. Comparisons and transfers run on up to ``workers`` threads,
+    so hashing local files is spread across cores too. Files and objects
+    that only exist on the side being synced to are deleted on request.
+    """
+    def __init__(self, opener, local_dir, prefix, workers=DEFAULT_SYNC_WORKERS, delete=False,
+                 compare=SYNC_COMPARE_ETAG):
+        """
+        :param opener: The :py:class:`~openS3.ctx_manager.OpenS3` object used to
+            sign and send requests.
+        :param local_dir: The local directory.
+        :param prefix: The S3 "directory" (eg. '/static/').
+        :param workers: Number of files compared and transferred concurrently.
+        :param delete: Delete what only exists on the side being synced to.
+        :param compare: How to decide that a file and an object of the same size
+            are the same: 'etag', 'mtime' or 'size'.
+        """
+        if compare not in VALID_SYNC_COMPARE:
+            raise ValueError('{} is not a valid way to compare files.'.format(compare))
+        prefix = prefix.strip('/')
+        self.opener = opener
+        self.local_dir = local_dir
+        self.prefix = prefix + '/' if prefix else ''
+        self.workers = workers
+        self.delete = delete
+        self.compare = compare
+
+    def _list_remote(self):
+        """Return a dict of the :py:class:`~openS3.utils.S3Entry` of each object by relative path."""
+        entries = {}
+        for root in self.opener._iter_list_pages({'prefix': self.prefix}):
+            namespaces = get_xml_namespaces(root)
+            for element in root.findall('aws:Contents', namespaces):
+                entry = S3Entry.from_element(element, namespaces)
+                relative_path = entry.key[len(self.prefix) + 1:]
+                # Skip "directory" placeholder objects.
+                if relative_path and not relative_path.endswith('/'):
+                    entries[relative_path] = entry
+        return entries
+
+    def _list_local(self):
+        """Yield a 2-tuple of the relative path and the path of each local file."""
+        for dirpath, dirnames, filenames in os.walk(self.local_dir):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.endswith(PARTIAL_DOWNLOAD_SUFFIX):
+                    continue
+                path = os.path.join(dirpath, name)
+                yield os.path.relpath(path, self.local_dir).replace(os.sep, '/'), path
+
+    def _is_unchanged(self, path, entry, upload):
+        """
+        Return ``True`` if the local file at ``path`` and the object ``entry``
+        need not be synced.
+
+        :param upload: Whether the file is being synced to the object.
+        """
+        stat = os.stat(path)
+        if stat.st_size != entry.size:
+            return False
+        if self.compare == SYNC_COMPARE_SIZE:
+            return True
+        if self.compare == SYNC_COMPARE_MTIME:
+            remote_mtime = entry.last_modified.replace(tzinfo=timezone.utc).timestamp()
+            # S3 only keeps whole seconds.
+            local_mtime = int(stat.st_mtime)
+            return remote_mtime >= local_mtime if upload else local_mtime >= remote_mtime
+        etag = (entry.etag or '').strip('"')
+        # A multipart upload has an ETag like '<md5 of the part md5s>-<number of parts>'.
+        # It can only be reproduced from parts of the size this client uploads.
+        part_size = self.opener.multipart_part_size if '-' in etag else None
+        return get_file_etag(path, part_size) == etag
+
+    def _upload(self, relative_path, path, entry):
+        if entry is not None and self._is_unchanged(path, entry, upload=True):
+            return SKIPPED
+        with self.opener('/' + self.prefix + relative_path, mode='wb') as fd:
+            fd.upload_file(path)
+        return TRANSFERRED
+
+    def _download(self, relative_path, entry):
+        path = os.path.join(self.local_dir, *relative_path.split('/'))
+        if os.path.isfile(path) and self._is_unchanged(path, entry, upload=False):
+            return SKIPPED
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.',
+                                        suffix=PARTIAL_DOWNLOAD_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f, self.opener(entry.key) as s3_file:
+                for chunk in s3_file.iter_chunks(FILE_READ_SIZE):
+                    f.write(chunk)
+            mtime = entry.last_modified.replace(tzinfo=timezone.utc).timestamp()
+            os.utime(tmp_path, (mtime, mtime))
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return TRANSFERRED
+
+    def _run(self, tasks):
+        """
+        Run each ``(relative_path, func, args)`` task and return a
+        :py:class:`SyncResult` without deletions.
+        """
+        result = SyncResult([], [], [], {})
+
+        def collect(relative_path, future):
+            try:
+                outcome = future.result()
+            except Exception as e:
+                result.errors[relative_path] = e
+                return
+            (result.transferred if outcome == TRANSFERRED else result.skipped).append(
+                relative_path)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = []
+            for relative_path, func, args in tasks:
+                # Don't walk further ahead than the workers can keep up with.
+                if len(pending) >= self.workers * 2:
+                    collect(*pending.pop(0))
+                pending.append((relative_path, executor.submit(func, relative_path, *args)))
+            for relative_path, future in pending:
+                collect(relative_path, future)
+        return result
+
+    def up(self):
+        """Sync the local directory to the S3 prefix and return a :py:class:`SyncResult`."""
+        remote = self._list_remote()
+        tasks = ((relative_path, self._upload, (path, remote.pop(relative_path, None)))
+                 for relative_path, path in self._list_local())
+        result = self._run(tasks)
+        if self.delete and remote:
+            # What is left in remote has no local counterpart.
+            errors = self.opener.delete_many([entry.key for entry in remote.values()],
+                                             workers=self.workers)
+            for key, error in errors.items():
+                result.errors[key[len(self.prefix):]] = error
+            result.deleted.extend(relative_path for relative_path, entry in remote.items()
+                                  if entry.key.lstrip('/') not in errors)
+        return result
+
+    def down(self):
+        """Sync the S3 prefix to the local directory and return a :py:class:`SyncResult`."""
+        remote = self._list_remote()
+        tasks = ((relative_path, self._download, (entry,))
+                 for relative_path, entry in sorted(remote.items()))
+        result = self._run(tasks)
+        if self.delete:
+            for relative_path, path in self._list_local():
+                if relative_path in remote:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    result.errors[relative_path] = e
+                else:
+                    result.deleted.append(relative_path)
+        return result
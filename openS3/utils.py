@@ -1,11 +1,16 @@
 from base64 import b64encode
+from collections import namedtuple
 from datetime import datetime
 import hashlib
 import hmac
+import os
 import re
 from urllib import parse
+from xml.etree import ElementTree
 
-from .constants import ENCODING, AWS_DATETIME_FORMAT
+from .constants import (
+    ENCODING, AWS_DATETIME_FORMAT, AWS_ISO_DATETIME_FORMAT, CONTENT_TYPES, DEFAULT_CONTENT_TYPE,
+    DEFAULT_CHUNK_SIZE)
 
 
 def b64_string(byte_string):
@@ -15,6 +20,51 @@ def b64_string(byte_string):
     return b64encode(byte_string).decode(ENCODING)
 
 
+def to_bytes(content):
+    """
+    Return ``content`` as bytes. Strings are encoded with ENCODING.
+    """
+    if isinstance(content, str):
+        return content.encode(ENCODING)
+    return content
+
+
+def readinto_fully(stream, view):
+    """
+    Fill ``view`` from ``stream`` until it is full or the stream ends. Return
+    the number of bytes read.
+    """
+    filled = 0
+    while filled < len(view):
+        with view[filled:] as remaining:
+            n = stream.readinto(remaining)
+        if not n:
+            break
+        filled += n
+    return filled
+
+
+def skip_bytes(stream, length):
+    """Read and discard ``length`` bytes from ``stream``."""
+    while length > 0:
+        data = stream.read(min(length, DEFAULT_CHUNK_SIZE))
+        if not data:
+            break
+        length -= len(data)
+
+
+def guess_content_type(object_key):
+    """
+    Return a Content-Type for ``object_key`` based on its file extension.
+
+    >>> guess_content_type('/static/css/app.css')
+    'text/css'
+    """
+    _, extension = os.path.splitext(object_key)
+    # Make an educated guess about what the Content-Type should be.
+    return CONTENT_TYPES.get(extension.strip('.'), DEFAULT_CONTENT_TYPE)
+
+
 def get_valid_filename(string_to_clean):
     """
     Returns the given string converted to a string that can be used for a clean
@@ -47,20 +97,38 @@ def strpawstime(timestamp):
     return datetime.strptime(timestamp, AWS_DATETIME_FORMAT)
 
 
+def strpisotime(timestamp):
+    """
+    Return datetime from parsed AWS XML timestamp string.
+    AWS XML Datetime Format:  2009-10-28T22:32:00.000Z
+    """
+    return datetime.strptime(timestamp, AWS_ISO_DATETIME_FORMAT)
+
+
 def get_canonical_query_string(query_string_dict):
     query_pairs = sorted(query_string_dict.items())
-    query_strings = [uri_encode(p) + '=' + uri_encode(v) for p, v in query_pairs]
+    query_strings = [uri_encode(p, encode_slash=True) + '=' + uri_encode(v, encode_slash=True)
+                     for p, v in query_pairs]
     return '&'.join(query_strings)
 
 
-def get_canonical_headers_string(header_dict):
-    header_pairs = sorted(header_dict.items())
-    header_strings = [h.lower() + ':' + v.strip() for h, v in header_pairs]
-    return '\n'.join(header_strings)
+def uri_encode(string, encode_slash=False):
+    """
+    Percent-encode ``string`` the way SigV4 expects. Slashes are left alone
+    unless ``encode_slash`` is ``True``, as they must be in query parameters.
+    """
+    return parse.quote(string, safe='' if encode_slash else '/')
 
 
-def uri_encode(string):
-    return parse.quote(string)
+def get_request_target(path, query_string_dict=None):
+    """
+    Return the request target (path and query string) to send for ``path``,
+    encoded exactly as it is when the request is signed.
+    """
+    target = uri_encode(path)
+    if query_string_dict:
+        target += '?' + get_canonical_query_string(query_string_dict)
+    return target
 
 
 # Source for function:
@@ -82,27 +150,55 @@ def get_signing_key(secret_key, date_stamp, region_name, service_name):
     return k_signing
 
 
-def get_dirs_and_files(key_list, prefix):
+def get_xml_namespaces(root):
+    """
+    Return a namespace mapping, usable with ``find``/``findall``, that maps the
+    prefix ``aws`` to the XML namespace of ``root``.
+
+    >>> root = ElementTree.fromstring('<a xmlns="http://s3.amazonaws.com/doc/2006-03-01/"/>')
+    >>> get_xml_namespaces(root)
+    {'aws': 'http://s3.amazonaws.com/doc/2006-03-01/'}
+    """
+    if root.tag.startswith('{'):
+        return {'aws': root.tag[1:].split('}')[0]}
+    return {'aws': ''}
+
+
+class S3Entry(namedtuple('S3Entry', 'key size etag last_modified is_dir')):
     """
-    Return a 2-tuple of sets. The first set in the 2-tuple
-    contains directory names and the second set contains files names.
+    A file or directory found by listing a bucket. Directories only have a key.
+    """
+    __slots__ = ()
+
+    @property
+    def name(self):
+        """The last component of the key (eg. 'app.css' for '/static/css/app.css')."""
+        return self.key.rstrip('/').rsplit('/', 1)[-1]
 
-    Example with an object_key of /static/. The leading slash from /
-    get_dirs_and_files('/static/', ['static/css/ads.css', 'static/js/main.js', 'static/robots.txt'])
-    {'css', 'js'} {'robots.txt'}
+    @classmethod
+    def from_element(cls, element, namespaces):
+        """Create an entry from a ``Contents`` element of a ListObjectsV2 response."""
+        return cls('/' + element.findtext('aws:Key', '', namespaces),
+                   int(element.findtext('aws:Size', '0', namespaces)),
+                   element.findtext('aws:ETag', None, namespaces),
+                   strpisotime(element.findtext('aws:LastModified', '', namespaces)),
+                   False)
+
+
+class ObjectMetadata(namedtuple('ObjectMetadata', 'size etag content_type last_modified')):
+    """
+    What a HEAD or GET response says about an S3 object.
     """
-    dirs = set()
-    files = set()
-    prefix = prefix.lstrip('/')
-    prefix_len = len(prefix)
-    for key in key_list:
-        if key.startswith(prefix):
-            key = key[prefix_len:]
-        if '/' in key:
-            dirs.add(key.split('/')[0])
-        else:
-            files.add(key)
-    return dirs, files
+    __slots__ = ()
+
+    @classmethod
+    def from_headers(cls, headers):
+        """Create metadata from the headers of a ``200`` HEAD or GET response."""
+        last_modified = headers.get('Last-Modified')
+        return cls(int(headers.get('Content-Length', 0)),
+                   headers.get('ETag'),
+                   headers.get('Content-Type'),
+                   strpawstime(last_modified) if last_modified else None)
 
 
 class S3IOError(IOError):
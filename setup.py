@@ -39,8 +39,13 @@ CLASSIFIERS = [
     "Natural Language :: English",
     "Programming Language :: Python",
     "Programming Language :: Python :: 3",
-    "Programming Language :: Python :: 3.3",
-    "Programming Language :: Python :: 3.4",
+    "Programming Language :: Python :: 3.7",
+    "Programming Language :: Python :: 3.8",
+    "Programming Language :: Python :: 3.9",
+    "Programming Language :: Python :: 3.10",
+    "Programming Language :: Python :: 3.11",
+    "Programming Language :: Python :: 3.12",
+    "Programming Language :: Python :: 3.13",
     "Programming Language :: Python :: 3 :: Only",
     "Topic :: Internet",
     "Topic :: Internet :: WWW/HTTP",
@@ -60,7 +65,9 @@ setup(name='openS3',
       license=LICENSE,
       classifiers=CLASSIFIERS,
       packages=['openS3'],
+      python_requires='>=3.7',
       include_package_data=True,
       package_data={'': ['LICENSE', 'README.rst']},
+      extras_require={'crc32c': ['crc32c'], 'zstd': ['zstandard']},
       tests_require=['tox'],
       cmdclass={'test': Tox})
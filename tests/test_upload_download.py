@@ -1,7 +1,12 @@
+import asyncio
+import hashlib
+import os
+import tempfile
 import unittest
 from datetime import datetime
 
-from openS3 import OpenS3
+from openS3 import OpenS3, AsyncOpenS3
+from openS3.cache import DiskCache, MetadataCache
 
 from tests.constants import BUCKET, ACCESS_KEY, SECRET_KEY
 
@@ -46,6 +51,21 @@ class OpenS3TestCase(unittest.TestCase):
             self.assertEqual(content, self.content)
             self.assertEqual(fd.response_headers['Content-Type'], 'text/plain')
 
+    def test__502_read_object_in_chunks(self):
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        with openS3(self.object_key) as fd:
+            self.assertEqual(fd.read(10).decode(), self.content[:10])
+            content = b''.join(fd.iter_chunks(1024)).decode()
+            self.assertEqual(content, self.content[10:])
+            self.assertEqual(fd.read(), b'')
+
+    def test__503_read_range_of_object(self):
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        with openS3(self.object_key) as fd:
+            self.assertEqual(fd.read_range(5, 9).decode(), self.content[5:10])
+            self.assertEqual(fd.read_range(5).decode(), self.content[5:])
+            self.assertEqual(fd.read_suffix(4).decode(), self.content[-4:])
+
     def test__701_delete_object_from_bucket(self):
         openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
         with openS3(self.object_key) as fd:
@@ -101,6 +121,231 @@ class OpenS3LargeFileTestCase(unittest.TestCase):
             self.assertFalse(fd.exists())
 
 
+class MultipartUploadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.object_key = '/testdir/multipart_test.txt'
+        self.part_size = 5 * 1024 * 1024
+
+    def test_multipart_upload(self):
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY,
+                        multipart_threshold=self.part_size,
+                        multipart_part_size=self.part_size)
+        lines = ['line {}\n'.format(n) for n in range(1500000)]
+        with openS3(self.object_key, mode='wb') as fd:
+            for line in lines:
+                fd.write(line)
+        with openS3(self.object_key) as fd:
+            self.assertEqual(fd.read().decode(), ''.join(lines))
+            self.assertTrue(fd.response_headers['ETag'].endswith('-4"'))
+            fd.delete()
+
+    def test_failed_write_is_not_uploaded(self):
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY,
+                        multipart_threshold=self.part_size,
+                        multipart_part_size=self.part_size)
+        with self.assertRaises(KeyError):
+            with openS3(self.object_key, mode='wb') as fd:
+                fd.write(b'x' * self.part_size * 2)
+                raise KeyError
+        with openS3(self.object_key) as fd:
+            self.assertFalse(fd.exists())
+
+
+class AppendTestCase(unittest.TestCase):
+    def setUp(self):
+        self.object_key = '/testdir/append_test.txt'
+
+    def tearDown(self):
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        with openS3(self.object_key) as fd:
+            fd.delete()
+
+    def test_append_to_small_object(self):
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        with openS3(self.object_key, mode='ab') as fd:
+            fd.write('first\n')
+        with openS3(self.object_key, mode='ab') as fd:
+            fd.write('second\n')
+        with openS3(self.object_key) as fd:
+            self.assertEqual(fd.read(), b'first\nsecond\n')
+
+    def test_append_to_large_object(self):
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        content = b'x' * 6 * 1024 * 1024
+        with openS3(self.object_key, mode='wb') as fd:
+            fd.write(content)
+        with openS3(self.object_key, mode='ab') as fd:
+            fd.write('tail\n')
+        with openS3(self.object_key) as fd:
+            self.assertEqual(fd.read(), content + b'tail\n')
+            self.assertTrue(fd.response_headers['ETag'].endswith('-2"'))
+
+
+class DownloadToTestCase(unittest.TestCase):
+    def setUp(self):
+        self.object_key = '/testdir/download_test.bin'
+        self.content = os.urandom(3 * 1024 * 1024 + 17)
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        with openS3(self.object_key, mode='wb') as fd:
+            fd.write(self.content)
+
+    def tearDown(self):
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        with openS3(self.object_key) as fd:
+            fd.delete()
+
+    def test_download_to(self):
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'download_test.bin')
+            with openS3(self.object_key) as fd:
+                fetched = fd.download_to(path, workers=4, part_size=1024 * 1024)
+            self.assertEqual(fetched, len(self.content))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), self.content)
+
+
+class AsyncOpenS3TestCase(unittest.TestCase):
+    def setUp(self):
+        self.object_keys = ['/testdir/async/test_{}.txt'.format(n) for n in range(20)]
+
+    def test_concurrent_round_trip(self):
+        async def round_trip(s3, object_key):
+            async with s3(object_key, mode='wb') as fd:
+                await fd.write(object_key)
+            async with s3(object_key) as fd:
+                self.assertTrue(await fd.exists())
+                self.assertEqual(await fd.read(), object_key.encode())
+                await fd.delete()
+                self.assertFalse(await fd.exists())
+
+        async def main():
+            async with AsyncOpenS3(BUCKET, ACCESS_KEY, SECRET_KEY) as s3:
+                await asyncio.gather(*(round_trip(s3, key) for key in self.object_keys))
+
+        asyncio.run(main())
+
+
+class BatchDeleteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.object_keys = ['/testdir/batch/{}/test_{}.txt'.format(n % 3, n) for n in range(30)]
+        opener = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        for object_key in self.object_keys:
+            with opener(object_key, mode='wb') as fd:
+                fd.write('blah')
+
+    def test_delete_many(self):
+        opener = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        self.assertEqual(opener.delete_many(self.object_keys), {})
+        for object_key in self.object_keys:
+            with opener(object_key) as fd:
+                self.assertFalse(fd.exists())
+
+    def test_rmtree(self):
+        opener = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        with opener('/testdir/batch/') as fd:
+            self.assertEqual(fd.rmtree(), {})
+        for object_key in self.object_keys:
+            with opener(object_key) as fd:
+                self.assertFalse(fd.exists())
+
+    def test_rmtree_refuses_to_empty_bucket(self):
+        opener = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        with self.assertRaises(ValueError):
+            opener.rmtree('/')
+        opener.delete_many(self.object_keys)
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    def test_connections_are_reused(self):
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        object_key = '/testdir/pool_test.txt'
+        with openS3(object_key, mode='wb') as fd:
+            fd.write('blah')
+        with openS3(object_key) as fd:
+            self.assertTrue(fd.exists())
+            self.assertEqual(fd.read(), b'blah')
+            fd.delete()
+        self.assertEqual(openS3.pool.num_connections, 1)
+        self.assertEqual(openS3.pool.num_reused, 3)
+
+
+class SigningTestCase(unittest.TestCase):
+    def test_signing_key_is_cached(self):
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)
+        object_key = '/testdir/signing test (1).txt'
+        with openS3(object_key, mode='wb') as fd:
+            fd.write('blah')
+        with openS3(object_key) as fd:
+            self.assertEqual(fd.read(), b'blah')
+            fd.delete()
+        self.assertEqual(openS3.signer.num_keys_derived, 1)
+
+    def test_payload_signing(self):
+        object_key = '/testdir/payload_signing_test.bin'
+        content = os.urandom(200 * 1024)
+        for payload_signing in ('streaming', 'signed'):
+            openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY, payload_signing=payload_signing)
+            with openS3(object_key, mode='wb') as fd:
+                fd.write(content)
+            with openS3(object_key) as fd:
+                self.assertEqual(fd.read(), content)
+                fd.delete()
+
+    def test_digest_after_close(self):
+        object_key = '/testdir/digest_test.bin'
+        content = os.urandom(6 * 1024 * 1024)
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY, checksum_crc32c=True,
+                        multipart_threshold=5 * 1024 * 1024,
+                        multipart_part_size=5 * 1024 * 1024)
+        with openS3(object_key, mode='wb') as fd:
+            fd.write(content)
+        self.assertEqual(fd.digest.md5, hashlib.md5(content).hexdigest())
+        self.assertEqual(fd.digest.size, len(content))
+        with openS3(object_key) as fd:
+            self.assertEqual(fd.read(), content)
+            fd.delete()
+
+    def test_unsigned_payload_requires_https(self):
+        with self.assertRaises(ValueError):
+            OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY, payload_signing='unsigned',
+                   secure=False)
+
+
+class DiskCacheTestCase(unittest.TestCase):
+    def test_read_through_cache(self):
+        object_key = '/testdir/cache_test.json'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY, cache=DiskCache(tmp_dir))
+            with openS3(object_key, mode='wb') as fd:
+                fd.write('{"version": 1}')
+            for _ in range(2):
+                with openS3(object_key) as fd:
+                    self.assertEqual(fd.read(), b'{"version": 1}')
+            with openS3(object_key, mode='wb') as fd:
+                fd.write('{"version": 2}')
+            with openS3(object_key) as fd:
+                self.assertEqual(fd.read(), b'{"version": 2}')
+                fd.delete()
+            self.assertEqual(os.listdir(tmp_dir), ['.lock'])
+
+
+class MetadataCacheTestCase(unittest.TestCase):
+    def test_exists_is_cached_and_invalidated(self):
+        object_key = '/testdir/metadata_cache_test.txt'
+        openS3 = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY, metadata_cache=MetadataCache())
+        with openS3(object_key) as fd:
+            self.assertFalse(fd.exists())
+        with openS3(object_key, mode='wb') as fd:
+            fd.write('blah')
+        with openS3(object_key) as fd:
+            self.assertTrue(fd.exists())
+            self.assertEqual(fd.size, 4)
+            fd.delete()
+        with openS3(object_key) as fd:
+            self.assertFalse(fd.exists())
+
+
 class ListdirTestCase(unittest.TestCase):
     def test_list_dir(self):
         object_keys = {'/static/css/app.css',
@@ -129,16 +374,29 @@ class ListdirTestCase(unittest.TestCase):
             self.assertEqual(files, {'robots.txt'})
 
         with opener('/static/css/') as fd:
-            with self.assertRaises(NotImplementedError):
-                dirs, files = fd.listdir()
-                self.assertEqual(dirs, {})
-                self.assertEqual(files, {'app.css', 'admin.css'})
+            dirs, files = fd.listdir()
+            self.assertEqual(dirs, set())
+            self.assertEqual(files, {'app.css', 'admin.css'})
 
         with opener('/static/js/') as fd:
-            with self.assertRaises(NotImplementedError):
-                dirs, files = fd.listdir()
-                self.assertEqual(dirs, {})
-                self.assertEqual(files, {'app.js', 'admin.js', 'on_boarding.js'})
+            dirs, files = fd.listdir()
+            self.assertEqual(dirs, set())
+            self.assertEqual(files, {'app.js', 'admin.js', 'on_boarding.js'})
+
+        with opener('/static/') as fd:
+            entries = {entry.key: entry for entry in fd.iterdir()}
+            self.assertEqual(set(entries), {'/static/css/', '/static/js/', '/static/robots.txt'})
+            self.assertTrue(entries['/static/css/'].is_dir)
+            self.assertEqual(entries['/static/robots.txt'].size, 4)
+
+        with opener('/static/') as fd:
+            walked = [(prefix, {d.name for d in dirs}, {f.name for f in files})
+                      for prefix, dirs, files in fd.walk()]
+            self.assertEqual(walked, [
+                ('/static/', {'css', 'js'}, {'robots.txt'}),
+                ('/static/css/', set(), {'app.css', 'admin.css'}),
+                ('/static/js/', set(), {'app.js', 'admin.js', 'on_boarding.js'}),
+            ])
 
     def test_cannot_listdir_on_file(self):
         opener = OpenS3(BUCKET, ACCESS_KEY, SECRET_KEY)